@@ -0,0 +1,54 @@
+"""
+Multi-worker deployment profile: gunicorn managing uvicorn workers.
+
+Run from the backend directory:
+    gunicorn -c gunicorn.conf.py server:app
+
+WEB_CONCURRENCY sets the worker count (default: one per CPU). The app is
+imported once in the master and forked, so workers share the imported code;
+each worker opens its own Mongo pool and coordinator on startup. With more
+than one worker set COORDINATION_URL=redis://... so cache invalidations
+reach every worker (see utils/coordination.py).
+
+Each worker keeps its own metrics. Worker slots 0..WEB_CONCURRENCY-1 are
+reused when workers are recycled, and the worker in slot N serves its
+metrics, labelled worker="N", on METRICS_PORT_BASE + N (default 9100 + N).
+Scrape every one of those ports, not /metrics on the shared bind port.
+"""
+
+import gc
+import itertools
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8001")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Import the app before forking so workers share its pages copy-on-write
+preload_app = True
+
+# Startup warm-up pings Mongo and may rebuild rollups on first deploy
+timeout = int(os.environ.get("WORKER_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then to bound slow memory growth
+max_requests = int(os.environ.get("MAX_REQUESTS", "10000"))
+max_requests_jitter = 1000
+
+# The app writes its own structured access log (utils/request_log.py)
+accesslog = None
+errorlog = "-"
+
+def pre_fork(server, worker):
+    # Move everything allocated during import out of the collector's reach so
+    # collections in the workers do not touch (and copy) the shared pages
+    gc.freeze()
+    # Lowest slot no live worker holds, so a recycled worker takes over its metrics port
+    taken = {getattr(other, "metrics_slot", None) for other in server.WORKERS.values()}
+    worker.metrics_slot = next(slot for slot in itertools.count() if slot not in taken)
+
+def post_fork(server, worker):
+    os.environ["METRICS_WORKER"] = str(worker.metrics_slot)
+    server.log.info("Worker %s forked (pid %s) in metrics slot %s", worker.age, worker.pid, worker.metrics_slot)
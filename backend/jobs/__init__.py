@@ -0,0 +1 @@
+# Jobs init file
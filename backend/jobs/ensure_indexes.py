@@ -0,0 +1,34 @@
+"""
+Create the indexes the API relies on; run as a deploy step.
+
+Run from the backend directory:
+    python -m jobs.ensure_indexes
+
+Workers also try this at startup but only log a failure, so they still
+become ready. Here a failure (e.g. duplicate ids blocking a unique index)
+is reported and the job exits with status 1.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+from pymongo.errors import OperationFailure
+from utils.dependencies import get_database
+from utils.indexes import ensure_indexes
+
+async def main():
+    try:
+        await ensure_indexes(get_database())
+    except OperationFailure as exc:
+        print(f"❌ Index creation failed: {exc}")
+        return 1
+    print("✅ Indexes are in place")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
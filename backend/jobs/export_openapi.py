@@ -0,0 +1,18 @@
+"""
+Write the OpenAPI schema cache ahead of time, e.g. while building the image,
+so no worker has to generate it on its first /docs request.
+
+Run from the backend directory:
+    python -m jobs.export_openapi
+"""
+
+import os
+
+# Build the schema even when the image is configured for production
+os.environ["ENABLE_DOCS"] = "true"
+
+from server import app
+
+if __name__ == "__main__":
+    schema = app.openapi()
+    print(f"✅ OpenAPI schema cached ({len(schema['paths'])} paths)")
@@ -0,0 +1,125 @@
+"""
+Convert UUID string keys to BSON binary (subtype 4) in every collection.
+
+Run from the backend directory, then deploy with BINARY_IDS=true:
+    python -m jobs.migrate_binary_ids [--check] [--batch-size 1000] [--pause 0.1]
+
+Fields are chosen by utils/ids.py (KEY_FIELDS), so documents end up exactly
+as the app writes them with BINARY_IDS on. Documents whose _id is a UUID
+string (feed inboxes, seen sets, neighbour lists) are re-inserted under the
+binary _id and the old copy is deleted. Every step is idempotent: rerunning
+after an interruption skips converted documents, and finished collections
+are recorded in job_checkpoints.
+
+Run it while writes are paused, or run it twice (the second pass picks up
+documents written in between) right before switching BINARY_IDS on; until
+then the app keeps writing strings. --check only counts what is left.
+"""
+
+import argparse
+import asyncio
+import os
+from datetime import datetime
+from pathlib import Path
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+from bson.codec_options import CodecOptions
+from pymongo import DeleteOne, ReplaceOne, UpdateOne
+from utils import ids
+from utils.dependencies import get_client
+
+JOB_ID = "migrate_binary_ids"
+
+def raw_database():
+    """The database without the client's UUID decoder, so stored types are visible"""
+    return get_client()[os.environ['DB_NAME']].with_options(codec_options=CodecOptions(tz_aware=False))
+
+def convert(document: dict):
+    """(changed top-level fields, new _id or None, encoded document) for one document"""
+    encoded = ids.encode(document)
+    changed = {
+        name: value for name, value in encoded.items()
+        if name != "_id" and value != document[name]
+    }
+    new_id = encoded["_id"] if encoded["_id"] != document["_id"] else None
+    return changed, new_id, encoded
+
+async def migrate_collection(db, name: str, batch_size: int, pause: float, check: bool) -> int:
+    collection = db[name]
+    pending = 0
+    updates, moves = [], []
+
+    async def flush():
+        if updates:
+            await collection.bulk_write(updates, ordered=False)
+            updates.clear()
+        if moves:
+            # Insert under the new _id before deleting the old one
+            await collection.bulk_write(moves, ordered=True)
+            moves.clear()
+        if pause:
+            await asyncio.sleep(pause)
+
+    async for document in collection.find({}).sort("_id", 1).batch_size(batch_size):
+        changed, new_id, encoded = convert(document)
+        if not changed and new_id is None:
+            continue
+        pending += 1
+        if check:
+            continue
+        if new_id is None:
+            updates.append(UpdateOne({"_id": document["_id"]}, {"$set": changed}))
+        else:
+            moves.append(ReplaceOne({"_id": new_id}, encoded, upsert=True))
+            moves.append(DeleteOne({"_id": document["_id"]}))
+        if len(updates) + len(moves) // 2 >= batch_size:
+            await flush()
+    if not check:
+        await flush()
+    return pending
+
+async def migrate(batch_size: int, pause: float, check: bool, restart: bool):
+    db = raw_database()
+    checkpoint = None if restart or check else await db.job_checkpoints.find_one({"_id": JOB_ID})
+    done = set(checkpoint.get("collections", [])) if checkpoint and checkpoint.get("finished_at") is None else set()
+    if not check and not done:
+        await db.job_checkpoints.replace_one(
+            {"_id": JOB_ID},
+            {"started_at": datetime.utcnow(), "collections": [], "finished_at": None},
+            upsert=True
+        )
+
+    names = sorted(
+        name for name in await db.list_collection_names()
+        if not name.startswith("system.") and name != "job_checkpoints"
+    )
+    total = 0
+    for name in names:
+        if name in done:
+            print(f"⏭️  {name}: already converted")
+            continue
+        count = await migrate_collection(db, name, batch_size, pause, check)
+        total += count
+        if check:
+            print(f"🔎 {name}: {count} documents still have string keys")
+        else:
+            print(f"✅ {name}: converted {count} documents")
+            await db.job_checkpoints.update_one({"_id": JOB_ID}, {"$addToSet": {"collections": name}})
+
+    if check:
+        print(f"{total} documents left to convert" if total else "✅ Nothing left to convert")
+    else:
+        await db.job_checkpoints.update_one({"_id": JOB_ID}, {"$set": {"finished_at": datetime.utcnow()}})
+        print(f"✅ Converted {total} documents in {len(names)} collections")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between batches")
+    parser.add_argument("--check", action="store_true", help="only count documents left to convert")
+    parser.add_argument("--restart", action="store_true", help="ignore an unfinished checkpoint")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.batch_size, args.pause, args.check, args.restart))
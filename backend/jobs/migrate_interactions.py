@@ -0,0 +1,134 @@
+"""
+Convert legacy one-document-per-event user_interactions into interaction buckets.
+
+Run from the backend directory:
+    python -m jobs.migrate_interactions [--drop]
+
+Only events inside the retention window are copied; older ones would expire anyway.
+
+Safe to re-run after a partial failure. Each bucket takes the _id of its
+first legacy event and is only inserted if missing, and each daily rollup
+row is marked once the legacy counts have been added to it.
+"""
+
+import argparse
+import asyncio
+from pathlib import Path
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from utils.dependencies import get_database
+from utils.indexes import ensure_indexes
+from utils.interactions import BUCKET_SIZE, day_of, retention_cutoff
+
+WRITE_BATCH = 500
+
+DUPLICATE_KEY = 11000
+
+async def write_rollups(db, writes):
+    """Apply rollup upserts; rows already marked as migrated fail the upsert and are skipped"""
+    try:
+        await db.interaction_daily.bulk_write(writes, ordered=False)
+    except BulkWriteError as exc:
+        if any(error["code"] != DUPLICATE_KEY for error in exc.details["writeErrors"]):
+            raise
+
+async def migrate(drop: bool = False):
+    db = get_database()
+    await ensure_indexes(db)
+    cutoff = retention_cutoff()
+
+    cursor = db.user_interactions.find(
+        {"created_at": {"$gte": cutoff}},
+        {"user_id": 1, "product_id": 1, "category": 1,
+         "interaction_type": 1, "duration": 1, "created_at": 1}
+    ).sort([("user_id", 1), ("created_at", 1), ("_id", 1)]).batch_size(5000)
+
+    writes = []
+    current_key = None
+    first_id = None
+    events = []
+    migrated = 0
+
+    async def flush_bucket():
+        if events:
+            user_id, day = current_key
+            # The same events always form the same bucket, so a re-run inserts nothing twice
+            writes.append(UpdateOne(
+                {"_id": first_id},
+                {"$setOnInsert": {"user_id": user_id, "day": day, "count": len(events), "events": list(events)}},
+                upsert=True
+            ))
+            events.clear()
+        if len(writes) >= WRITE_BATCH:
+            await db.interaction_buckets.bulk_write(writes, ordered=False)
+            writes.clear()
+
+    async for doc in cursor:
+        key = (doc["user_id"], day_of(doc["created_at"]))
+        if key != current_key or len(events) >= BUCKET_SIZE:
+            await flush_bucket()
+            current_key = key
+            first_id = doc["_id"]
+        events.append({
+            "p": doc["product_id"],
+            "c": doc["category"],
+            "t": doc["interaction_type"],
+            "d": doc.get("duration") or 0,
+            "at": doc["created_at"]
+        })
+        migrated += 1
+        if migrated % 100000 == 0:
+            print(f"  {migrated} events migrated")
+
+    await flush_bucket()
+    if writes:
+        await db.interaction_buckets.bulk_write(writes, ordered=False)
+
+    # Daily per-category rollups for the migrated window
+    pipeline = [
+        {"$match": {"created_at": {"$gte": cutoff}}},
+        {
+            "$group": {
+                "_id": {
+                    "day": {"$dateTrunc": {"date": "$created_at", "unit": "day"}},
+                    "category": "$category",
+                    "type": "$interaction_type"
+                },
+                "count": {"$sum": 1},
+                "duration": {"$sum": {"$ifNull": ["$duration", 0]}}
+            }
+        }
+    ]
+    # Legacy counts per day and category, added to each row exactly once
+    per_row = {}
+    async for row in db.user_interactions.aggregate(pipeline, allowDiskUse=True):
+        increments = per_row.setdefault((row["_id"]["day"], row["_id"]["category"]), {"duration": 0})
+        increments[f"counts.{row['_id']['type']}"] = row["count"]
+        increments["duration"] += row["duration"]
+    rollup_writes = [
+        UpdateOne(
+            {"day": day, "category": category, "legacy_migrated": {"$ne": True}},
+            {"$inc": increments, "$set": {"legacy_migrated": True}},
+            upsert=True
+        )
+        for (day, category), increments in per_row.items()
+    ]
+    for start in range(0, len(rollup_writes), WRITE_BATCH):
+        await write_rollups(db, rollup_writes[start:start + WRITE_BATCH])
+
+    print(f"✅ Migrated {migrated} events into interaction buckets")
+
+    if drop:
+        await db.user_interactions.drop()
+        print("🗑️ Dropped legacy user_interactions collection")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--drop", action="store_true", help="drop user_interactions after migrating")
+    args = parser.parse_args()
+    asyncio.run(migrate(drop=args.drop))
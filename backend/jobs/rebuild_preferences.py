@@ -0,0 +1,166 @@
+"""
+Recompute user_preferences for every user from the last 30 days of interactions.
+
+Run from the backend directory after changing the interaction weights:
+    python -m jobs.rebuild_preferences [--chunk-size 2000] [--parallel 4] [--restart]
+
+Users are processed in user_id order and the job checkpoints after every wave of
+chunks, so an interrupted run continues where it stopped unless --restart is given.
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+import numpy as np
+import pandas as pd
+from pymongo import UpdateOne
+from utils.dependencies import get_database
+from utils.interactions import (
+    TYPE_WEIGHTS,
+    DEFAULT_WEIGHT,
+    WATCH_MAX_WEIGHT,
+    WATCH_SECONDS_PER_POINT,
+    day_of,
+)
+
+JOB_ID = "rebuild_preferences"
+WINDOW = timedelta(days=30)
+
+def score_chunk(events: pd.DataFrame) -> pd.DataFrame:
+    """Weighted category scores normalised per user, same rules as update_user_preferences"""
+    types = events["t"].to_numpy()
+    durations = events["d"].fillna(0).to_numpy(dtype=float)
+
+    weights = np.full(len(events), DEFAULT_WEIGHT)
+    for interaction_type, weight in TYPE_WEIGHTS.items():
+        weights[types == interaction_type] = weight
+    watched = types == "watch_video"
+    weights[watched] = np.minimum(
+        WATCH_MAX_WEIGHT, DEFAULT_WEIGHT + durations[watched] / WATCH_SECONDS_PER_POINT
+    )
+
+    scores = (
+        events.assign(w=weights)
+        .groupby(["user_id", "c"], sort=False)["w"]
+        .sum()
+        .reset_index()
+    )
+    scores["w"] = scores["w"] / scores.groupby("user_id")["w"].transform("max")
+    return scores
+
+async def process_chunk(db, user_ids, since: datetime) -> int:
+    """Rebuild preferences for one chunk of users, returns the number written"""
+    pipeline = [
+        {"$match": {"user_id": {"$in": user_ids}, "day": {"$gte": day_of(since)}}},
+        {"$unwind": "$events"},
+        {"$match": {"events.at": {"$gte": since}}},
+        {"$project": {"_id": 0, "user_id": 1, "c": "$events.c", "t": "$events.t", "d": "$events.d"}}
+    ]
+    rows = await db.interaction_buckets.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+    if not rows:
+        return 0
+
+    scores = score_chunk(pd.DataFrame(rows))
+    now = datetime.utcnow()
+    writes = [
+        UpdateOne(
+            {"user_id": user_id},
+            {
+                "$set": {
+                    "category_scores": dict(zip(group["c"], group["w"].round(6))),
+                    "last_updated": now
+                }
+            },
+            upsert=True
+        )
+        for user_id, group in scores.groupby("user_id", sort=False)
+    ]
+    await db.user_preferences.bulk_write(writes, ordered=False)
+    return len(writes)
+
+async def iter_user_chunks(db, since: datetime, after: str, chunk_size: int):
+    """Yield sorted chunks of user ids with interactions in the window"""
+    match = {"day": {"$gte": day_of(since)}}
+    if after is not None:
+        match["user_id"] = {"$gt": after}
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": "$user_id"}},
+        {"$sort": {"_id": 1}}
+    ]
+    chunk = []
+    async for row in db.interaction_buckets.aggregate(pipeline, allowDiskUse=True):
+        chunk.append(row["_id"])
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+async def rebuild(chunk_size: int, parallel: int, restart: bool):
+    db = get_database()
+
+    checkpoint = None if restart else await db.job_checkpoints.find_one({"_id": JOB_ID})
+    if checkpoint and checkpoint.get("finished_at") is None:
+        started_at = checkpoint["started_at"]
+        after = checkpoint.get("last_user_id")
+        processed = checkpoint.get("processed", 0)
+        print(f"↩️ Resuming after user {after} ({processed} users already done)")
+    else:
+        started_at = datetime.utcnow()
+        after = None
+        processed = 0
+        await db.job_checkpoints.replace_one(
+            {"_id": JOB_ID},
+            {"started_at": started_at, "last_user_id": None, "processed": 0, "finished_at": None},
+            upsert=True
+        )
+
+    since = started_at - WINDOW
+    clock = time.perf_counter()
+    wave = []
+
+    async def run_wave():
+        nonlocal processed
+        results = await asyncio.gather(*(process_chunk(db, chunk, since) for chunk in wave))
+        processed += sum(results)
+        # Chunks are in user_id order, so the whole wave is done up to its last id
+        await db.job_checkpoints.update_one(
+            {"_id": JOB_ID},
+            {"$set": {"last_user_id": wave[-1][-1], "processed": processed}}
+        )
+        elapsed = time.perf_counter() - clock
+        print(f"  {processed} users rebuilt ({processed / max(elapsed, 1e-9):.0f}/s)")
+        wave.clear()
+
+    async for chunk in iter_user_chunks(db, since, after, chunk_size):
+        wave.append(chunk)
+        if len(wave) >= parallel:
+            await run_wave()
+    if wave:
+        await run_wave()
+
+    # Users without interactions in the window lose their stale scores
+    cleared = await db.user_preferences.update_many(
+        {"last_updated": {"$lt": started_at}},
+        {"$set": {"category_scores": {}, "last_updated": datetime.utcnow()}}
+    )
+    await db.job_checkpoints.update_one(
+        {"_id": JOB_ID}, {"$set": {"finished_at": datetime.utcnow()}}
+    )
+    print(f"✅ Rebuilt {processed} users, cleared {cleared.modified_count} without recent activity")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--parallel", type=int, default=4)
+    parser.add_argument("--restart", action="store_true", help="ignore an unfinished checkpoint")
+    args = parser.parse_args()
+    asyncio.run(rebuild(args.chunk_size, args.parallel, args.restart))
@@ -0,0 +1,145 @@
+"""
+Build item-to-item recommendations from likes and interaction buckets.
+
+Run from the backend directory (e.g. nightly from cron):
+    python -m jobs.recommender [--top-k 20] [--min-score 0.05]
+
+Each product gets its top-k most similar products by cosine similarity over the
+user x product implicit-feedback matrix, stored in product_neighbors.
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import datetime
+from pathlib import Path
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+import numpy as np
+from scipy import sparse
+from pymongo import ReplaceOne
+from utils.dependencies import get_database
+from utils.interactions import interaction_weight
+
+# Liking a product is a stronger signal than any single view
+LIKE_WEIGHT = 3.0
+
+# Item rows of the similarity matrix computed at once; bounds peak memory
+BLOCK_SIZE = 2048
+
+WRITE_BATCH = 1000
+
+class _Index(dict):
+    """Assigns consecutive ordinals to ids"""
+    def ordinal(self, key):
+        value = self.get(key)
+        if value is None:
+            value = self[key] = len(self)
+        return value
+
+async def load_feedback(db):
+    """Stream likes and interactions into COO triplets"""
+    users, items = _Index(), _Index()
+    rows, cols, weights = [], [], []
+
+    async for like in db.likes.find({}, {"_id": 0, "user_id": 1, "product_id": 1}).batch_size(10000):
+        rows.append(users.ordinal(like["user_id"]))
+        cols.append(items.ordinal(like["product_id"]))
+        weights.append(LIKE_WEIGHT)
+
+    projection = {"_id": 0, "user_id": 1, "events.p": 1, "events.t": 1, "events.d": 1}
+    async for bucket in db.interaction_buckets.find({}, projection).batch_size(1000):
+        user = users.ordinal(bucket["user_id"])
+        for event in bucket.get("events", []):
+            rows.append(user)
+            cols.append(items.ordinal(event["p"]))
+            weights.append(interaction_weight(event["t"], event.get("d", 0)))
+
+    return users, items, rows, cols, weights
+
+def top_k_neighbors(matrix: sparse.csr_matrix, top_k: int, min_score: float):
+    """Yield (item ordinal, [(neighbor ordinal, score), ...]) for every item"""
+    # Columns are items; L2-normalise them so the dot product is the cosine
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0))).ravel()
+    norms[norms == 0] = 1.0
+    normalized = (matrix @ sparse.diags(1.0 / norms)).tocsc()
+    item_major = normalized.T.tocsr()
+
+    n_items = matrix.shape[1]
+    for start in range(0, n_items, BLOCK_SIZE):
+        block = (item_major[start:start + BLOCK_SIZE] @ normalized).tocsr()
+        for offset in range(block.shape[0]):
+            item = start + offset
+            row_start, row_end = block.indptr[offset], block.indptr[offset + 1]
+            indices = block.indices[row_start:row_end]
+            scores = block.data[row_start:row_end]
+
+            keep = (indices != item) & (scores >= min_score)
+            indices, scores = indices[keep], scores[keep]
+            if len(scores) > top_k:
+                best = np.argpartition(-scores, top_k)[:top_k]
+                indices, scores = indices[best], scores[best]
+            order = np.argsort(-scores)
+            yield item, list(zip(indices[order].tolist(), scores[order].tolist()))
+
+async def build(top_k: int, min_score: float):
+    db = get_database()
+    started = time.perf_counter()
+
+    users, items, rows, cols, weights = await load_feedback(db)
+    if not items:
+        print("No likes or interactions yet, nothing to do")
+        return
+    print(f"📥 Loaded {len(weights)} signals for {len(users)} users and {len(items)} products")
+
+    # Duplicate (user, product) pairs are summed; log damping stops binge watching dominating
+    matrix = sparse.coo_matrix(
+        (np.asarray(weights, dtype=np.float32), (np.asarray(rows), np.asarray(cols))),
+        shape=(len(users), len(items))
+    ).tocsr()
+    matrix.sum_duplicates()
+    matrix.data = np.log1p(matrix.data)
+
+    product_ids = np.empty(len(items), dtype=object)
+    for product_id, ordinal in items.items():
+        product_ids[ordinal] = product_id
+
+    now = datetime.utcnow()
+    writes = []
+    written = 0
+    for item, neighbors in top_k_neighbors(matrix, top_k, min_score):
+        if not neighbors:
+            continue
+        writes.append(ReplaceOne(
+            {"_id": product_ids[item]},
+            {
+                "neighbors": [
+                    {"id": product_ids[neighbor], "score": round(score, 4)}
+                    for neighbor, score in neighbors
+                ],
+                "updated_at": now
+            },
+            upsert=True
+        ))
+        if len(writes) >= WRITE_BATCH:
+            await db.product_neighbors.bulk_write(writes, ordered=False)
+            written += len(writes)
+            writes = []
+    if writes:
+        await db.product_neighbors.bulk_write(writes, ordered=False)
+        written += len(writes)
+
+    # Products that lost all their neighbours keep no stale list
+    await db.product_neighbors.delete_many({"updated_at": {"$lt": now}})
+
+    print(f"✅ Wrote neighbours for {written} products in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--min-score", type=float, default=0.05)
+    args = parser.parse_args()
+    asyncio.run(build(args.top_k, args.min_score))
@@ -0,0 +1,36 @@
+"""
+Check the ledger: every journal must balance and every account's balance
+snapshot must equal the sum of its entries.
+
+Run from the backend directory:
+    python -m jobs.reconcile_ledger
+
+Exits with status 1 when a discrepancy is found.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+from utils.dependencies import get_database
+from utils.ledger import reconcile
+
+async def main():
+    db = get_database()
+    report = await reconcile(db)
+
+    for journal in report["unbalanced_journals"]:
+        print(f"Unbalanced journal {journal['_id']}: sums to {journal['total']}")
+    for account in report["account_mismatches"]:
+        print(f"Account {account['_id']}: entries sum to {account['ledger']}, balance says {account['balance']}")
+
+    problems = len(report["unbalanced_journals"]) + len(report["account_mismatches"])
+    print(f"Ledger reconciliation: {problems} problem(s)")
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
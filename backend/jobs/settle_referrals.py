@@ -0,0 +1,199 @@
+"""
+Pay out referral earnings: settle every unpaid referrer credit in the ledger
+and write the payouts as CSV batch files for the bank.
+
+Run from the backend directory:
+    python -m jobs.settle_referrals [--output-dir payouts] [--batch-size 1000]
+
+A run has two checkpointed phases:
+  1. mark  - unsettled referrer entries older than the run's cutoff are tagged
+             with the run id, a chunk of bulk updates at a time; referrers
+             without a RIB on file are left unsettled for a later run;
+  2. write - the tagged entries are summed per referrer by one streamed
+             aggregation and written out a batch file at a time, each batch
+             posting a payout journal that debits the referrers' balances.
+             The journal and the checkpoint are committed together.
+An interrupted run resumes where it stopped; a new run only starts once the
+previous one has finished.
+"""
+
+import argparse
+import asyncio
+import csv
+import os
+import time
+import uuid
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+from utils.dependencies import get_database
+from utils.escrow import run_transaction
+from utils.ledger import PAYOUT_ACCOUNT, post_journal, referrer_account, to_decimal
+
+JOB_ID = "settle_referrals"
+MARK_CHUNK = 5000
+
+# All referrer:<id> accounts (";" sorts right after ":")
+REFERRER_ACCOUNTS = {"$gte": "referrer:", "$lt": "referrer;"}
+
+async def mark_entries(db, run_id: str, cutoff: datetime) -> int:
+    """Tag unsettled credits of referrers with a RIB with the run id, returns the number tagged"""
+    query = {"settled": False, "account": REFERRER_ACCOUNTS, "created_at": {"$lt": cutoff}}
+    marked = 0
+    skipped = 0
+    after = None
+    clock = time.perf_counter()
+    while True:
+        # Keyset on (account, _id): entries left unsettled must not be read again
+        page = dict(query)
+        if after is not None:
+            page["$or"] = [{"account": {"$gt": after[0]}}, {"account": after[0], "_id": {"$gt": after[1]}}]
+        cursor = db.ledger_entries.find(page, {"account": 1}).sort([("account", 1), ("_id", 1)])
+        rows = await cursor.limit(MARK_CHUNK).to_list(length=MARK_CHUNK)
+        if not rows:
+            if skipped:
+                print(f"  {skipped} entries of referrers without a RIB left unsettled")
+            return marked
+        after = (rows[-1]["account"], rows[-1]["_id"])
+
+        # The bank file needs a RIB; without one the credit waits for a later run
+        user_ids = list({row["account"].split(":", 1)[1] for row in rows})
+        payable = {
+            referrer_account(user["id"])
+            async for user in db.users.find({"id": {"$in": user_ids}, "rib": {"$nin": [None, ""]}}, {"id": 1})
+        }
+        ids = [row["_id"] for row in rows if row["account"] in payable]
+        skipped += len(rows) - len(ids)
+        if ids:
+            result = await db.ledger_entries.update_many(
+                {"_id": {"$in": ids}, "settled": False},
+                {"$set": {"settled": True, "settlement_id": run_id, "settled_at": datetime.utcnow()}}
+            )
+            marked += result.modified_count
+        elapsed = time.perf_counter() - clock
+        print(f"  {marked} entries marked ({marked / max(elapsed, 1e-9):.0f}/s)")
+
+async def iter_payouts(db, run_id: str, after: str):
+    """Stream (account, amount) totals of the run's entries in account order"""
+    match = {"settlement_id": run_id}
+    if after is not None:
+        match["account"] = {"$gt": after}
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": "$account", "amount": {"$sum": "$amount"}, "entries": {"$sum": 1}}},
+        {"$sort": {"_id": 1}}
+    ]
+    async for row in db.ledger_entries.aggregate(pipeline, allowDiskUse=True):
+        yield row["_id"], to_decimal(row["amount"])
+
+async def write_batch(db, run_id: str, batch_no: int, payouts: list, output_dir: Path, progress: dict):
+    """Write one bank file, then post its payout journal and checkpoint `progress`"""
+    user_ids = [account.split(":", 1)[1] for account, _ in payouts]
+    users = {
+        user["id"]: user
+        async for user in db.users.find({"id": {"$in": user_ids}}, {"id": 1, "name": 1, "rib": 1})
+    }
+
+    # Write to a temporary name first so the bank never picks up a partial file
+    path = output_dir / f"referral_payouts_{run_id}_{batch_no:05d}.csv"
+    partial = path.with_suffix(".csv.partial")
+    with open(partial, "w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["reference", "user_id", "name", "rib", "amount", "currency"])
+        for line, (account, amount) in enumerate(payouts, start=1):
+            user_id = account.split(":", 1)[1]
+            user = users.get(user_id, {})
+            writer.writerow([f"{run_id}-{batch_no}-{line}", user_id, user.get("name", ""), user.get("rib", ""), f"{amount:.2f}", "DZD"])
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(partial, path)
+
+    # Referrer balances go down by what this file pays out
+    total = sum((amount for _, amount in payouts), Decimal("0.00"))
+    journal_id = f"referral_payout:{run_id}:{batch_no}"
+    postings = {account: -amount for account, amount in payouts}
+    postings[PAYOUT_ACCOUNT] = total
+
+    async def work(session):
+        # Already posted when a run without transactions stopped before its checkpoint
+        if not await db.ledger_entries.find_one({"journal_id": journal_id}, {"_id": 1}, session=session):
+            # Not settlement_id: the run's payouts must stay out of its own aggregation
+            await post_journal(
+                db, journal_id, "referral_payout", postings, session=session, payout_run=run_id, file=path.name
+            )
+        await db.job_checkpoints.update_one(
+            {"_id": JOB_ID},
+            {"$set": progress},
+            session=session
+        )
+
+    await run_transaction(db, work)
+
+async def settle(output_dir: Path, batch_size: int):
+    db = get_database()
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    checkpoint = await db.job_checkpoints.find_one({"_id": JOB_ID})
+    if checkpoint and checkpoint.get("finished_at") is None:
+        print(f"↩️ Resuming run {checkpoint['run_id']} in phase {checkpoint['phase']}")
+    else:
+        checkpoint = {
+            "_id": JOB_ID,
+            "run_id": datetime.utcnow().strftime("%Y%m%d%H%M%S") + "-" + uuid.uuid4().hex[:6],
+            "cutoff": datetime.utcnow(),
+            "phase": "mark",
+            "last_account": None,
+            "batches": 0,
+            "referrers": 0,
+            "total": "0.00",
+            "started_at": datetime.utcnow(),
+            "finished_at": None
+        }
+        await db.job_checkpoints.replace_one({"_id": JOB_ID}, checkpoint, upsert=True)
+    run_id = checkpoint["run_id"]
+
+    if checkpoint["phase"] == "mark":
+        marked = await mark_entries(db, run_id, checkpoint["cutoff"])
+        print(f"  {marked} referrer entries tagged with {run_id}")
+        checkpoint["phase"] = "write"
+        await db.job_checkpoints.update_one({"_id": JOB_ID}, {"$set": {"phase": "write"}})
+
+    batch_no = checkpoint["batches"]
+    referrers = checkpoint["referrers"]
+    total = Decimal(checkpoint["total"])
+    batch = []
+
+    async def flush_batch():
+        nonlocal batch_no, referrers, total
+        batch_no += 1
+        referrers += len(batch)
+        total += sum((amount for _, amount in batch), Decimal("0.00"))
+        # Batches are in account order, so everything up to the last account is written
+        progress = {"last_account": batch[-1][0], "batches": batch_no, "referrers": referrers, "total": str(total)}
+        await write_batch(db, run_id, batch_no, batch, output_dir, progress)
+        print(f"  batch {batch_no}: {len(batch)} referrers, {referrers} so far, {total} DZD")
+        batch.clear()
+
+    async for payout in iter_payouts(db, run_id, checkpoint["last_account"]):
+        batch.append(payout)
+        if len(batch) >= batch_size:
+            await flush_batch()
+    if batch:
+        await flush_batch()
+
+    await db.job_checkpoints.update_one(
+        {"_id": JOB_ID}, {"$set": {"phase": "done", "finished_at": datetime.utcnow()}}
+    )
+    print(f"✅ Run {run_id}: paid {referrers} referrers {total} DZD in {batch_no} file(s) under {output_dir}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output-dir", type=Path, default=ROOT_DIR / "payouts")
+    parser.add_argument("--batch-size", type=int, default=1000, help="referrers per bank file")
+    args = parser.parse_args()
+    asyncio.run(settle(args.output_dir, args.batch_size))
@@ -0,0 +1,84 @@
+"""
+Local stand-in for the CIB/EDAHABIA payment gateway
+
+Serves the checkout page returned by /payments/create-escrow and sends
+signed status callbacks to the API, optionally duplicated and shuffled to
+exercise the idempotent, ordered callback inbox.
+
+    PAYMENT_SECRET_KEY=dev-secret uvicorn mock_gateway:app --port 8100
+
+Start the API with PAYMENT_API_URL=http://localhost:8100 and the same
+PAYMENT_SECRET_KEY, then open the paymentUrl (add &outcome=failed,
+&duplicates=3 or &shuffle=true to simulate a bad day at the gateway).
+"""
+
+from fastapi import FastAPI, Query
+from concurrent.futures import ThreadPoolExecutor
+from utils.payment_gateway import sign, to_minor_units
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+import requests
+
+CALLBACK_URL = os.environ.get("PAYMENT_CALLBACK_URL", "http://localhost:8001/api/payments/callback")
+SECRET = os.environ.get("PAYMENT_SECRET_KEY", "dev-secret")
+
+app = FastAPI(title="Mock Payment Gateway")
+
+_senders = ThreadPoolExecutor(max_workers=16)
+
+def send_callback(event: dict) -> int:
+    """POST one signed callback, returns the API's status code"""
+    body = json.dumps(event).encode()
+    timestamp = str(int(time.time()))
+    response = requests.post(
+        CALLBACK_URL,
+        data=body,
+        headers={
+            "Content-Type": "application/json",
+            "X-Timestamp": timestamp,
+            "X-Signature": sign(timestamp, body, SECRET)
+        },
+        timeout=10
+    )
+    return response.status_code
+
+@app.get("/pay")
+async def pay(
+    transaction_id: str,
+    amount: float,
+    method: str = "CIB",
+    outcome: str = Query("success", pattern="^(success|failed)$"),
+    duplicates: int = Query(0, ge=0, le=50),
+    shuffle: bool = False
+):
+    """Simulate the buyer paying: PENDING, then SUCCESS or FAILED"""
+    events = [
+        {"payment_id": transaction_id, "status": "PENDING", "sequence": 1},
+        {"payment_id": transaction_id, "status": "SUCCESS" if outcome == "success" else "FAILED", "sequence": 2},
+    ]
+    deliveries = []
+    for event in events:
+        event.update(event_id=str(uuid.uuid4()), amount=to_minor_units(amount))
+        # Retried deliveries reuse the event id
+        deliveries += [event] * (duplicates + 1)
+    if shuffle:
+        random.shuffle(deliveries)
+
+    loop = asyncio.get_running_loop()
+    statuses = await asyncio.gather(*(
+        loop.run_in_executor(_senders, send_callback, event) for event in deliveries
+    ))
+
+    return {
+        "transactionId": transaction_id,
+        "method": method,
+        "outcome": outcome,
+        "deliveries": [
+            {"eventId": event["event_id"], "status": event["status"], "response": code}
+            for event, code in zip(deliveries, statuses)
+        ]
+    }
@@ -0,0 +1,10 @@
+from pydantic import BaseModel, ConfigDict
+
+class Model(BaseModel):
+    """Base for the API models
+
+    Validators and schemas are built on first use instead of at import,
+    which keeps worker cold starts short. Request and response models are
+    still built when their route is registered.
+    """
+    model_config = ConfigDict(defer_build=True)
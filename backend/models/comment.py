@@ -1,9 +1,10 @@
-from pydantic import BaseModel, Field
+from pydantic import Field
+from .base import Model
 from typing import Optional
 from datetime import datetime
 import uuid
 
-class Comment(BaseModel):
+class Comment(Model):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     product_id: str
     user_id: str
@@ -11,10 +12,10 @@ class Comment(BaseModel):
     likes: int = 0
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
-class CommentCreate(BaseModel):
-    comment: str
+class CommentCreate(Model):
+    comment: str = Field(min_length=1, max_length=1000)
 
-class CommentResponse(BaseModel):
+class CommentResponse(Model):
     id: str
     product_id: str
     user_id: str
@@ -0,0 +1,15 @@
+from pydantic import Field
+from .base import Model
+from datetime import datetime
+
+class Follow(Model):
+    follower_id: str  # The user who follows
+    followee_id: str  # The seller being followed
+    celebrity: bool = False  # Followee's products are read on demand instead of fanned out
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class InboxItem(Model):
+    """Entry of a user's capped following-feed inbox"""
+    product_id: str
+    seller_id: str
+    created_at: datetime
@@ -0,0 +1,20 @@
+from pydantic import Field
+from .base import Model
+from typing import List, Optional
+from datetime import datetime
+import uuid
+
+class MediaVariant(Model):
+    name: str  # thumbnail, 480p, 720p, original
+    path: str  # Object key on the CDN, or an absolute URL for legacy media
+    content_type: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    size: Optional[int] = None  # Bytes
+
+class MediaDescriptor(Model):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    kind: str  # image, video
+    variants: List[MediaVariant] = []
+    blurhash: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -1,9 +1,11 @@
-from pydantic import BaseModel, Field
+from pydantic import Field
+from .base import Model
 from typing import List, Optional
 from datetime import datetime
+from .media import MediaDescriptor
 import uuid
 
-class Product(BaseModel):
+class Product(Model):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     seller_id: str
     title: str
@@ -13,6 +15,8 @@ class Product(BaseModel):
     category: str
     images: List[str] = []
     videos: List[str] = []  # Short video URLs
+    image_media: List[MediaDescriptor] = []  # Variants of each image, served through the CDN
+    video_media: List[MediaDescriptor] = []  # Variants of each video, served through the CDN
     location: str
     status: str = "available"  # available, sold, pending
     likes: int = 0
@@ -34,25 +38,27 @@ class Product(BaseModel):
             }
         }
 
-class ProductCreate(BaseModel):
+class ProductCreate(Model):
     title: str
     description: str
     price: float
     category: str
-    images: List[str]
+    images: List[str] = []
+    image_media_ids: List[str] = []  # Ids returned by POST /media/images
     videos: List[str] = []
     location: str
 
-class ProductUpdate(BaseModel):
+class ProductUpdate(Model):
     title: Optional[str] = None
     description: Optional[str] = None
     price: Optional[float] = None
     category: Optional[str] = None
     images: Optional[List[str]] = None
+    image_media_ids: Optional[List[str]] = None  # Ids returned by POST /media/images
     location: Optional[str] = None
     status: Optional[str] = None
 
-class ProductResponse(BaseModel):
+class ProductResponse(Model):
     id: str
     seller_id: str
     title: str
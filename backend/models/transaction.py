@@ -1,9 +1,10 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import Field
+from .base import Model
+from typing import Optional, Literal
 from datetime import datetime
 import uuid
 
-class Transaction(BaseModel):
+class Transaction(Model):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     product_id: str
     buyer_id: str
@@ -13,6 +14,8 @@ class Transaction(BaseModel):
     payment_method: str  # CIB, EDAHABIA
     status: str = "pending"  # pending, in_escrow, completed, cancelled
     escrow_released: bool = False
+    payment_status: Optional[str] = None  # awaiting_payment, paid, failed
+    closed_reason: Optional[str] = None  # buyer_confirmed, auto_release, payment_timeout, payment_failed
     commission_rate: float = 0.02  # 1% buyer + 1% seller = 2% total
     referral_l1_id: Optional[str] = None  # Level 1 referrer
     referral_l2_id: Optional[str] = None  # Level 2 referrer
@@ -22,15 +25,22 @@ class Transaction(BaseModel):
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     completed_at: Optional[datetime] = None
 
-class TransactionCreate(BaseModel):
+class TransactionCreate(Model):
     product_id: str
     payment_method: str
 
-class EscrowConfirm(BaseModel):
+class EscrowConfirm(Model):
     transaction_id: str
     confirmed: bool = True
 
-class TransactionResponse(BaseModel):
+class PaymentCallback(Model):
+    event_id: str  # Unique per delivery attempt group, used as the idempotency key
+    payment_id: str  # Our transaction id
+    status: Literal["PENDING", "SUCCESS", "FAILED"]
+    amount: int  # Centimes
+    sequence: int = Field(ge=1)  # Starts at 1 and increases with every status change of the payment
+
+class TransactionResponse(Model):
     id: str
     product_id: str
     amount: float
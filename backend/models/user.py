@@ -1,9 +1,10 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import EmailStr, Field
+from .base import Model
 from typing import Optional
 from datetime import datetime
 import uuid
 
-class User(BaseModel):
+class User(Model):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
     email: EmailStr
@@ -16,6 +17,7 @@ class User(BaseModel):
     rating: float = 0.0
     followers: int = 0
     following: int = 0
+    fanout_on_read: bool = False  # Too many followers to fan new products out on write
     total_sales: int = 0
     total_purchases: int = 0
     referral_code: str = Field(default_factory=lambda: str(uuid.uuid4())[:8].upper())
@@ -33,7 +35,7 @@ class User(BaseModel):
             }
         }
 
-class UserCreate(BaseModel):
+class UserCreate(Model):
     name: str
     email: EmailStr
     phone: str
@@ -41,11 +43,11 @@ class UserCreate(BaseModel):
     location: str
     referral_code: Optional[str] = None
 
-class UserLogin(BaseModel):
+class UserLogin(Model):
     email: EmailStr
     password: str
 
-class UserResponse(BaseModel):
+class UserResponse(Model):
     id: str
     name: str
     email: str
@@ -62,7 +64,7 @@ class UserResponse(BaseModel):
     referral_code: str
     created_at: datetime
 
-class UserUpdate(BaseModel):
+class UserUpdate(Model):
     name: Optional[str] = None
     phone: Optional[str] = None
     location: Optional[str] = None
@@ -1,9 +1,10 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import Field
+from .base import Model
+from typing import List, Optional
 from datetime import datetime
 import uuid
 
-class UserInteraction(BaseModel):
+class UserInteraction(Model):
     """Track user interactions for personalized recommendations"""
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
@@ -13,7 +14,22 @@ class UserInteraction(BaseModel):
     duration: Optional[int] = 0  # Video watch duration in seconds
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
-class UserPreferences(BaseModel):
+class InteractionEvent(Model):
+    """Compact interaction stored inside a bucket"""
+    p: str  # product_id
+    c: str  # category
+    t: str  # interaction_type
+    d: int = 0  # duration in seconds
+    at: datetime = Field(default_factory=datetime.utcnow)
+
+class InteractionBucket(Model):
+    """Up to BUCKET_SIZE interactions of one user on one day"""
+    user_id: str
+    day: datetime
+    count: int = 0
+    events: List[InteractionEvent] = []
+
+class UserPreferences(Model):
     """User category preferences calculated from interactions"""
     user_id: str
     category_scores: dict  # {"electronics": 0.8, "vehicles": 0.5, ...}
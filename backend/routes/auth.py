@@ -1,15 +1,16 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Request
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from models.user import UserCreate, UserLogin, UserResponse
-from utils.auth import verify_password, get_password_hash, create_access_token
+from utils.auth import verify_password_async, get_password_hash_async, create_access_token
 from utils.responses import success_response, error_response
 from utils.dependencies import get_database
+from utils.rate_limit import client_key, enforce, rate_limit
 from datetime import datetime
 import uuid
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
-@router.post("/register")
+@router.post("/register", dependencies=[rate_limit("register")])
 async def register(user_data: UserCreate, db: AsyncIOMotorDatabase = Depends(get_database)):
     """Register new user"""
     
@@ -44,12 +45,14 @@ async def register(user_data: UserCreate, db: AsyncIOMotorDatabase = Depends(get
     user_id = str(uuid.uuid4())
     referral_code = str(uuid.uuid4())[:8].upper()
     
+    password_hash = await get_password_hash_async(user_data.password)
+    
     user_doc = {
         "id": user_id,
         "name": user_data.name,
         "email": user_data.email,
         "phone": user_data.phone,
-        "password_hash": get_password_hash(user_data.password),
+        "password_hash": password_hash,
         "location": user_data.location,
         "avatar": f"https://ui-avatars.io/api/?name={user_data.name.replace(' ', '+')}&background=16a34a&color=fff",
         "verified": False,
@@ -75,7 +78,6 @@ async def register(user_data: UserCreate, db: AsyncIOMotorDatabase = Depends(get
             "referrer_id": referrer_id,
             "referred_user_id": user_id,
             "level": 1,
-            "total_earnings": 0.0,
             "transaction_count": 0,
             "status": "active",
             "created_at": datetime.utcnow()
@@ -89,7 +91,6 @@ async def register(user_data: UserCreate, db: AsyncIOMotorDatabase = Depends(get
                 "referrer_id": referrer_doc["referred_by"],
                 "referred_user_id": user_id,
                 "level": 2,
-                "total_earnings": 0.0,
                 "transaction_count": 0,
                 "status": "active",
                 "created_at": datetime.utcnow()
@@ -100,14 +101,24 @@ async def register(user_data: UserCreate, db: AsyncIOMotorDatabase = Depends(get
         message="Account created successfully"
     )
 
-@router.post("/login")
-async def login(credentials: UserLogin, db: AsyncIOMotorDatabase = Depends(get_database)):
+@router.post("/login", dependencies=[rate_limit("login")])
+async def login(request: Request, credentials: UserLogin, db: AsyncIOMotorDatabase = Depends(get_database)):
     """Login user and return JWT token"""
     
+    # Bound password guesses against one account. Only failures spend these
+    # budgets, and the tight one is per caller, so guessing from one address
+    # does not lock the owner out.
+    email = credentials.email.lower()
+    account_budgets = [("login_account", f"{email}:{client_key(request)}"), ("login_account_global", email)]
+    for name, key in account_budgets:
+        await enforce(name, key, cost=0)
+    
     # Find user by email
     user = await db.users.find_one({"email": credentials.email})
     
-    if not user or not verify_password(credentials.password, user["password_hash"]):
+    if not user or not await verify_password_async(credentials.password, user["password_hash"]):
+        for name, key in account_budgets:
+            await enforce(name, key)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
@@ -141,7 +152,7 @@ async def login(credentials: UserLogin, db: AsyncIOMotorDatabase = Depends(get_d
         "user": user_response
     }
 
-@router.post("/validate-referral")
+@router.post("/validate-referral", dependencies=[rate_limit("validate_referral")])
 async def validate_referral(referral_code: str, db: AsyncIOMotorDatabase = Depends(get_database)):
     """Validate referral code"""
     
@@ -0,0 +1,167 @@
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+from models.comment import CommentCreate
+from utils.responses import success_response
+from utils.dependencies import get_database, get_current_user
+from utils.cache import TTLCache
+from utils.coordination import invalidate
+from datetime import datetime
+import base64
+import uuid
+
+router = APIRouter(prefix="/products", tags=["Comments"])
+
+DEFAULT_PAGE_SIZE = 20
+
+# First page of each product's thread, dropped whenever the thread changes
+first_page_cache = TTLCache("comments_first_page", ttl=60, maxsize=5000)
+
+def encode_cursor(comment: dict) -> str:
+    raw = f"{comment['created_at'].isoformat()}|{comment['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, comment_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), comment_id
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+async def load_comment_page(db: AsyncIOMotorDatabase, product_id: str, limit: int, before: str = None):
+    """One page of a thread, newest first, with authors resolved in one query"""
+    query = {"product_id": product_id}
+    if before:
+        created_at, comment_id = decode_cursor(before)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": comment_id}}
+        ]
+
+    cursor = db.comments.find(query).sort([("created_at", -1), ("id", -1)]).limit(limit + 1)
+    comments = await cursor.to_list(length=limit + 1)
+    has_more = len(comments) > limit
+    comments = comments[:limit]
+
+    user_ids = list({comment["user_id"] for comment in comments})
+    users = {
+        user["id"]: user
+        async for user in db.users.find({"id": {"$in": user_ids}}, {"id": 1, "name": 1, "avatar": 1})
+    }
+
+    items = []
+    for comment in comments:
+        user = users.get(comment["user_id"], {})
+        items.append({
+            "id": comment["id"],
+            "productId": comment["product_id"],
+            "userId": comment["user_id"],
+            "userName": user.get("name", "Unknown"),
+            "userAvatar": user.get("avatar"),
+            "comment": comment["comment"],
+            "likes": comment.get("likes", 0),
+            "createdAt": comment["created_at"].isoformat()
+        })
+
+    return {
+        "items": items,
+        "nextCursor": encode_cursor(comments[-1]) if has_more else None
+    }
+
+async def get_first_comment_page(db: AsyncIOMotorDatabase, product_id: str):
+    """Default-sized first page, served from the cache when possible"""
+    page = first_page_cache.get(product_id)
+    if page is None:
+        page = await load_comment_page(db, product_id, DEFAULT_PAGE_SIZE)
+        first_page_cache.set(product_id, page)
+    return page
+
+@router.get("/{product_id}/comments")
+async def list_comments(
+    product_id: str,
+    before: str = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=100),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Get a page of comments; pass nextCursor as `before` for the following page"""
+
+    if before is None and limit == DEFAULT_PAGE_SIZE:
+        page = await get_first_comment_page(db, product_id)
+    else:
+        page = await load_comment_page(db, product_id, limit, before)
+
+    return success_response(data=page)
+
+@router.post("/{product_id}/comments")
+async def create_comment(
+    product_id: str,
+    comment_data: CommentCreate,
+    user_id: str = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Comment on a product (requires authentication)"""
+
+    if not await db.products.find_one({"id": product_id}, {"_id": 1}):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found"
+        )
+
+    # Insert before counting so a failed insert never inflates comments_count
+    comment_id = str(uuid.uuid4())
+    await db.comments.insert_one({
+        "id": comment_id,
+        "product_id": product_id,
+        "user_id": user_id,
+        "comment": comment_data.comment,
+        "likes": 0,
+        "created_at": datetime.utcnow()
+    })
+    await db.products.update_one(
+        {"id": product_id},
+        {"$inc": {"comments_count": 1}}
+    )
+    await invalidate(first_page_cache, product_id)
+
+    return success_response(
+        data={"commentId": comment_id},
+        message="Comment added"
+    )
+
+@router.post("/{product_id}/comments/{comment_id}/like")
+async def like_comment(
+    product_id: str,
+    comment_id: str,
+    user_id: str = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Like a comment, or remove the like if already liked"""
+
+    comment = await db.comments.find_one({"id": comment_id, "product_id": product_id}, {"_id": 1})
+    if not comment:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Comment not found"
+        )
+
+    # The unique (comment_id, user_id) index makes the toggle race-free
+    try:
+        await db.comment_likes.insert_one({
+            "comment_id": comment_id,
+            "user_id": user_id,
+            "created_at": datetime.utcnow()
+        })
+        delta, message = 1, "Comment liked"
+    except DuplicateKeyError:
+        result = await db.comment_likes.delete_one({"comment_id": comment_id, "user_id": user_id})
+        if result.deleted_count == 0:
+            return success_response(message="Comment unliked")
+        delta, message = -1, "Comment unliked"
+
+    await db.comments.update_one({"id": comment_id}, {"$inc": {"likes": delta}})
+    await invalidate(first_page_cache, product_id)
+
+    return success_response(message=message)
@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse, PlainTextResponse
+from utils.dependencies import get_admin_user
+from utils.loop_monitor import loop_monitor
+from utils import profiler
+import os
+
+# Served outside /api (like /metrics) and only to ADMIN_USER_IDS
+router = APIRouter(prefix="/debug", include_in_schema=False, dependencies=[Depends(get_admin_user)])
+
+@router.get("/profile")
+async def profile(
+    request: Request,
+    seconds: float = Query(10, gt=0, le=profiler.MAX_SECONDS),
+    interval_ms: float = Query(5, ge=1, le=100),
+    mode: str = Query("cpu", pattern="^(cpu|wall)$"),
+    format: str = Query("collapsed", pattern="^(collapsed|speedscope|summary)$"),
+    include_idle: bool = False,
+):
+    """Sample this worker's event loop for `seconds` and return the stacks
+
+    Only the worker that receives the request is profiled; pin it (e.g.
+    port-forward to one pod) when several serve the same address.
+    """
+    routes = [route for route in request.app.routes if not route.path.startswith(router.prefix)]
+    try:
+        result = await profiler.profile(routes, seconds, interval_ms / 1000, mode)
+    except profiler.ProfilerBusy:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A profile is already running in this worker"
+        )
+
+    headers = {"X-Profile-Samples": str(result.sample_count), "X-Profile-Worker": str(os.getpid())}
+    if format == "speedscope":
+        headers["Content-Disposition"] = f'attachment; filename="profile-{os.getpid()}.speedscope.json"'
+        return JSONResponse(result.speedscope(interval_ms / 1000, include_idle), headers=headers)
+    if format == "summary":
+        return JSONResponse(
+            {"samples": result.sample_count, "durationSeconds": round(result.duration, 2), "routes": result.by_route()},
+            headers=headers
+        )
+    return PlainTextResponse(result.collapsed(include_idle), headers=headers)
+
+@router.get("/loop-stalls")
+async def loop_stalls():
+    """Most recent event loop stalls with the stack that caused them"""
+    return {
+        "lagMs": round(loop_monitor.lag * 1000, 1),
+        "stalls": list(loop_monitor.stalls)
+    }
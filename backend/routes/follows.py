@@ -0,0 +1,204 @@
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from utils.responses import success_response
+from utils.dependencies import get_database, get_current_user
+from utils.fanout import CELEBRITY_FOLLOWERS, promote_to_celebrity
+from utils.media import product_media, variant_url
+from datetime import datetime, timezone
+import base64
+
+router = APIRouter(prefix="/users", tags=["Follows"])
+
+def encode_cursor(created_at: datetime, product_id: str) -> str:
+    raw = f"{created_at.isoformat()}|{product_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str):
+    """(created_at as naive UTC, product id) of a feed cursor
+
+    A bare ISO timestamp, as sent by older clients, continues strictly
+    before that instant.
+    """
+    try:
+        created_at, product_id = datetime.fromisoformat(cursor), ""
+    except ValueError:
+        try:
+            raw, product_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+            created_at = datetime.fromisoformat(raw)
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+    # Stored timestamps are naive UTC
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return created_at, product_id
+
+@router.get("/me/following-feed")
+async def get_following_feed(
+    before: str = None,
+    limit: int = Query(20, ge=1, le=50),
+    user_id: str = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """New products from sellers the user follows, newest first
+
+    Normal sellers are read from the user's inbox (fan-out-on-write);
+    sellers with huge followings are queried directly (fan-out-on-read).
+    Pass nextBefore as `before` for the following page.
+    """
+
+    # Keyset on (created_at, product id), so products sharing a timestamp are not skipped
+    after_key = decode_cursor(before) if before else None
+
+    def key(entry):
+        return entry["created_at"], entry.get("product_id") or entry["id"]
+
+    inbox = await db.feed_inboxes.find_one({"_id": user_id}) or {}
+    entries = sorted(
+        (item for item in inbox.get("items", []) if after_key is None or key(item) < after_key),
+        key=key,
+        reverse=True
+    )[:limit]
+
+    celebrity_ids = [
+        edge["followee_id"]
+        async for edge in db.follows.find(
+            {"follower_id": user_id, "celebrity": True}, {"followee_id": 1}
+        )
+    ]
+    if celebrity_ids:
+        query = {"seller_id": {"$in": celebrity_ids}}
+        if after_key is not None:
+            created_at, product_id = after_key
+            query["$or"] = [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "id": {"$lt": product_id}}
+            ]
+        cursor = db.products.find(query, {"id": 1, "seller_id": 1, "created_at": 1})
+        cursor = cursor.sort([("created_at", -1), ("id", -1)]).limit(limit)
+        entries += await cursor.to_list(length=limit)
+
+    # Merge both sources, a product can appear in both around a promotion
+    page = []
+    seen = set()
+    for entry in sorted(entries, key=key, reverse=True):
+        product_id = entry.get("product_id") or entry["id"]
+        if product_id not in seen:
+            seen.add(product_id)
+            page.append(product_id)
+        if len(page) == limit:
+            next_before = encode_cursor(*key(entry))
+            break
+    else:
+        next_before = None
+
+    products = {
+        product["id"]: product
+        async for product in db.products.find({"id": {"$in": page}})
+    }
+    seller_ids = list({product["seller_id"] for product in products.values()})
+    sellers = {
+        seller["id"]: seller
+        async for seller in db.users.find({"id": {"$in": seller_ids}}, {"id": 1, "name": 1, "avatar": 1, "verified": 1})
+    }
+
+    items = []
+    for product_id in page:
+        product = products.get(product_id)
+        if not product:
+            continue
+        seller = sellers.get(product["seller_id"], {})
+        items.append({
+            "id": product["id"],
+            "title": product["title"],
+            "price": product["price"],
+            "currency": product["currency"],
+            "category": product["category"],
+            "images": [variant_url(image, "thumbnail") for image in product_media(product, "image")],
+            "location": product["location"],
+            "status": product["status"],
+            "createdAt": product["created_at"].isoformat(),
+            "seller": {
+                "id": product["seller_id"],
+                "name": seller.get("name"),
+                "avatar": seller.get("avatar"),
+                "verified": seller.get("verified", False)
+            }
+        })
+
+    return success_response(data={
+        "items": items,
+        "nextBefore": next_before
+    })
+
+@router.post("/{seller_id}/follow")
+async def follow_user(
+    seller_id: str,
+    user_id: str = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Follow a seller"""
+
+    if seller_id == user_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cannot follow yourself"
+        )
+
+    seller = await db.users.find_one({"id": seller_id}, {"fanout_on_read": 1})
+    if not seller:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+
+    # The unique (follower_id, followee_id) index rejects duplicate edges
+    try:
+        await db.follows.insert_one({
+            "follower_id": user_id,
+            "followee_id": seller_id,
+            "celebrity": bool(seller.get("fanout_on_read")),
+            "created_at": datetime.utcnow()
+        })
+    except DuplicateKeyError:
+        return success_response(message="Already following")
+
+    updated = await db.users.find_one_and_update(
+        {"id": seller_id},
+        {"$inc": {"followers": 1}},
+        projection={"followers": 1, "fanout_on_read": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    await db.users.update_one({"id": user_id}, {"$inc": {"following": 1}})
+
+    if updated and updated["followers"] >= CELEBRITY_FOLLOWERS and not updated.get("fanout_on_read"):
+        await promote_to_celebrity(db, seller_id)
+
+    return success_response(message="Following")
+
+@router.delete("/{seller_id}/follow")
+async def unfollow_user(
+    seller_id: str,
+    user_id: str = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Stop following a seller"""
+
+    result = await db.follows.delete_one({"follower_id": user_id, "followee_id": seller_id})
+    if result.deleted_count == 0:
+        return success_response(message="Not following")
+
+    await db.users.update_one({"id": seller_id}, {"$inc": {"followers": -1}})
+    await db.users.update_one({"id": user_id}, {"$inc": {"following": -1}})
+
+    # Drop the seller's items from the inbox so the feed reflects the unfollow
+    await db.feed_inboxes.update_one(
+        {"_id": user_id},
+        {"$pull": {"items": {"seller_id": seller_id}}}
+    )
+
+    return success_response(message="Unfollowed")
@@ -0,0 +1,54 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from utils.dependencies import get_database
+import asyncio
+import time
+
+router = APIRouter(prefix="/health", tags=["Health"])
+
+# Readiness probes must answer well within the load balancer timeout
+PING_TIMEOUT_SECONDS = 2.0
+
+_state = {"ready": False, "warmup_ms": None}
+
+def mark_ready(warmup_ms: float):
+    """Called once the startup warm-up has completed"""
+    _state["ready"] = True
+    _state["warmup_ms"] = round(warmup_ms, 1)
+
+async def ping_database(db: AsyncIOMotorDatabase) -> float:
+    """Ping the primary and return the round trip in milliseconds"""
+    started = time.perf_counter()
+    await asyncio.wait_for(db.command("ping"), timeout=PING_TIMEOUT_SECONDS)
+    return (time.perf_counter() - started) * 1000
+
+@router.get("/live")
+async def liveness():
+    """Process is up and serving the event loop"""
+    return {"status": "alive"}
+
+@router.get("/ready")
+async def readiness(db: AsyncIOMotorDatabase = Depends(get_database)):
+    """Worker is warmed up and can reach MongoDB"""
+
+    try:
+        latency_ms = await ping_database(db)
+    except Exception as exc:
+        return JSONResponse(
+            status_code=503,
+            content={
+                "status": "unavailable",
+                "database": {"reachable": False, "error": type(exc).__name__}
+            }
+        )
+
+    ready = _state["ready"]
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "warming_up",
+            "warmupMs": _state["warmup_ms"],
+            "database": {"reachable": True, "latencyMs": round(latency_ms, 2)}
+        }
+    )
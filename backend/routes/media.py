@@ -0,0 +1,83 @@
+from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from utils.responses import success_response
+from utils.dependencies import get_database, get_current_user
+from utils.image_processing import get_executor, process_image
+from utils.storage import get_storage
+from utils.media import signed_url
+from datetime import datetime
+import asyncio
+import uuid
+
+router = APIRouter(prefix="/media", tags=["Media"])
+
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/png", "image/webp", "image/heic", "image/heif"}
+
+@router.post("/images")
+async def upload_image(
+    file: UploadFile = File(...),
+    user_id: str = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Upload a product image; returns a media id to pass as image_media_ids"""
+
+    if file.content_type not in ALLOWED_IMAGE_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Unsupported image type"
+        )
+
+    data = await file.read(MAX_IMAGE_BYTES + 1)
+    if len(data) > MAX_IMAGE_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Image is larger than 10 MB"
+        )
+
+    # Decoding and resizing is CPU heavy, keep it off the event loop and the GIL
+    loop = asyncio.get_running_loop()
+    try:
+        processed = await loop.run_in_executor(get_executor(), process_image, data)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Could not read image"
+        )
+
+    media_id = str(uuid.uuid4())
+    storage = get_storage()
+    variants = []
+    for variant in processed["variants"]:
+        key = f"images/{media_id}/{variant['name']}.{variant['extension']}"
+        variants.append({
+            "name": variant["name"],
+            "path": key,
+            "content_type": variant["content_type"],
+            "width": variant["width"],
+            "height": variant["height"],
+            "size": len(variant["data"])
+        })
+    await asyncio.gather(*(
+        storage.put(meta["path"], variant["data"], variant["content_type"])
+        for meta, variant in zip(variants, processed["variants"])
+    ))
+
+    media_doc = {
+        "id": media_id,
+        "owner_id": user_id,
+        "kind": "image",
+        "variants": variants,
+        "blurhash": processed["blurhash"],
+        "created_at": datetime.utcnow()
+    }
+    await db.media.insert_one(media_doc)
+
+    return success_response(
+        data={
+            "mediaId": media_id,
+            "blurhash": processed["blurhash"],
+            "variants": {variant["name"]: signed_url(variant["path"]) for variant in variants}
+        },
+        message="Image uploaded successfully"
+    )
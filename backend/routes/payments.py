@@ -1,18 +1,20 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Request, Header
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from models.transaction import TransactionCreate, EscrowConfirm, TransactionResponse
+from models.transaction import TransactionCreate, EscrowConfirm, TransactionResponse, PaymentCallback
+from pydantic import ValidationError
 from utils.responses import success_response
 from utils.dependencies import get_database, get_current_user
+from utils.metrics import ESCROW_TRANSITIONS
+from utils import rollups
+from utils.escrow import UNPAID_STATUSES, release_escrow
+from utils.ledger import PLATFORM_COMMISSION, commission_split, get_balances, seller_account, referrer_account, referral_earnings
+from utils.payment_gateway import payment_url, verify_signature
+from utils.payment_inbox import store_callback
 from datetime import datetime
 import uuid
 
 router = APIRouter(prefix="/payments", tags=["Payments"])
 
-# Commission rates
-PLATFORM_COMMISSION = 0.02  # 2% total (1% buyer + 1% seller)
-REFERRAL_L1_RATE = 0.0025  # 0.25%
-REFERRAL_L2_RATE = 0.0025  # 0.25%
-
 @router.post("/create-escrow")
 async def create_escrow_payment(
     transaction_data: TransactionCreate,
@@ -50,26 +52,19 @@ async def create_escrow_payment(
     buyer = await db.users.find_one({"id": user_id})
     seller = await db.users.find_one({"id": product["seller_id"]})
     
-    # Calculate amounts
     amount = product["price"]
-    commission_amount = amount * PLATFORM_COMMISSION
     
-    # Calculate referral commissions
+    # Referral chain: buyer's referrer (Level 1) and their referrer (Level 2)
     referral_l1_id = None
     referral_l2_id = None
-    referral_l1_amount = 0.0
-    referral_l2_amount = 0.0
-    
-    # Check buyer's referrer (Level 1)
     if buyer.get("referred_by"):
         referral_l1_id = buyer["referred_by"]
-        referral_l1_amount = amount * REFERRAL_L1_RATE
-        
-        # Check Level 2 referrer
         l1_referrer = await db.users.find_one({"id": referral_l1_id})
         if l1_referrer and l1_referrer.get("referred_by"):
             referral_l2_id = l1_referrer["referred_by"]
-            referral_l2_amount = amount * REFERRAL_L2_RATE
+    
+    # Commission and referral fees in exact decimals, rounded to centimes
+    split = commission_split(amount, bool(referral_l1_id), bool(referral_l2_id))
     
     # Create transaction
     transaction_id = str(uuid.uuid4())
@@ -84,43 +79,75 @@ async def create_escrow_payment(
         "payment_method": transaction_data.payment_method,
         "status": "in_escrow",  # Money held in escrow
         "escrow_released": False,
-        "commission_rate": PLATFORM_COMMISSION,
-        "commission_amount": commission_amount,
+        "payment_status": "awaiting_payment",  # Set by the gateway callback
+        "commission_rate": float(PLATFORM_COMMISSION),
+        "commission_amount": float(split["commission"]),
         "referral_l1_id": referral_l1_id,
         "referral_l2_id": referral_l2_id,
-        "referral_l1_amount": referral_l1_amount,
-        "referral_l2_amount": referral_l2_amount,
+        "referral_l1_amount": float(split["referral_l1"]),
+        "referral_l2_amount": float(split["referral_l2"]),
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow(),
         "completed_at": None
     }
     
     await db.transactions.insert_one(transaction_doc)
+    ESCROW_TRANSITIONS.inc(from_status="new", to_status="in_escrow")
     
     # Update product status to pending
     await db.products.update_one(
         {"id": product["id"]},
         {"$set": {"status": "pending"}}
     )
+    await rollups.apply_product_change(db, product, {**product, "status": "pending"})
     
-    # Generate payment URL (Mock - will be replaced with real gateway)
-    # For CIB/EDAHABIA integration, you'll need:
-    # 1. Merchant credentials from payment gateway
-    # 2. API endpoints for payment initialization
-    # 3. Callback URLs for success/failure
-    
-    payment_url = f"https://payment-gateway.dz/pay?transaction_id={transaction_id}&amount={amount}&method={transaction_data.payment_method}"
+    # Checkout page on the gateway (backend/mock_gateway.py locally);
+    # the outcome arrives asynchronously on /payments/callback
+    checkout_url = payment_url(transaction_id, amount, transaction_data.payment_method)
     
     return success_response(
         data={
             "escrowId": transaction_id,
-            "paymentUrl": payment_url,
+            "paymentUrl": checkout_url,
             "amount": amount,
             "status": "in_escrow",
             "message": "Payment is being processed. Funds will be held in escrow until you confirm delivery."
         }
     )
 
+@router.post("/callback")
+async def payment_callback(
+    request: Request,
+    x_signature: str = Header(None),
+    x_timestamp: str = Header(None),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Payment gateway callback for CIB/EDAHABIA status changes
+    
+    Only verifies and stores the callback; the payment inbox worker applies
+    it to the transaction, in order per transaction.
+    """
+    
+    body = await request.body()
+    if not verify_signature(x_timestamp, body, x_signature):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid signature"
+        )
+    
+    try:
+        event = PaymentCallback.model_validate_json(body)
+    except ValidationError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid callback payload"
+        )
+    
+    if not await store_callback(db, event.model_dump()):
+        return success_response(message="Callback already received")
+    
+    return success_response(message="Callback received")
+
 @router.post("/confirm-delivery")
 async def confirm_delivery(
     confirm_data: EscrowConfirm,
@@ -163,67 +190,17 @@ async def confirm_delivery(
             detail="Escrow already released"
         )
     
-    # Release escrow
-    await db.transactions.update_one(
-        {"id": confirm_data.transaction_id},
-        {
-            "$set": {
-                "status": "completed",
-                "escrow_released": True,
-                "completed_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
-            }
-        }
-    )
-    
-    # Update product status to sold
-    await db.products.update_one(
-        {"id": transaction["product_id"]},
-        {"$set": {"status": "sold"}}
-    )
-    
-    # Update seller stats
-    await db.users.update_one(
-        {"id": transaction["seller_id"]},
-        {"$inc": {"total_sales": 1}}
-    )
-    
-    # Update buyer stats
-    await db.users.update_one(
-        {"id": transaction["buyer_id"]},
-        {"$inc": {"total_purchases": 1}}
-    )
-    
-    # Update referral earnings (Level 1)
-    if transaction.get("referral_l1_id"):
-        await db.referrals.update_one(
-            {
-                "referrer_id": transaction["referral_l1_id"],
-                "referred_user_id": transaction["buyer_id"],
-                "level": 1
-            },
-            {
-                "$inc": {
-                    "total_earnings": transaction["referral_l1_amount"],
-                    "transaction_count": 1
-                }
-            }
+    if transaction.get("payment_status") in UNPAID_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Payment has not been received"
         )
     
-    # Update referral earnings (Level 2)
-    if transaction.get("referral_l2_id"):
-        await db.referrals.update_one(
-            {
-                "referrer_id": transaction["referral_l2_id"],
-                "referred_user_id": transaction["buyer_id"],
-                "level": 2
-            },
-            {
-                "$inc": {
-                    "total_earnings": transaction["referral_l2_amount"],
-                    "transaction_count": 1
-                }
-            }
+    # Release escrow (shared with the auto-release scheduler)
+    if not await release_escrow(db, transaction):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Escrow already released"
         )
     
     return success_response(
@@ -274,6 +251,26 @@ async def get_user_transactions(
     
     return success_response(data=enriched_transactions)
 
+@router.get("/balance")
+async def get_balance(
+    user_id: str = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Amounts owed to the user from sales and referrals, from the ledger"""
+    
+    sales_account = seller_account(user_id)
+    referrals_account = referrer_account(user_id)
+    balances = await get_balances(db, [sales_account, referrals_account])
+    
+    return success_response(
+        data={
+            "currency": "DZD",
+            "sales": float(balances[sales_account]),
+            "referrals": float(balances[referrals_account]),
+            "total": float(balances[sales_account] + balances[referrals_account])
+        }
+    )
+
 @router.get("/referral-earnings")
 async def get_referral_earnings(
     user_id: str = Depends(get_current_user),
@@ -291,9 +288,10 @@ async def get_referral_earnings(
     l2_cursor = db.referrals.find({"referrer_id": user_id, "level": 2})
     l2_referrals = await l2_cursor.to_list(length=1000)
     
-    # Calculate totals
-    l1_earnings = sum(ref["total_earnings"] for ref in l1_referrals)
-    l2_earnings = sum(ref["total_earnings"] for ref in l2_referrals)
+    # Calculate totals from the ledger's referral credits
+    earnings = await referral_earnings(db, user_id)
+    l1_earnings = float(sum(amount for (_, level), amount in earnings.items() if level == 1))
+    l2_earnings = float(sum(amount for (_, level), amount in earnings.items() if level == 2))
     total_earnings = l1_earnings + l2_earnings
     
     # Get detailed referrals
@@ -307,7 +305,7 @@ async def get_referral_earnings(
                 "joinDate": ref["created_at"].isoformat(),
                 "level": ref["level"],
                 "totalTransactions": ref["transaction_count"],
-                "yourEarnings": ref["total_earnings"],
+                "yourEarnings": float(earnings.get((ref["referred_user_id"], ref["level"]), 0)),
                 "status": ref["status"]
             })
     
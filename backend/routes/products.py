@@ -1,14 +1,23 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, HTTPException, status, Depends, Query, BackgroundTasks
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from models.product import ProductCreate, ProductUpdate, ProductResponse
 from utils.responses import success_response, paginated_response
-from utils.dependencies import get_database, get_current_user
+from utils.dependencies import get_database, get_current_user, get_optional_user
+from utils import rollups
+from utils.recommendations import get_similar_products
+from utils.media import descriptor_from_url, product_media, variant_url
+from utils.fanout import fan_out_product
+from utils.counters import counters
+from utils import analytics
+from utils.rate_limit import rate_limit
+from routes.comments import get_first_comment_page
 from datetime import datetime
+import asyncio
 import uuid
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
-@router.get("")
+@router.get("", dependencies=[rate_limit("products")])
 async def get_products(
     category: str = None,
     location: str = None,
@@ -38,6 +47,7 @@ async def get_products(
     enriched_products = []
     for product in products:
         seller = await db.users.find_one({"id": product["seller_id"]})
+        images = product_media(product, "image")
         product_data = {
             "id": product["id"],
             "title": product["title"],
@@ -45,7 +55,9 @@ async def get_products(
             "currency": product["currency"],
             "category": product["category"],
             "description": product["description"],
-            "images": product["images"],
+            # Cards are small, ship the 480p rendition and a placeholder for the cover
+            "images": [variant_url(image, "480p") for image in images],
+            "blurhash": images[0].get("blurhash") if images else None,
             "location": product["location"],
             "likes": product.get("likes", 0),
             "views": product.get("views", 0),
@@ -85,15 +97,14 @@ async def get_product(
             detail="Product not found"
         )
     
-    # Increment view count
-    await db.products.update_one(
-        {"id": product_id},
-        {"$inc": {"views": 1}}
-    )
+    # Increment view count (written in bulk by the counter flush)
+    counters.add("products", {"id": product_id}, {"views": 1})
+    analytics.record(product_id, product["seller_id"], views=1)
     
     # Get seller info
     seller = await db.users.find_one({"id": product["seller_id"]})
     
+    images = product_media(product, "image")
     product_data = {
         "id": product["id"],
         "title": product["title"],
@@ -101,7 +112,8 @@ async def get_product(
         "price": product["price"],
         "currency": product["currency"],
         "category": product["category"],
-        "images": product["images"],
+        "images": [variant_url(image, "720p") for image in images],
+        "blurhash": images[0].get("blurhash") if images else None,
         "location": product["location"],
         "likes": product.get("likes", 0),
         "views": product.get("views", 0) + 1,
@@ -120,9 +132,162 @@ async def get_product(
     
     return success_response(data=product_data)
 
+async def load_similar_cards(db: AsyncIOMotorDatabase, product_id: str, limit: int):
+    """Similar products with their sellers, using the precomputed neighbour lists"""
+    
+    products = await get_similar_products(db, [product_id], limit)
+    
+    # Resolve all sellers in one query
+    seller_ids = list({product["seller_id"] for product in products})
+    sellers = {
+        seller["id"]: seller
+        async for seller in db.users.find({"id": {"$in": seller_ids}})
+    }
+    
+    similar = []
+    for product in products:
+        seller = sellers.get(product["seller_id"], {})
+        similar.append({
+            "id": product["id"],
+            "title": product["title"],
+            "price": product["price"],
+            "currency": product["currency"],
+            "category": product["category"],
+            "images": [variant_url(image, "thumbnail") for image in product_media(product, "image")],
+            "location": product["location"],
+            "likes": product.get("likes", 0),
+            "status": product["status"],
+            "seller": {
+                "id": product["seller_id"],
+                "name": seller.get("name"),
+                "avatar": seller.get("avatar"),
+                "verified": seller.get("verified", False)
+            }
+        })
+    return similar
+
+@router.get("/{product_id}/similar")
+async def get_similar(
+    product_id: str,
+    limit: int = Query(10, ge=1, le=50),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Get products similar to this one, from the precomputed neighbour lists"""
+    
+    similar = await load_similar_cards(db, product_id, limit)
+    
+    return success_response(data=similar)
+
+DETAIL_PARTS = {"seller", "like", "comments", "similar"}
+
+@router.get("/{product_id}/detail")
+async def get_product_detail(
+    product_id: str,
+    include: str = ",".join(sorted(DETAIL_PARTS)),
+    similar_limit: int = Query(6, ge=1, le=20),
+    viewer_id: str = Depends(get_optional_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Everything the product screen needs in one round trip
+
+    `include` is a comma separated subset of seller, like, comments, similar.
+    The parts are fetched concurrently once the product is loaded.
+    """
+    
+    parts = {part.strip() for part in include.split(",") if part.strip()}
+    unknown = parts - DETAIL_PARTS
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown include: {', '.join(sorted(unknown))}"
+        )
+    
+    product = await db.products.find_one({"id": product_id})
+    if not product:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found"
+        )
+    
+    # Increment view count (written in bulk by the counter flush)
+    counters.add("products", {"id": product_id}, {"views": 1})
+    analytics.record(product_id, product["seller_id"], views=1)
+    
+    lookups = {}
+    if "seller" in parts:
+        lookups["seller"] = db.users.find_one(
+            {"id": product["seller_id"]},
+            {"id": 1, "name": 1, "avatar": 1, "rating": 1, "verified": 1, "followers": 1}
+        )
+    if "like" in parts and viewer_id:
+        lookups["like"] = db.likes.find_one({"user_id": viewer_id, "product_id": product_id}, {"_id": 1})
+    if "comments" in parts:
+        lookups["comments"] = get_first_comment_page(db, product_id)
+    if "similar" in parts:
+        lookups["similar"] = load_similar_cards(db, product_id, similar_limit)
+    results = dict(zip(lookups, await asyncio.gather(*lookups.values())))
+    
+    images = product_media(product, "image")
+    data = {
+        "product": {
+            "id": product["id"],
+            "title": product["title"],
+            "description": product["description"],
+            "price": product["price"],
+            "currency": product["currency"],
+            "category": product["category"],
+            "images": [variant_url(image, "720p") for image in images],
+            "blurhash": images[0].get("blurhash") if images else None,
+            "location": product["location"],
+            "likes": product.get("likes", 0),
+            "views": product.get("views", 0) + 1,
+            "comments": product.get("comments_count", 0),
+            "status": product["status"],
+            "createdAt": product["created_at"].isoformat()
+        }
+    }
+    
+    if "seller" in parts:
+        seller = results["seller"] or {}
+        data["seller"] = {
+            "id": product["seller_id"],
+            "name": seller.get("name"),
+            "avatar": seller.get("avatar"),
+            "rating": seller.get("rating", 0.0),
+            "verified": seller.get("verified", False),
+            "followers": seller.get("followers", 0)
+        }
+    if "like" in parts:
+        data["liked"] = bool(results.get("like"))
+    if "comments" in parts:
+        data["comments"] = results["comments"]
+    if "similar" in parts:
+        data["similar"] = results["similar"]
+    
+    return success_response(data=data)
+
+async def resolve_image_media(db: AsyncIOMotorDatabase, user_id: str, media_ids: list, urls: list) -> list:
+    """Descriptors for a product's images: the seller's uploads first, then any raw URLs"""
+    image_media = []
+    if media_ids:
+        uploads = await db.media.find(
+            {"id": {"$in": media_ids}, "owner_id": user_id, "kind": "image"},
+            {"_id": 0, "owner_id": 0}
+        ).to_list(length=len(media_ids))
+        by_id = {media["id"]: media for media in uploads}
+        missing = [media_id for media_id in media_ids if media_id not in by_id]
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Unknown image media id"
+            )
+        image_media = [by_id[media_id] for media_id in media_ids]
+    return image_media + [descriptor_from_url(url, "image") for url in urls]
+
 @router.post("")
 async def create_product(
     product_data: ProductCreate,
+    background_tasks: BackgroundTasks,
     user_id: str = Depends(get_current_user),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
@@ -130,6 +295,8 @@ async def create_product(
     
     product_id = str(uuid.uuid4())
     
+    image_media = await resolve_image_media(db, user_id, product_data.image_media_ids, product_data.images)
+    
     product_doc = {
         "id": product_id,
         "seller_id": user_id,
@@ -139,16 +306,24 @@ async def create_product(
         "currency": "DZD",
         "category": product_data.category,
         "images": product_data.images,
+        "videos": product_data.videos,
+        "image_media": image_media,
+        "video_media": [descriptor_from_url(url, "video") for url in product_data.videos],
         "location": product_data.location,
         "status": "available",
         "likes": 0,
         "views": 0,
+        "video_views": 0,
         "comments_count": 0,
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow()
     }
     
     await db.products.insert_one(product_doc)
+    await rollups.apply_product_change(db, None, product_doc)
+    
+    # Deliver to followers' inboxes after the response is sent
+    background_tasks.add_task(fan_out_product, db, product_doc)
     
     return success_response(
         data={"productId": product_id},
@@ -188,8 +363,13 @@ async def update_product(
         update_doc["price"] = product_data.price
     if product_data.category:
         update_doc["category"] = product_data.category
-    if product_data.images:
-        update_doc["images"] = product_data.images
+    if product_data.images is not None or product_data.image_media_ids is not None:
+        # The new lists replace every image; send the upload ids to keep uploaded images
+        images = product_data.images or []
+        image_media = await resolve_image_media(db, user_id, product_data.image_media_ids or [], images)
+        if image_media:
+            update_doc["images"] = images
+            update_doc["image_media"] = image_media
     if product_data.location:
         update_doc["location"] = product_data.location
     if product_data.status:
@@ -200,6 +380,9 @@ async def update_product(
         {"$set": update_doc}
     )
     
+    if "status" in update_doc or "category" in update_doc:
+        await rollups.apply_product_change(db, product, {**product, **update_doc})
+    
     return success_response(message="Product updated successfully")
 
 @router.post("/{product_id}/like")
@@ -224,6 +407,7 @@ async def like_product(
         # Unlike
         await db.likes.delete_one({"user_id": user_id, "product_id": product_id})
         await db.products.update_one({"id": product_id}, {"$inc": {"likes": -1}})
+        analytics.record(product_id, product["seller_id"], likes=-1)
         return success_response(message="Product unliked")
     else:
         # Like
@@ -234,4 +418,5 @@ async def like_product(
             "created_at": datetime.utcnow()
         })
         await db.products.update_one({"id": product_id}, {"$inc": {"likes": 1}})
+        analytics.record(product_id, product["seller_id"], likes=1)
         return success_response(message="Product liked")
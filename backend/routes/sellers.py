@@ -0,0 +1,49 @@
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from utils.responses import success_response
+from utils.dependencies import get_database, get_current_user
+from utils.analytics import MAX_BUCKETS, read_series
+
+router = APIRouter(prefix="/sellers", tags=["Sellers"])
+
+@router.get("/me/analytics")
+async def get_my_analytics(
+    granularity: str = Query("day", pattern="^(hour|day)$"),
+    periods: int = Query(30, ge=1, le=365),
+    product_id: str = None,
+    user_id: str = Depends(get_current_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Views, video views, likes, sales and revenue over time
+
+    Reads pre-aggregated buckets only (at most one document per period),
+    for the whole shop or for one of the seller's products.
+    """
+
+    if periods > MAX_BUCKETS[granularity]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BUCKETS[granularity]} periods are available at {granularity} granularity"
+        )
+
+    if product_id:
+        collection = "product_stats"
+        owner_filter = {"product_id": product_id, "seller_id": user_id}
+        product = await db.products.find_one({"id": product_id}, {"seller_id": 1})
+        if not product or product["seller_id"] != user_id:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Product not found"
+            )
+    else:
+        collection = "seller_stats"
+        owner_filter = {"seller_id": user_id}
+
+    series, totals = await read_series(db, collection, owner_filter, granularity, periods)
+
+    return success_response(data={
+        "granularity": granularity,
+        "productId": product_id,
+        "totals": totals,
+        "series": series
+    })
@@ -1,17 +1,30 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from utils.responses import success_response
 from utils.dependencies import get_database, get_current_user
-from datetime import datetime
-import uuid
+from utils.cache import TTLCache
+from utils import rollups, interactions, analytics
+from utils.counters import counters
+from utils.recommendations import get_similar_products
+from utils.seen import load_seen, mark_seen
+from utils.media import product_media, variant_url, poster_url, client_video_variant
+from datetime import datetime, timedelta
+import asyncio
+import os
 
 router = APIRouter(prefix="/shorts", tags=["Shorts"])
 
+# The non-personalized feed is identical for every user, so it is cached briefly
+feed_cache = TTLCache("shorts_feed", ttl=float(os.environ.get("FEED_CACHE_TTL", "15")))
+categories_cache = TTLCache("shorts_categories", ttl=float(os.environ.get("CATEGORIES_CACHE_TTL", "60")), maxsize=1)
+
 @router.get("/feed")
 async def get_shorts_feed(
+    request: Request,
     category: str = None,
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=50),
+    quality: str = None,
     db: AsyncIOMotorDatabase = Depends(get_database),
     user_id: str = Depends(get_current_user)
 ):
@@ -27,12 +40,23 @@ async def get_shorts_feed(
         query["category"] = category
     
     # Get user preferences for personalization
-    user_prefs = await db.user_preferences.find_one({"user_id": user_id})
+    user_prefs = None
+    if not category:
+        user_prefs = await db.user_preferences.find_one({"user_id": user_id})
+    
+    # Only one rendition per video goes out, chosen from the client's hints
+    variant = client_video_variant(quality, request.headers)
+    
+    personalized = bool(user_prefs)
+    if not personalized:
+        cached = feed_cache.get((category, page, limit, variant))
+        if cached is not None:
+            return cached
     
     # Get products with videos
     skip = (page - 1) * limit
     
-    if user_prefs and not category:
+    if personalized:
         # Personalized feed based on user preferences
         # Sort categories by score
         sorted_categories = sorted(
@@ -41,21 +65,55 @@ async def get_shorts_feed(
             reverse=True
         )
         
-        # Get products from preferred categories
+        # Already watched items (bloom filter) and the last day of activity
+        seen, recent = await asyncio.gather(
+            load_seen(db, user_id),
+            interactions.get_recent_interactions(
+                db, user_id, datetime.utcnow() - timedelta(days=1), limit=50
+            )
+        )
+        
         products = []
+        picked = set()
+        
+        def pick(candidates, budget, allow_seen=False):
+            """Add up to `budget` candidates, skipping duplicates and watched items"""
+            added = 0
+            for product in candidates:
+                if added >= budget:
+                    break
+                if product["id"] in picked or (not allow_seen and product["id"] in seen):
+                    continue
+                picked.add(product["id"])
+                products.append(product)
+                added += 1
+        
+        # Blend in items similar to what the user watched in the last day.
+        # Queries over-fetch so filtering still leaves enough items.
+        similar = await get_similar_products(
+            db, [interaction["product_id"] for interaction in recent], limit // 2, query
+        )
+        pick(similar, limit // 4)
+        
+        # Get products from preferred categories
+        per_category = max(1, (limit - len(products)) // 3)
         for cat, score in sorted_categories[:3]:  # Top 3 categories
             cat_query = query.copy()
             cat_query["category"] = cat
-            cursor = db.products.find(cat_query).sort("video_views", -1).limit(limit // 3)
-            cat_products = await cursor.to_list(length=limit // 3)
-            products.extend(cat_products)
+            cursor = db.products.find(cat_query).sort("video_views", -1).limit(per_category * 2)
+            cat_products = await cursor.to_list(length=per_category * 2)
+            pick(cat_products, per_category)
         
-        # Fill remaining with random
+        # Fill remaining with recent items not picked yet
         if len(products) < limit:
             remaining = limit - len(products)
-            cursor = db.products.find(query).sort("created_at", -1).limit(remaining)
-            more_products = await cursor.to_list(length=remaining)
-            products.extend(more_products)
+            fill_query = query.copy()
+            fill_query["id"] = {"$nin": list(picked)}
+            cursor = db.products.find(fill_query).sort("created_at", -1).limit(remaining * 2)
+            more_products = await cursor.to_list(length=remaining * 2)
+            pick(more_products, remaining)
+            # Rewatching beats an empty feed once everything new is exhausted
+            pick(more_products, limit - len(products), allow_seen=True)
     else:
         # Default feed - most viewed or recent
         cursor = db.products.find(query).sort([
@@ -68,6 +126,8 @@ async def get_shorts_feed(
     enriched_products = []
     for product in products:
         seller = await db.users.find_one({"id": product["seller_id"]})
+        videos = product_media(product, "video")
+        images = product_media(product, "image")
         
         product_data = {
             "id": product["id"],
@@ -76,8 +136,9 @@ async def get_shorts_feed(
             "price": product["price"],
             "currency": product["currency"],
             "category": product["category"],
-            "images": product["images"],
-            "videos": product.get("videos", []),
+            "images": [variant_url(image, "thumbnail") for image in images],
+            "videos": [variant_url(video, variant) for video in videos],
+            "poster": poster_url(videos[0] if videos else None, images[0] if images else None),
             "location": product["location"],
             "likes": product.get("likes", 0),
             "views": product.get("views", 0),
@@ -94,10 +155,15 @@ async def get_shorts_feed(
         }
         enriched_products.append(product_data)
     
-    return success_response(data={
+    response = success_response(data={
         "products": enriched_products,
         "hasMore": len(enriched_products) == limit
     })
+    
+    if not personalized:
+        feed_cache.set((category, page, limit, variant), response)
+    
+    return response
 
 @router.post("/track-view")
 async def track_video_view(
@@ -113,23 +179,14 @@ async def track_video_view(
     if not product:
         return success_response(message="Product not found")
     
-    # Increment video views
-    await db.products.update_one(
-        {"id": product_id},
-        {"$inc": {"video_views": 1}}
-    )
+    # Increment video views (written in bulk by the counter flush)
+    counters.add("products", {"id": product_id}, {"video_views": 1})
+    rollups.record_video_view(product)
+    analytics.record(product_id, product["seller_id"], video_views=1)
     
     # Track interaction
-    interaction = {
-        "id": str(uuid.uuid4()),
-        "user_id": user_id,
-        "product_id": product_id,
-        "category": product["category"],
-        "interaction_type": "watch_video",
-        "duration": duration,
-        "created_at": datetime.utcnow()
-    }
-    await db.user_interactions.insert_one(interaction)
+    await interactions.record_interaction(db, user_id, product, "watch_video", duration)
+    await mark_seen(db, user_id, product_id)
     
     # Update user preferences
     await update_user_preferences(user_id, product["category"], db)
@@ -142,68 +199,64 @@ async def get_categories_with_videos(
 ):
     """Get categories that have products with videos"""
     
-    # Aggregate categories with video count
-    pipeline = [
-        {
-            "$match": {
-                "videos": {"$exists": True, "$ne": []},
-                "status": "available"
-            }
-        },
-        {
-            "$group": {
-                "_id": "$category",
-                "count": {"$sum": 1},
-                "totalViews": {"$sum": "$video_views"}
-            }
-        },
-        {
-            "$sort": {"count": -1}
-        }
-    ]
+    category_data = categories_cache.get("all")
+    if category_data is None:
+        category_data = await load_categories_with_videos(db)
+    
+    return success_response(data=category_data)
+
+async def load_categories_with_videos(db: AsyncIOMotorDatabase):
+    """Read the category list from the rollups and store it in the cache"""
     
-    categories = await db.products.aggregate(pipeline).to_list(length=100)
+    cursor = db.category_rollups.find({"video_count": {"$gt": 0}}).sort("video_count", -1)
+    categories = await cursor.to_list(length=100)
     
     category_data = [
         {
             "id": cat["_id"].lower().replace(" ", "-"),
             "name": cat["_id"],
-            "videoCount": cat["count"],
-            "totalViews": cat["totalViews"]
+            "videoCount": cat["video_count"],
+            "totalViews": cat["total_views"]
         }
         for cat in categories
     ]
     
-    return success_response(data=category_data)
+    categories_cache.set("all", category_data)
+    return category_data
+
+@router.get("/categories/trending")
+async def get_trending_categories(
+    limit: int = Query(10, ge=1, le=50),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Get categories ranked by video views in the last 24 hours"""
+    
+    trending = await rollups.get_trending_categories(db, limit)
+    
+    return success_response(data=[
+        {
+            "id": cat["_id"].lower().replace(" ", "-"),
+            "name": cat["_id"],
+            "views24h": cat["views"]
+        }
+        for cat in trending
+    ])
 
 async def update_user_preferences(user_id: str, category: str, db: AsyncIOMotorDatabase):
     """Update user category preferences based on interactions"""
     
     # Get all user interactions in last 30 days
-    from datetime import timedelta
     thirty_days_ago = datetime.utcnow() - timedelta(days=30)
     
-    cursor = db.user_interactions.find({
-        "user_id": user_id,
-        "created_at": {"$gte": thirty_days_ago}
-    })
-    interactions = await cursor.to_list(length=1000)
+    recent = await interactions.get_recent_interactions(db, user_id, thirty_days_ago)
     
     # Calculate category scores
     category_scores = {}
-    for interaction in interactions:
+    for interaction in recent:
         cat = interaction["category"]
-        weight = 1.0
-        
-        # Different weights for different interactions
-        if interaction["interaction_type"] == "purchase":
-            weight = 5.0
-        elif interaction["interaction_type"] == "like":
-            weight = 2.0
-        elif interaction["interaction_type"] == "watch_video":
-            # More weight if watched longer
-            duration = interaction.get("duration", 0)
-            weight = min(3.0, 1.0 + (duration / 30))  # Max 3.0 for 60+ seconds
+        weight = interactions.interaction_weight(
+            interaction["interaction_type"], interaction.get("duration", 0)
+        )
         
         category_scores[cat] = category_scores.get(cat, 0) + weight
     
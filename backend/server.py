@@ -1,27 +1,63 @@
-from fastapi import FastAPI, APIRouter
 from dotenv import load_dotenv
-from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from pathlib import Path
 import os
+import time
+
+# Load the environment before anything else: modules read settings such as
+# the JWT secret, CDN keys and pool sizes when they are imported
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+_import_started = time.perf_counter()
+_import_profiler = None
+if os.environ.get("IMPORT_PROFILE") == "1":
+    from utils.import_profile import ImportProfiler
+    _import_profiler = ImportProfiler().install()
+
+from fastapi import FastAPI, APIRouter, Request
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.staticfiles import StaticFiles
+from pymongo import monitoring
+from pymongo.errors import OperationFailure
+import asyncio
 import logging
-from pathlib import Path
 
 # Import route modules
-from routes import auth, products, payments, shorts
+from routes import auth, products, payments, shorts, health, media, comments, follows, sellers, debug
+from utils import db_monitor, request_log
+from utils.auth import preload_bcrypt
+from utils.dependencies import get_client, get_database
+from utils.indexes import ensure_indexes
+from utils import rollups, escrow, payment_inbox
+from utils.storage import MEDIA_ROOT
+from utils.counters import counters
+from utils.coordination import get_coordinator
+from utils.loop_monitor import loop_monitor
+from utils.load_shedding import should_shed
+from utils.openapi import install_cached_openapi
+from utils.metrics import (
+    REGISTRY, HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT, MONGO_POOL_MAX_SIZE, APP_IMPORT_SECONDS, LOAD_SHED,
+    start_worker_metrics_server
+)
 
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
+# Mongo command instrumentation (must be registered before clients are created)
+monitoring.register(db_monitor.CommandInstrumentation())
+monitoring.register(db_monitor.PoolInstrumentation())
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Interactive docs and the OpenAPI schema are off in production unless enabled
+ENABLE_DOCS = os.environ.get(
+    "ENABLE_DOCS", "false" if os.environ.get("ENVIRONMENT") == "production" else "true"
+).lower() == "true"
 
 # Create the main app without a prefix
 app = FastAPI(
     title="DzaMarket API",
     description="Social Marketplace for Algeria",
-    version="1.0.0"
+    version="1.0.0",
+    docs_url="/docs" if ENABLE_DOCS else None,
+    redoc_url="/redoc" if ENABLE_DOCS else None,
+    openapi_url="/openapi.json" if ENABLE_DOCS else None
 )
 
 # Create a router with the /api prefix
@@ -42,10 +78,92 @@ api_router.include_router(auth.router)
 api_router.include_router(products.router)
 api_router.include_router(payments.router)
 api_router.include_router(shorts.router)
+api_router.include_router(health.router)
+api_router.include_router(media.router)
+api_router.include_router(comments.router)
+api_router.include_router(follows.router)
+api_router.include_router(sellers.router)
 
 # Include the router in the main app
 app.include_router(api_router)
 
+# Operator tooling stays off the public /api prefix
+app.include_router(debug.router)
+
+# Schema generation is cached on disk and only happens on the first docs request
+install_cached_openapi(
+    app,
+    Path(os.environ.get("OPENAPI_CACHE_PATH", ROOT_DIR / "openapi.json")),
+    source_dirs=[ROOT_DIR / "models"]
+)
+
+# Local stand-in for the CDN when media is stored on disk
+if os.environ.get("MEDIA_STORAGE", "local") == "local":
+    os.makedirs(MEDIA_ROOT, exist_ok=True)
+    app.mount("/api/media/files", StaticFiles(directory=MEDIA_ROOT), name="media-files")
+
+# Prometheus scrape endpoint, served outside /api so the public ingress does not expose it.
+# Under gunicorn it only shows the worker that answered: scrape the per-worker ports instead
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.middleware("http")
+async def shed_load(request: Request, call_next):
+    """Turn requests away early while the loop or the Mongo pool is saturated"""
+    reason = should_shed(request.url.path)
+    if reason is not None:
+        LOAD_SHED.inc(reason=reason)
+        return JSONResponse(
+            {"detail": "Server is busy, please retry shortly"},
+            status_code=503,
+            headers={"Retry-After": "1"},
+        )
+    return await call_next(request)
+
+@app.middleware("http")
+async def instrument_request(request: Request, call_next):
+    """Assign the request id, record latency and Mongo usage, write the access log"""
+    context, log_token = request_log.begin_request(request.headers.get("x-request-id"))
+    stats, token = db_monitor.begin_request()
+    HTTP_REQUESTS_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        duration = time.perf_counter() - started
+        db_monitor.end_request(token)
+        HTTP_REQUESTS_IN_FLIGHT.dec()
+        # Label by route template to keep cardinality bounded
+        route = request.scope.get("route")
+        route_path = route.path if route is not None else "unmatched"
+        HTTP_REQUEST_DURATION.observe(
+            duration,
+            method=request.method,
+            route=route_path,
+            status=status_code,
+        )
+        request_log.log_access(request, context, route_path, status_code, duration, stats)
+
+        if stats.command_count > db_monitor.REQUEST_COMMAND_BUDGET:
+            logger.warning(
+                "%s %s issued %d Mongo commands in %.1fms (slowest: %s %.1fms)",
+                request.method,
+                request.url.path,
+                stats.command_count,
+                stats.total_time_ms,
+                stats.slowest_command,
+                stats.slowest_time_ms,
+            )
+        request_log.end_request(log_token)
+
+    response.headers["X-Request-ID"] = context.request_id
+    response.headers["X-DB-Commands"] = str(stats.command_count)
+    response.headers["X-DB-Time-Ms"] = f"{stats.total_time_ms:.1f}"
+    return response
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -54,13 +172,92 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configure logging (plain text, or JSON with LOG_FORMAT=json)
+request_log.configure_logging()
 logger = logging.getLogger(__name__)
 
+async def warm_up_worker(db):
+    """Connect the Mongo pool and fill hot caches, returns the time taken in ms"""
+    started = time.perf_counter()
+    # Server discovery and the first pooled connections happen here
+    await health.ping_database(db)
+    try:
+        await ensure_indexes(db)
+    except OperationFailure:
+        # E.g. duplicates blocking a unique index; retrying cannot fix the data,
+        # so serve without it and leave the failure to jobs/ensure_indexes.py
+        logger.exception("Creating indexes failed, continuing without them")
+    # First deploy of the rollups: build them before serving the category list
+    if await db.category_rollups.estimated_document_count() == 0:
+        await rollups.rebuild_category_rollups(db)
+    await asyncio.gather(
+        shorts.load_categories_with_videos(db),
+        preload_bcrypt(),
+    )
+    return (time.perf_counter() - started) * 1000
+
+async def retry_warm_up(db, interval: float = 5.0):
+    """Keep trying until MongoDB becomes reachable"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            warmup_ms = await warm_up_worker(db)
+        except Exception as exc:
+            logger.warning("Startup warm-up still failing: %r", exc)
+            continue
+        health.mark_ready(warmup_ms)
+        logger.info("Worker warmed up in %.1fms", warmup_ms)
+        return
+
+@app.on_event("startup")
+async def warm_up():
+    """Warm the worker before it reports ready to the load balancer"""
+    # The Mongo client and coordinator are created here, per worker, rather
+    # than at import so gunicorn can preload the app before forking
+    request_log.start_listener()
+    app.state.metrics_server = start_worker_metrics_server()
+    client = get_client()
+    db = get_database()
+    MONGO_POOL_MAX_SIZE.set(client.options.pool_options.max_pool_size)
+    await get_coordinator().start()
+    
+    app.state.loop_monitor_task = asyncio.create_task(loop_monitor.run())
+    app.state.counter_task = asyncio.create_task(counters.run(db))
+    app.state.rollup_task = asyncio.create_task(
+        rollups.run_periodic_rebuild(db, float(os.environ.get("ROLLUP_REBUILD_INTERVAL", "3600")))
+    )
+    app.state.escrow_task = asyncio.create_task(escrow.run_scheduler(db))
+    app.state.payment_task = asyncio.create_task(payment_inbox.run_worker(db))
+    try:
+        warmup_ms = await warm_up_worker(db)
+    except Exception:
+        # Stay alive but not ready; keep retrying in the background
+        logger.exception("Startup warm-up failed")
+        app.state.warm_up_task = asyncio.create_task(retry_warm_up(db))
+        return
+    health.mark_ready(warmup_ms)
+    logger.info("Worker warmed up in %.1fms", warmup_ms)
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    app.state.loop_monitor_task.cancel()
+    app.state.counter_task.cancel()
+    app.state.rollup_task.cancel()
+    app.state.escrow_task.cancel()
+    app.state.payment_task.cancel()
+    # Still running when Mongo never became reachable
+    warm_up_task = getattr(app.state, "warm_up_task", None)
+    if warm_up_task is not None:
+        warm_up_task.cancel()
+    await counters.flush(get_database())
+    await get_coordinator().close()
+    get_client().close()
+    if app.state.metrics_server is not None:
+        app.state.metrics_server.shutdown()
+        app.state.metrics_server.server_close()
+    request_log.stop_listener()
+
+APP_IMPORT_SECONDS.set(time.perf_counter() - _import_started)
+if _import_profiler is not None:
+    _import_profiler.uninstall()
+    logger.info(_import_profiler.report())
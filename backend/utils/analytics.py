@@ -0,0 +1,68 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from datetime import datetime, timedelta
+from .counters import counters
+
+METRICS = ("views", "video_views", "likes", "sales", "revenue")
+
+# Hourly buckets are only kept for recent charts, daily ones are kept forever
+HOURLY_RETENTION_DAYS = 14
+
+# Largest window a single analytics read may cover
+MAX_BUCKETS = {"hour": 7 * 24, "day": 365}
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def record(product_id: str, seller_id: str, **amounts):
+    """Add to the product's and seller's hourly and daily buckets on the next counter flush"""
+    now = datetime.utcnow()
+    for granularity in ("hour", "day"):
+        bucket = bucket_start(now, granularity)
+        counters.add(
+            "product_stats",
+            {"product_id": product_id, "granularity": granularity, "bucket": bucket},
+            amounts,
+            upsert=True,
+            on_insert={"seller_id": seller_id}
+        )
+        counters.add(
+            "seller_stats",
+            {"seller_id": seller_id, "granularity": granularity, "bucket": bucket},
+            amounts,
+            upsert=True
+        )
+
+async def read_series(
+    db: AsyncIOMotorDatabase,
+    collection: str,
+    owner_filter: dict,
+    granularity: str,
+    periods: int
+):
+    """Bucket series for the last `periods` hours/days, zero-filled
+
+    `periods` must not exceed MAX_BUCKETS[granularity].
+    """
+    step = timedelta(hours=1) if granularity == "hour" else timedelta(days=1)
+    end = bucket_start(datetime.utcnow(), granularity)
+    start = end - step * (periods - 1)
+
+    query = dict(owner_filter, granularity=granularity, bucket={"$gte": start})
+    docs = {
+        doc["bucket"]: doc
+        async for doc in db[collection].find(query).sort("bucket", 1).limit(periods)
+    }
+
+    series = []
+    totals = dict.fromkeys(METRICS, 0)
+    for index in range(periods):
+        bucket = start + step * index
+        doc = docs.get(bucket, {})
+        point = {"bucket": bucket.isoformat()}
+        for metric in METRICS:
+            point[metric] = doc.get(metric, 0)
+            totals[metric] += point[metric]
+        series.append(point)
+    return series, totals
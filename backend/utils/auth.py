@@ -2,11 +2,19 @@ from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from .metrics import BCRYPT_QUEUE_DEPTH, BCRYPT_DURATION
+import asyncio
 import os
+import time
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt is CPU bound, so it runs on a small dedicated pool instead of the event loop
+BCRYPT_WORKERS = int(os.environ.get("BCRYPT_WORKERS", str(min(4, os.cpu_count() or 1))))
+_bcrypt_executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+
 # JWT settings
 SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
@@ -20,6 +28,34 @@ def get_password_hash(password: str) -> str:
     """Hash a password"""
     return pwd_context.hash(password)
 
+def _run_bcrypt(operation: str, fn, *args):
+    BCRYPT_QUEUE_DEPTH.dec()
+    started = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        BCRYPT_DURATION.observe(time.perf_counter() - started, operation=operation)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the bcrypt pool"""
+    BCRYPT_QUEUE_DEPTH.inc()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _bcrypt_executor, _run_bcrypt, "verify", verify_password, plain_password, hashed_password
+    )
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password on the bcrypt pool"""
+    BCRYPT_QUEUE_DEPTH.inc()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _bcrypt_executor, _run_bcrypt, "hash", get_password_hash, password
+    )
+
+async def preload_bcrypt():
+    """Load the bcrypt backend and start the pool threads before traffic arrives"""
+    await asyncio.gather(*(get_password_hash_async("warm-up") for _ in range(BCRYPT_WORKERS)))
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
     to_encode = data.copy()
@@ -0,0 +1,191 @@
+from abc import ABC, abstractmethod
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from typing import Hashable, Optional
+from .cache import CACHES, TTLCache
+from .dependencies import get_database
+from .leases import Lease, worker_id
+import asyncio
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# redis://host:port/db enables the Redis backend (any Redis-compatible server works)
+COORDINATION_URL = os.environ.get("COORDINATION_URL", "")
+
+class Coordinator(ABC):
+    """Cross-worker cache invalidation and leader election
+
+    Each gunicorn/uvicorn worker has its own in-process caches and starts
+    the same background loops; the coordinator tells the other workers to
+    drop stale cache entries and picks one worker to run each periodic job.
+    """
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def publish_invalidation(self, cache_name: str, key: Optional[Hashable]):
+        """Tell the other workers to drop a cache entry (None drops the whole cache)"""
+
+    @abstractmethod
+    async def acquire(self, name: str, ttl: float) -> bool:
+        """Take or renew leadership of `name` for `ttl` seconds"""
+
+    @abstractmethod
+    async def release(self, name: str):
+        """Give up leadership of `name`"""
+
+class LocalCoordinator(Coordinator):
+    """Single-box default without extra infrastructure
+
+    Cache invalidation stays in this process, so other workers serve
+    entries until their TTL runs out. Leadership uses the lease in MongoDB,
+    which every worker already shares.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+        self._leases = {}
+
+    async def publish_invalidation(self, cache_name, key):
+        pass
+
+    async def acquire(self, name, ttl):
+        lease = self._leases.get(name)
+        if lease is None:
+            lease = self._leases[name] = Lease(self.db, name, ttl)
+        return await lease.acquire()
+
+    async def release(self, name):
+        lease = self._leases.pop(name, None)
+        if lease is not None:
+            await lease.release()
+
+# Take the key if it is free or already ours, and (re)set its expiry
+_ACQUIRE_SCRIPT = """
+local holder = redis.call('GET', KEYS[1])
+if holder == false or holder == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+class RedisCoordinator(Coordinator):
+    """Invalidations over Redis pub/sub, leadership as expiring Redis keys"""
+
+    CHANNEL = "dzamarket:cache-invalidation"
+    LEADER_PREFIX = "dzamarket:leader:"
+
+    def __init__(self, url: str):
+        # Optional dependency, only needed when COORDINATION_URL points at Redis
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url)
+        self._listener = None
+
+    async def start(self):
+        self._listener = asyncio.create_task(self._listen())
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+        await self.redis.aclose()
+
+    async def _listen(self):
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.CHANNEL)
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        event = json.loads(message["data"])
+                        if event["origin"] == worker_id():
+                            continue
+                        cache = CACHES.get(event["cache"])
+                        if cache is not None:
+                            key = event["key"]
+                            cache.invalidate(tuple(key) if isinstance(key, list) else key)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Invalidations sent while disconnected are lost, start from empty caches
+                logger.exception("Cache invalidation listener lost its Redis connection")
+                for cache in CACHES.values():
+                    cache.invalidate()
+                await asyncio.sleep(1.0)
+
+    async def publish_invalidation(self, cache_name, key):
+        await self.redis.publish(
+            self.CHANNEL,
+            json.dumps({"cache": cache_name, "key": key, "origin": worker_id()})
+        )
+
+    async def acquire(self, name, ttl):
+        acquired = await self.redis.eval(
+            _ACQUIRE_SCRIPT, 1, self.LEADER_PREFIX + name, worker_id(), int(ttl * 1000)
+        )
+        return bool(acquired)
+
+    async def release(self, name):
+        await self.redis.eval(_RELEASE_SCRIPT, 1, self.LEADER_PREFIX + name, worker_id())
+
+_coordinator = None
+
+def get_coordinator() -> Coordinator:
+    """The worker's coordinator, created on first use (after gunicorn forks)"""
+    global _coordinator
+    if _coordinator is None:
+        if COORDINATION_URL.startswith(("redis://", "rediss://", "unix://")):
+            _coordinator = RedisCoordinator(COORDINATION_URL)
+        else:
+            _coordinator = LocalCoordinator(get_database())
+    return _coordinator
+
+async def invalidate(cache: TTLCache, key: Optional[Hashable] = None):
+    """Drop a cache entry in this worker and every other one"""
+    cache.invalidate(key)
+    try:
+        await get_coordinator().publish_invalidation(cache.name, key)
+    except Exception:
+        # Other workers fall back to the TTL
+        logger.exception("Publishing invalidation of %s failed", cache.name)
+
+async def run_as_leader(
+    db: AsyncIOMotorDatabase, name: str, interval: float, job, ttl: float = None, mongo_lease: bool = False
+):
+    """Run `job(db)` every `interval` seconds on whichever worker leads `name`
+
+    A leader that dies stops renewing and another worker takes over once
+    `ttl` has passed. With `mongo_lease` leadership is always a MongoDB
+    lease, even with Redis configured: jobs that cannot run without MongoDB
+    anyway (the money paths) then do not stop when Redis does.
+    """
+    coordinator = LocalCoordinator(db) if mongo_lease else get_coordinator()
+    ttl = ttl if ttl is not None else interval * 2 + 30
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if await coordinator.acquire(name, ttl):
+                    await job(db)
+            except Exception:
+                logger.exception("Scheduled job %s failed", name)
+    finally:
+        try:
+            await coordinator.release(name)
+        except Exception:
+            pass
@@ -0,0 +1,67 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from collections import defaultdict
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = float(os.environ.get("COUNTER_FLUSH_INTERVAL", "1.0"))
+
+class CounterBuffer:
+    """Coalesces hot $inc counters in memory and writes them in bulk
+
+    A product viewed 500 times in a second costs one update instead of 500.
+    Counts buffered since the last flush are lost if the process is killed.
+    """
+
+    def __init__(self):
+        # (collection, filter items, upsert, insert-only items) -> {field: amount}
+        self._pending = defaultdict(lambda: defaultdict(float))
+
+    def add(self, collection: str, filter: dict, increments: dict, upsert: bool = False, on_insert: dict = None):
+        """Buffer `increments` for the document matching `filter`
+
+        Keep `filter` to the collection's unique key when upserting: `on_insert`
+        fields are only written when the upsert creates the document.
+        """
+        key = (collection, tuple(sorted(filter.items())), upsert, tuple(sorted((on_insert or {}).items())))
+        fields = self._pending[key]
+        for field, amount in increments.items():
+            fields[field] += amount
+
+    def __len__(self):
+        return len(self._pending)
+
+    async def flush(self, db: AsyncIOMotorDatabase):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, defaultdict(lambda: defaultdict(float))
+
+        writes = defaultdict(list)
+        for (collection, filter_items, upsert, insert_items), fields in pending.items():
+            increments = {
+                field: int(amount) if float(amount).is_integer() else amount
+                for field, amount in fields.items()
+                if amount
+            }
+            if increments:
+                update = {"$inc": increments}
+                if insert_items:
+                    update["$setOnInsert"] = dict(insert_items)
+                writes[collection].append(UpdateOne(dict(filter_items), update, upsert=upsert))
+
+        for collection, operations in writes.items():
+            try:
+                await db[collection].bulk_write(operations, ordered=False)
+            except Exception:
+                logger.exception("Flushing %d counter updates to %s failed", len(operations), collection)
+
+    async def run(self, db: AsyncIOMotorDatabase, interval: float = FLUSH_INTERVAL):
+        """Flush forever; cancel the task and call flush() once more on shutdown"""
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush(db)
+
+counters = CounterBuffer()
@@ -0,0 +1,175 @@
+from pymongo import monitoring
+from contextvars import ContextVar
+from typing import Optional
+from .metrics import (
+    MONGO_COMMAND_DURATION,
+    MONGO_POOL_OPEN,
+    MONGO_POOL_IN_USE,
+    MONGO_POOL_WAITING,
+)
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Commands slower than this are logged with their filter shape
+SLOW_QUERY_MS = float(os.environ.get("MONGO_SLOW_QUERY_MS", "100"))
+
+# Requests issuing more commands than this are logged (N+1 detection)
+REQUEST_COMMAND_BUDGET = int(os.environ.get("MONGO_REQUEST_COMMAND_BUDGET", "25"))
+
+# Where each command keeps the document used to select rows
+_FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+}
+
+
+class RequestDbStats:
+    """Mongo command statistics collected for a single request"""
+
+    __slots__ = ("command_count", "total_time_ms", "slowest_command", "slowest_time_ms", "_lock")
+
+    def __init__(self):
+        self.command_count = 0
+        self.total_time_ms = 0.0
+        self.slowest_command = None
+        self.slowest_time_ms = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, command: str, duration_ms: float):
+        # Motor runs commands on executor threads, so guard the counters
+        with self._lock:
+            self.command_count += 1
+            self.total_time_ms += duration_ms
+            if duration_ms >= self.slowest_time_ms:
+                self.slowest_time_ms = duration_ms
+                self.slowest_command = command
+
+
+_request_stats: ContextVar[Optional[RequestDbStats]] = ContextVar("request_db_stats", default=None)
+
+
+def begin_request():
+    """Start collecting stats for the current request, returns (stats, token)"""
+    stats = RequestDbStats()
+    token = _request_stats.set(stats)
+    return stats, token
+
+
+def end_request(token):
+    """Stop collecting stats for the current request"""
+    _request_stats.reset(token)
+
+
+def get_request_stats() -> Optional[RequestDbStats]:
+    """Stats of the request being served, or None outside a request"""
+    return _request_stats.get()
+
+
+def filter_shape(value):
+    """Replace literal values in a query with '?' keeping fields and operators"""
+    if isinstance(value, dict):
+        return {key: filter_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, dict) for item in value):
+            return [filter_shape(item) for item in value]
+        return ["?"] if value else []
+    return "?"
+
+
+def _extract_filter(command_name: str, command: dict):
+    """Find the selection document of a command, if it has one"""
+    field = _FILTER_FIELDS.get(command_name)
+    if field:
+        return command.get(field)
+    if command_name == "aggregate":
+        pipeline = command.get("pipeline") or []
+        if pipeline and "$match" in pipeline[0]:
+            return pipeline[0]["$match"]
+        return None
+    if command_name in ("update", "delete"):
+        statements = command.get("updates" if command_name == "update" else "deletes") or []
+        if statements:
+            return statements[0].get("q")
+    return None
+
+
+class CommandInstrumentation(monitoring.CommandListener):
+    """Attribute Mongo commands to the current request and log slow ones"""
+
+    def __init__(self):
+        self._pending = {}
+
+    def started(self, event):
+        command = event.command
+        self._pending[(event.connection_id, event.request_id)] = (
+            command.get(event.command_name),
+            _extract_filter(event.command_name, command),
+        )
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def _finish(self, event):
+        collection, query = self._pending.pop((event.connection_id, event.request_id), (None, None))
+        duration_ms = event.duration_micros / 1000
+        label = f"{event.command_name} {collection}" if isinstance(collection, str) else event.command_name
+
+        MONGO_COMMAND_DURATION.observe(duration_ms / 1000, command=event.command_name)
+
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.record(label, duration_ms)
+
+        if duration_ms >= SLOW_QUERY_MS:
+            logger.warning(
+                "Slow Mongo command %s took %.1fms filter=%s",
+                label,
+                duration_ms,
+                filter_shape(query) if query is not None else None,
+            )
+
+
+class PoolInstrumentation(monitoring.ConnectionPoolListener):
+    """Track Mongo connection pool utilisation"""
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        MONGO_POOL_OPEN.inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_POOL_OPEN.dec()
+
+    def connection_check_out_started(self, event):
+        MONGO_POOL_WAITING.inc()
+
+    def connection_check_out_failed(self, event):
+        MONGO_POOL_WAITING.dec()
+
+    def connection_checked_out(self, event):
+        MONGO_POOL_WAITING.dec()
+        MONGO_POOL_IN_USE.inc()
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_IN_USE.dec()
@@ -2,16 +2,33 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from motor.motor_asyncio import AsyncIOMotorClient
 from .auth import decode_access_token
+from . import ids, request_log
 import os
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+_client = None
+
+def get_client() -> AsyncIOMotorClient:
+    """Shared Mongo client for the process, created on first use"""
+    global _client
+    if _client is None:
+        _client = AsyncIOMotorClient(
+            os.environ['MONGO_URL'],
+            minPoolSize=int(os.environ.get('MONGO_MIN_POOL_SIZE', '5')),
+            maxPoolSize=int(os.environ.get('MONGO_MAX_POOL_SIZE', '100')),
+            # Binary UUID keys come back as the strings the API uses
+            type_registry=ids.DECODING_REGISTRY,
+        )
+    return _client
 
 # Database dependency
 def get_database():
-    mongo_url = os.environ['MONGO_URL']
-    client = AsyncIOMotorClient(mongo_url)
-    db = client[os.environ['DB_NAME']]
-    return db
+    database = get_client()[os.environ['DB_NAME']]
+    if ids.BINARY_IDS:
+        return ids.KeyedDatabase(database)
+    return database
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Get current authenticated user from JWT token"""
@@ -33,10 +50,27 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    request_log.set_user(user_id)
+    return user_id
+
+# Users allowed to reach the debugging surface (profiler, loop stalls)
+ADMIN_USER_IDS = {
+    user_id.strip() for user_id in os.environ.get("ADMIN_USER_IDS", "").split(",") if user_id.strip()
+}
+
+async def get_admin_user(user_id: str = Depends(get_current_user)):
+    """Get current user if they are an operator listed in ADMIN_USER_IDS"""
+    if user_id not in ADMIN_USER_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required",
+        )
     return user_id
 
-async def get_optional_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_optional_user(credentials: HTTPAuthorizationCredentials = Depends(optional_security)):
     """Get current user if authenticated, otherwise return None"""
+    if credentials is None:
+        return None
     try:
         return await get_current_user(credentials)
     except:
@@ -0,0 +1,226 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
+from datetime import datetime, timedelta
+from .metrics import ESCROW_TRANSITIONS
+from .coordination import run_as_leader
+from .ledger import post_journal, escrow_funding_postings, escrow_release_postings
+from . import rollups, analytics
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Unpaid escrows are cancelled after this long, paid ones are released to the seller
+PAYMENT_TIMEOUT = timedelta(minutes=float(os.environ.get("ESCROW_PAYMENT_TIMEOUT_MINUTES", "60")))
+AUTO_RELEASE_AFTER = timedelta(days=float(os.environ.get("ESCROW_AUTO_RELEASE_DAYS", "14")))
+
+SCAN_INTERVAL = float(os.environ.get("ESCROW_SCAN_INTERVAL", "300"))
+BATCH_SIZE = 200
+CONCURRENCY = int(os.environ.get("ESCROW_CONCURRENCY", "8"))
+
+# payment_status values that mean the buyer's money never arrived;
+# transactions without a payment_status predate it and count as paid
+UNPAID_STATUSES = ["awaiting_payment", "failed"]
+
+_transactions_supported = True
+
+async def run_transaction(db: AsyncIOMotorDatabase, work):
+    """Run `work(session)` in a multi-document transaction
+
+    Standalone servers (local development) cannot run transactions; there
+    the steps run without one and rely on the guarded status update.
+    """
+    global _transactions_supported
+    if _transactions_supported:
+        try:
+            async with await db.client.start_session() as session:
+                return await session.with_transaction(work)
+        except OperationFailure as exc:
+            # 20 = IllegalOperation: not a replica set member or mongos
+            if exc.code != 20:
+                raise
+            _transactions_supported = False
+            logger.warning("MongoDB does not support transactions, escrow updates run without them")
+    return await work(None)
+
+async def release_escrow(db: AsyncIOMotorDatabase, transaction: dict, reason: str = "buyer_confirmed") -> bool:
+    """Pay out an escrow: mark it completed, the product sold and credit referrers
+
+    Returns False when the transaction already left `in_escrow`, e.g. the
+    buyer confirmed while the scheduler was releasing it, or when the
+    buyer's payment has not arrived.
+    """
+
+    async def work(session):
+        now = datetime.utcnow()
+        claimed = await db.transactions.update_one(
+            {
+                "id": transaction["id"],
+                "status": "in_escrow",
+                "escrow_released": False,
+                "payment_status": {"$nin": UNPAID_STATUSES}
+            },
+            {
+                "$set": {
+                    "status": "completed",
+                    "escrow_released": True,
+                    "closed_reason": reason,
+                    "completed_at": now,
+                    "updated_at": now
+                }
+            },
+            session=session
+        )
+        if claimed.modified_count == 0:
+            return False
+
+        if transaction.get("payment_status") is None:
+            # Paid before the payment inbox existed, so escrow was never funded in the ledger
+            funding_id = f"escrow_funding:{transaction['id']}"
+            if not await db.ledger_entries.find_one({"journal_id": funding_id}, {"_id": 1}, session=session):
+                await post_journal(
+                    db,
+                    funding_id,
+                    "escrow_funding",
+                    escrow_funding_postings(transaction),
+                    session=session,
+                    transaction_id=transaction["id"],
+                    backfill=True
+                )
+
+        # Escrow -> seller, platform commission and referrers, in the same transaction
+        await post_journal(
+            db,
+            f"escrow_release:{transaction['id']}",
+            "escrow_release",
+            escrow_release_postings(transaction),
+            session=session,
+            transaction_id=transaction["id"]
+        )
+
+        await db.products.update_one(
+            {"id": transaction["product_id"]},
+            {"$set": {"status": "sold"}},
+            session=session
+        )
+        await db.users.update_one(
+            {"id": transaction["seller_id"]},
+            {"$inc": {"total_sales": 1}},
+            session=session
+        )
+        await db.users.update_one(
+            {"id": transaction["buyer_id"]},
+            {"$inc": {"total_purchases": 1}},
+            session=session
+        )
+
+        # Referral counts (Level 1 and Level 2); the earnings themselves are in the ledger
+        for level in (1, 2):
+            referrer_id = transaction.get(f"referral_l{level}_id")
+            if referrer_id:
+                await db.referrals.update_one(
+                    {
+                        "referrer_id": referrer_id,
+                        "referred_user_id": transaction["buyer_id"],
+                        "level": level
+                    },
+                    {"$inc": {"transaction_count": 1}},
+                    session=session
+                )
+        return True
+
+    released = await run_transaction(db, work)
+    if released:
+        ESCROW_TRANSITIONS.inc(from_status="in_escrow", to_status="completed")
+        analytics.record(transaction["product_id"], transaction["seller_id"], sales=1, revenue=transaction["amount"])
+    return released
+
+async def cancel_escrow(db: AsyncIOMotorDatabase, transaction: dict, reason: str) -> bool:
+    """Cancel an escrow and put the product back on sale
+
+    Returns False when the transaction already left `in_escrow`.
+    """
+
+    async def work(session):
+        now = datetime.utcnow()
+        claimed = await db.transactions.update_one(
+            {"id": transaction["id"], "status": "in_escrow", "escrow_released": False},
+            {"$set": {"status": "cancelled", "closed_reason": reason, "updated_at": now}},
+            session=session
+        )
+        if claimed.modified_count == 0:
+            return False, None
+
+        product = await db.products.find_one_and_update(
+            {"id": transaction["product_id"], "status": "pending"},
+            {"$set": {"status": "available"}},
+            session=session,
+            return_document=ReturnDocument.AFTER
+        )
+        return True, product
+
+    cancelled, product = await run_transaction(db, work)
+    if cancelled:
+        ESCROW_TRANSITIONS.inc(from_status="in_escrow", to_status="cancelled")
+        if product:
+            await rollups.apply_product_change(db, {**product, "status": "pending"}, product)
+    return cancelled
+
+async def _close_expired(db: AsyncIOMotorDatabase, query: dict, action, reason: str) -> int:
+    """Apply `action` to every transaction matching `query`, a batch at a time"""
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def handle(transaction):
+        async with semaphore:
+            try:
+                return await action(db, transaction, reason)
+            except Exception:
+                logger.exception("Closing escrow %s (%s) failed", transaction["id"], reason)
+                return None
+
+    # Closed transactions drop out of the query; failures are skipped until the next scan
+    failed = []
+    closed = 0
+    while True:
+        cursor = db.transactions.find(dict(query, id={"$nin": failed})).sort("created_at", 1)
+        batch = await cursor.limit(BATCH_SIZE).to_list(length=BATCH_SIZE)
+        if not batch:
+            break
+        results = await asyncio.gather(*(handle(transaction) for transaction in batch))
+        failed += [transaction["id"] for transaction, result in zip(batch, results) if result is None]
+        closed += sum(1 for result in results if result)
+        if len(batch) < BATCH_SIZE:
+            break
+    return closed
+
+async def expire_escrows(db: AsyncIOMotorDatabase):
+    """Cancel escrows whose payment never arrived and auto-release stale paid ones"""
+    now = datetime.utcnow()
+    cancelled = await _close_expired(
+        db,
+        {
+            "status": "in_escrow",
+            "created_at": {"$lt": now - PAYMENT_TIMEOUT},
+            "payment_status": {"$in": UNPAID_STATUSES}
+        },
+        cancel_escrow,
+        "payment_timeout"
+    )
+    released = await _close_expired(
+        db,
+        {
+            "status": "in_escrow",
+            "created_at": {"$lt": now - AUTO_RELEASE_AFTER},
+            "payment_status": {"$nin": UNPAID_STATUSES}
+        },
+        release_escrow,
+        "auto_release"
+    )
+    if cancelled or released:
+        logger.info("Escrow expiry: %d cancelled, %d auto-released", cancelled, released)
+
+async def run_scheduler(db: AsyncIOMotorDatabase, interval: float = SCAN_INTERVAL):
+    """Scan for expired escrows every `interval` seconds, on one worker at a time"""
+    await run_as_leader(db, "escrow_expiry", interval, expire_escrows, mongo_lease=True)
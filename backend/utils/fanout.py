@@ -0,0 +1,61 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Sellers with at least this many followers are read on demand instead of fanned out
+CELEBRITY_FOLLOWERS = int(os.environ.get("FEED_CELEBRITY_FOLLOWERS", "5000"))
+
+# Newest entries kept in each user's following inbox
+INBOX_SIZE = 500
+
+FANOUT_BATCH = 1000
+
+def inbox_push(items: list) -> dict:
+    """Update that adds items to an inbox, keeping it sorted and capped"""
+    return {
+        "$push": {
+            "items": {
+                "$each": items,
+                "$sort": {"created_at": -1},
+                "$slice": INBOX_SIZE
+            }
+        }
+    }
+
+async def fan_out_product(db: AsyncIOMotorDatabase, product: dict):
+    """Push a new product into the inbox of every follower of its seller"""
+    seller = await db.users.find_one(
+        {"id": product["seller_id"]}, {"followers": 1, "fanout_on_read": 1}
+    )
+    if not seller or seller.get("fanout_on_read"):
+        return
+
+    item = {
+        "product_id": product["id"],
+        "seller_id": product["seller_id"],
+        "created_at": product["created_at"]
+    }
+    update = inbox_push([item])
+
+    writes = []
+    cursor = db.follows.find({"followee_id": product["seller_id"]}, {"follower_id": 1})
+    async for edge in cursor.batch_size(FANOUT_BATCH):
+        writes.append(UpdateOne({"_id": edge["follower_id"]}, update, upsert=True))
+        if len(writes) >= FANOUT_BATCH:
+            await db.feed_inboxes.bulk_write(writes, ordered=False)
+            writes = []
+    if writes:
+        await db.feed_inboxes.bulk_write(writes, ordered=False)
+
+async def promote_to_celebrity(db: AsyncIOMotorDatabase, seller_id: str):
+    """Switch a seller that outgrew fan-out to fan-out-on-read"""
+    result = await db.users.update_one(
+        {"id": seller_id, "fanout_on_read": {"$ne": True}},
+        {"$set": {"fanout_on_read": True}}
+    )
+    if result.modified_count:
+        await db.follows.update_many({"followee_id": seller_id}, {"$set": {"celebrity": True}})
+        logger.info("Seller %s switched to fan-out-on-read", seller_id)
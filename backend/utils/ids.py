@@ -0,0 +1,205 @@
+"""
+Compact storage for UUID keys.
+
+Application code and API clients see ids as UUID strings. MongoDB can
+store them as 16-byte BSON Binary (subtype 4) instead of 36-character
+strings. That shrinks every document that repeats them (seller_id,
+product_id, feed items, neighbour lists) and every index built on them.
+
+Translation happens at the storage boundary:
+
+- Reading: the client decodes subtype-4 values back to canonical strings
+  (DECODING_REGISTRY), whichever way a document was stored. Handlers,
+  comparisons and responses keep working with strings.
+- Writing and querying: with BINARY_IDS=true, get_database() returns a
+  KeyedDatabase. It encodes UUID strings in key fields of documents,
+  updates, filters and $match stages before they are sent.
+
+Key fields are recognised by name (KEY_FIELDS, matched against the last
+component of a dotted path). Only canonical UUID strings are encoded.
+Other ids stay strings: seeded "test-prod-..." ids, ledger account names,
+lease names. Literals inside $expr are not translated.
+
+Range queries keep their order, because canonical UUID strings and their
+bytes sort the same way. MongoDB does not compare strings with binary,
+though, so run jobs/migrate_binary_ids.py before switching BINARY_IDS on.
+Until every document is converted, filters only match the binary form.
+"""
+
+from bson.binary import Binary, UUID_SUBTYPE
+from bson.codec_options import TypeDecoder, TypeRegistry
+from motor.motor_asyncio import AsyncIOMotorCollection
+import copy
+import os
+import uuid
+
+BINARY_IDS = os.environ.get("BINARY_IDS", "false").lower() == "true"
+
+KEY_FIELDS = frozenset({
+    "_id",
+    "id",
+    "user_id",
+    "seller_id",
+    "buyer_id",
+    "product_id",
+    "owner_id",
+    "comment_id",
+    "transaction_id",
+    "follower_id",
+    "followee_id",
+    "referrer_id",
+    "referred_user_id",
+    "referred_by",
+    "referral_l1_id",
+    "referral_l2_id",
+})
+
+def to_key(value):
+    """Binary form of a canonical UUID string, anything else unchanged"""
+    if isinstance(value, str) and len(value) == 36 and value[8] == "-":
+        try:
+            parsed = uuid.UUID(value)
+        except ValueError:
+            return value
+        # Only lower-case hyphenated strings survive the round trip unchanged
+        if str(parsed) == value:
+            return Binary.from_uuid(parsed)
+    return value
+
+def _is_key_field(name: str) -> bool:
+    return name.rpartition(".")[2] in KEY_FIELDS
+
+def _encode(value, is_key: bool):
+    if isinstance(value, str):
+        return to_key(value) if is_key else value
+    if isinstance(value, dict):
+        # Operators ($in, $ne, $each...) apply to the field they sit under
+        return {
+            name: _encode(item, is_key if name.startswith("$") else _is_key_field(name))
+            for name, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [_encode(item, is_key) for item in value]
+    return value
+
+def encode(document):
+    """Encode key fields of a document, filter or update (None passes through)"""
+    if document is None:
+        return None
+    return _encode(document, False)
+
+def encode_pipeline(pipeline):
+    """Encode the $match stages of an aggregation, including nested pipelines"""
+    stages = []
+    for stage in pipeline:
+        if "$match" in stage:
+            stage = {"$match": encode(stage["$match"])}
+        elif "$facet" in stage:
+            stage = {"$facet": {name: encode_pipeline(branch) for name, branch in stage["$facet"].items()}}
+        elif "$lookup" in stage and "pipeline" in stage["$lookup"]:
+            stage = {"$lookup": dict(stage["$lookup"], pipeline=encode_pipeline(stage["$lookup"]["pipeline"]))}
+        stages.append(stage)
+    return stages
+
+class _UuidKeyDecoder(TypeDecoder):
+    bson_type = Binary
+
+    def transform_bson(self, value):
+        if value.subtype == UUID_SUBTYPE:
+            return str(uuid.UUID(bytes=bytes(value)))
+        # What pymongo returns for generic binary without a decoder
+        return bytes(value) if value.subtype == 0 else value
+
+# Installed on the client, so it applies whether or not BINARY_IDS is on
+DECODING_REGISTRY = TypeRegistry([_UuidKeyDecoder()])
+
+def _encode_request(request):
+    """Encoded copy of a bulk_write operation (InsertOne, UpdateOne, ...)"""
+    # pymongo keeps the operation's filter and document in these attributes
+    request = copy.copy(request)
+    if getattr(request, "_filter", None) is not None:
+        request._filter = encode(request._filter)
+    if getattr(request, "_doc", None) is not None:
+        request._doc = encode(request._doc)
+    return request
+
+class KeyedCollection:
+    """Collection that encodes UUID keys in everything it sends"""
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    def find(self, filter=None, *args, **kwargs):
+        return self._collection.find(encode(filter), *args, **kwargs)
+
+    async def find_one(self, filter=None, *args, **kwargs):
+        return await self._collection.find_one(encode(filter), *args, **kwargs)
+
+    async def count_documents(self, filter, *args, **kwargs):
+        return await self._collection.count_documents(encode(filter), *args, **kwargs)
+
+    async def distinct(self, key, filter=None, *args, **kwargs):
+        return await self._collection.distinct(key, encode(filter), *args, **kwargs)
+
+    async def insert_one(self, document, *args, **kwargs):
+        encoded = encode(document)
+        result = await self._collection.insert_one(encoded, *args, **kwargs)
+        # pymongo adds the generated _id to the caller's document, keep doing so
+        document.setdefault("_id", encoded["_id"])
+        return result
+
+    async def insert_many(self, documents, *args, **kwargs):
+        documents = list(documents)
+        encoded = [encode(document) for document in documents]
+        result = await self._collection.insert_many(encoded, *args, **kwargs)
+        for document, sent in zip(documents, encoded):
+            document.setdefault("_id", sent["_id"])
+        return result
+
+    async def update_one(self, filter, update, *args, **kwargs):
+        return await self._collection.update_one(encode(filter), encode(update), *args, **kwargs)
+
+    async def update_many(self, filter, update, *args, **kwargs):
+        return await self._collection.update_many(encode(filter), encode(update), *args, **kwargs)
+
+    async def replace_one(self, filter, replacement, *args, **kwargs):
+        return await self._collection.replace_one(encode(filter), encode(replacement), *args, **kwargs)
+
+    async def delete_one(self, filter, *args, **kwargs):
+        return await self._collection.delete_one(encode(filter), *args, **kwargs)
+
+    async def delete_many(self, filter, *args, **kwargs):
+        return await self._collection.delete_many(encode(filter), *args, **kwargs)
+
+    async def find_one_and_update(self, filter, update, *args, **kwargs):
+        return await self._collection.find_one_and_update(encode(filter), encode(update), *args, **kwargs)
+
+    async def find_one_and_replace(self, filter, replacement, *args, **kwargs):
+        return await self._collection.find_one_and_replace(encode(filter), encode(replacement), *args, **kwargs)
+
+    async def find_one_and_delete(self, filter, *args, **kwargs):
+        return await self._collection.find_one_and_delete(encode(filter), *args, **kwargs)
+
+    def aggregate(self, pipeline, *args, **kwargs):
+        return self._collection.aggregate(encode_pipeline(pipeline), *args, **kwargs)
+
+    async def bulk_write(self, requests, *args, **kwargs):
+        return await self._collection.bulk_write([_encode_request(request) for request in requests], *args, **kwargs)
+
+class KeyedDatabase:
+    """Database whose collections are KeyedCollections, everything else passes through"""
+
+    def __init__(self, database):
+        self._database = database
+
+    def __getattr__(self, name):
+        attribute = getattr(self._database, name)
+        if isinstance(attribute, AsyncIOMotorCollection):
+            return KeyedCollection(attribute)
+        return attribute
+
+    def __getitem__(self, name):
+        return KeyedCollection(self._database[name])
@@ -0,0 +1,125 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Optional
+import io
+import math
+import os
+
+if TYPE_CHECKING:
+    # Imported where it is used, so importing the API does not load numpy
+    import numpy as np
+
+# Longest side in pixels of each generated variant
+VARIANT_SIZES = {
+    "thumbnail": 240,
+    "480p": 480,
+    "720p": 720,
+    "original": 1600,
+}
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+
+MEDIA_WORKERS = int(os.environ.get("MEDIA_WORKERS", "2"))
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+def get_executor() -> ProcessPoolExecutor:
+    """Process pool for image work, started on first upload rather than at import"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=MEDIA_WORKERS)
+    return _executor
+
+_BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+def _base83(value: int, length: int) -> str:
+    return "".join(_BASE83[(value // 83 ** (length - i - 1)) % 83] for i in range(length))
+
+def _srgb_to_linear(values: "np.ndarray") -> "np.ndarray":
+    import numpy as np
+    values = values / 255.0
+    return np.where(values <= 0.04045, values / 12.92, ((values + 0.055) / 1.055) ** 2.4)
+
+def _linear_to_srgb(value: float) -> int:
+    value = min(max(value, 0.0), 1.0)
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+def blurhash(pixels: "np.ndarray", x_components: int = 4, y_components: int = 3) -> str:
+    """Encode an RGB array (height x width x 3, 0-255) as a BlurHash placeholder"""
+    import numpy as np
+    height, width = pixels.shape[:2]
+    linear = _srgb_to_linear(pixels.astype(np.float64))
+    xs = np.arange(width)
+    ys = np.arange(height)
+
+    factors = []
+    for j in range(y_components):
+        for i in range(x_components):
+            basis = np.outer(np.cos(math.pi * j * ys / height), np.cos(math.pi * i * xs / width))
+            scale = 1.0 if i == 0 and j == 0 else 2.0
+            factors.append(scale * (linear * basis[..., None]).sum(axis=(0, 1)) / (width * height))
+
+    dc, ac = factors[0], factors[1:]
+    result = _base83((x_components - 1) + (y_components - 1) * 9, 1)
+
+    if ac:
+        actual_max = max(float(np.abs(component).max()) for component in ac)
+        quantised_max = int(max(0, min(82, math.floor(actual_max * 166 - 0.5))))
+        max_value = (quantised_max + 1) / 166
+        result += _base83(quantised_max, 1)
+    else:
+        max_value = 1.0
+        result += _base83(0, 1)
+
+    r, g, b = (_linear_to_srgb(float(channel)) for channel in dc)
+    result += _base83((r << 16) + (g << 8) + b, 4)
+
+    for component in ac:
+        quantised = [
+            int(max(0, min(18, math.floor(math.copysign(abs(c / max_value) ** 0.5, c) * 9 + 9.5))))
+            for c in component
+        ]
+        result += _base83(quantised[0] * 19 * 19 + quantised[1] * 19 + quantised[2], 2)
+    return result
+
+def process_image(data: bytes) -> dict:
+    """Decode an upload and produce its variants and placeholder (runs in a worker process)"""
+    # Imported here so the API process never loads Pillow or numpy
+    import numpy as np
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source).convert("RGB")
+
+    variants = []
+    for name, longest in VARIANT_SIZES.items():
+        resized = image.copy()
+        # thumbnail() keeps the aspect ratio and never upscales
+        resized.thumbnail((longest, longest), Image.LANCZOS)
+        buffer = io.BytesIO()
+        if name == "original":
+            # Re-encoding drops EXIF (GPS position etc.) from what we publish
+            resized.save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+            content_type, extension = "image/jpeg", "jpg"
+        else:
+            resized.save(buffer, "WEBP", quality=WEBP_QUALITY, method=4)
+            content_type, extension = "image/webp", "webp"
+        variants.append({
+            "name": name,
+            "extension": extension,
+            "content_type": content_type,
+            "width": resized.width,
+            "height": resized.height,
+            "data": buffer.getvalue(),
+        })
+
+    tiny = image.copy()
+    tiny.thumbnail((32, 32))
+    return {
+        "width": image.width,
+        "height": image.height,
+        "variants": variants,
+        "blurhash": blurhash(np.asarray(tiny)),
+    }
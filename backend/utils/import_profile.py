@@ -0,0 +1,85 @@
+"""
+Import-time profiling for the API process.
+
+Enabled with IMPORT_PROFILE=1: server.py installs the profiler before it
+imports anything heavy and logs the slowest modules once the app is built,
+like `python -X importtime` but without leaving the normal startup path.
+"""
+
+import importlib.abc
+import sys
+import time
+
+class _TimedLoader:
+    """Wraps a module loader to time exec_module, delegating everything else"""
+
+    def __init__(self, loader, profiler):
+        self._loader = loader
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        # Leave the real loader on the module so importlib.resources and friends keep working
+        module.__loader__ = self._loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self._loader
+        self._profiler.enter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler.leave(module.__name__)
+
+class ImportProfiler(importlib.abc.MetaPathFinder):
+    """Records self and cumulative import time per module"""
+
+    def __init__(self):
+        self.timings = {}  # module -> (self seconds, cumulative seconds)
+        self._stack = []
+        self.started = time.perf_counter()
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+        return self
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _TimedLoader(spec.loader, self)
+        return spec
+
+    def enter(self):
+        # [start, time spent in nested imports]
+        self._stack.append([time.perf_counter(), 0.0])
+
+    def leave(self, name: str):
+        started, children = self._stack.pop()
+        cumulative = time.perf_counter() - started
+        self.timings[name] = (cumulative - children, cumulative)
+        if self._stack:
+            self._stack[-1][1] += cumulative
+
+    def report(self, limit: int = 20) -> str:
+        total = time.perf_counter() - self.started
+        slowest = sorted(self.timings.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+        lines = [f"Imported {len(self.timings)} modules in {total * 1000:.1f}ms, slowest (self / cumulative):"]
+        lines += [
+            f"  {own * 1000:8.1f}ms {cumulative * 1000:8.1f}ms  {name}"
+            for name, (own, cumulative) in slowest
+        ]
+        return "\n".join(lines)
@@ -0,0 +1,101 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING
+from .rollups import TRENDING_BUCKET_TTL_SECONDS
+from .interactions import RETENTION_DAYS
+from .analytics import HOURLY_RETENTION_DAYS
+from .payment_inbox import RETENTION_DAYS as PAYMENT_CALLBACK_RETENTION_DAYS
+
+async def ensure_indexes(db: AsyncIOMotorDatabase):
+    """Create the indexes the API relies on (no-op when they already exist)"""
+
+    # Products and neighbour lists are looked up by their string id
+    await db.products.create_index([("id", ASCENDING)], unique=True)
+
+    # Uploaded media descriptors
+    await db.media.create_index([("id", ASCENDING)], unique=True)
+
+    # Transactions are looked up by their string id, also from referral earnings
+    await db.transactions.create_index([("id", ASCENDING)], unique=True)
+    # Escrow expiry scans: in_escrow transactions oldest first
+    await db.transactions.create_index([("status", ASCENDING), ("created_at", ASCENDING)])
+
+    # Payment callback inbox: pending callbacks oldest first, processed ones expire
+    await db.payment_callbacks.create_index([("state", ASCENDING), ("received_at", ASCENDING)])
+    await db.payment_callbacks.create_index(
+        "processed_at", expireAfterSeconds=PAYMENT_CALLBACK_RETENTION_DAYS * 24 * 3600
+    )
+
+    # Ledger: one posting per account per journal
+    await db.ledger_entries.create_index(
+        [("journal_id", ASCENDING), ("account", ASCENDING)], unique=True
+    )
+    # Referral earnings: one referrer's release credits
+    await db.ledger_entries.create_index([("account", ASCENDING), ("kind", ASCENDING)])
+    # Payout settlement: unpaid credits, then the entries of one settlement run
+    await db.ledger_entries.create_index(
+        [("account", ASCENDING), ("_id", ASCENDING)],
+        partialFilterExpression={"settled": False}
+    )
+    await db.ledger_entries.create_index(
+        [("settlement_id", ASCENDING), ("account", ASCENDING)],
+        partialFilterExpression={"settlement_id": {"$exists": True}}
+    )
+
+    # "Has this viewer liked it" checks on the product screen
+    await db.likes.create_index([("user_id", ASCENDING), ("product_id", ASCENDING)])
+
+    # Comment threads are paged newest first per product; likes are unique per user
+    await db.comments.create_index(
+        [("product_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]
+    )
+    await db.comments.create_index([("id", ASCENDING)], unique=True)
+    await db.comment_likes.create_index(
+        [("comment_id", ASCENDING), ("user_id", ASCENDING)], unique=True
+    )
+
+    # Follow graph: unique edges, follower lookups for fan-out, followee lookups for feeds
+    await db.follows.create_index(
+        [("follower_id", ASCENDING), ("followee_id", ASCENDING)], unique=True
+    )
+    await db.follows.create_index([("followee_id", ASCENDING)])
+    await db.follows.create_index([("follower_id", ASCENDING), ("celebrity", ASCENDING)])
+    await db.products.create_index([("seller_id", ASCENDING), ("created_at", DESCENDING)])
+
+    # Analytics buckets: one document per owner, granularity and period; hourly ones expire
+    await db.product_stats.create_index(
+        [("product_id", ASCENDING), ("granularity", ASCENDING), ("bucket", ASCENDING)], unique=True
+    )
+    await db.seller_stats.create_index(
+        [("seller_id", ASCENDING), ("granularity", ASCENDING), ("bucket", ASCENDING)], unique=True
+    )
+    for collection in (db.product_stats, db.seller_stats):
+        await collection.create_index(
+            [("bucket", ASCENDING)],
+            expireAfterSeconds=HOURLY_RETENTION_DAYS * 24 * 3600,
+            partialFilterExpression={"granularity": "hour"}
+        )
+
+    # Category rollups are read sorted by video count
+    await db.category_rollups.create_index([("video_count", DESCENDING)])
+
+    # Hourly trending buckets: upsert key, and a TTL index that also serves the 24h range scan
+    await db.category_trending.create_index(
+        [("category", ASCENDING), ("hour", ASCENDING)], unique=True
+    )
+    await db.category_trending.create_index(
+        [("hour", ASCENDING)], expireAfterSeconds=TRENDING_BUCKET_TTL_SECONDS
+    )
+
+    # Interaction buckets: one open bucket per user and day, expired after the retention window
+    await db.interaction_buckets.create_index([("user_id", ASCENDING), ("day", DESCENDING)])
+    await db.interaction_buckets.create_index(
+        [("day", ASCENDING)], expireAfterSeconds=RETENTION_DAYS * 24 * 3600
+    )
+    await db.interaction_daily.create_index(
+        [("day", ASCENDING), ("category", ASCENDING)], unique=True
+    )
+
+    # Legacy one-document-per-event interactions age out on the same schedule
+    await db.user_interactions.create_index(
+        [("created_at", ASCENDING)], expireAfterSeconds=RETENTION_DAYS * 24 * 3600
+    )
@@ -0,0 +1,91 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from datetime import datetime, timedelta
+from typing import List
+
+# Events per bucket document; a full bucket spills into a new one for the same day
+BUCKET_SIZE = 200
+
+# Raw events are only read for the last 30 days, keep a few days of margin
+RETENTION_DAYS = 35
+
+# Interest signalled by each interaction type; watching scales with duration
+TYPE_WEIGHTS = {"purchase": 5.0, "like": 2.0}
+DEFAULT_WEIGHT = 1.0
+WATCH_MAX_WEIGHT = 3.0  # reached after 60 seconds
+WATCH_SECONDS_PER_POINT = 30
+
+def interaction_weight(interaction_type: str, duration: int = 0) -> float:
+    """How strongly an interaction signals interest in a category or product"""
+    if interaction_type == "watch_video":
+        # More weight if watched longer
+        return min(WATCH_MAX_WEIGHT, DEFAULT_WEIGHT + ((duration or 0) / WATCH_SECONDS_PER_POINT))
+    return TYPE_WEIGHTS.get(interaction_type, DEFAULT_WEIGHT)
+
+def day_of(moment: datetime) -> datetime:
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+async def record_interaction(
+    db: AsyncIOMotorDatabase,
+    user_id: str,
+    product: dict,
+    interaction_type: str,
+    duration: int = 0
+):
+    """Append an interaction to the user's bucket for today and update the daily rollup"""
+    now = datetime.utcnow()
+    day = day_of(now)
+    event = {
+        "p": product["id"],
+        "c": product["category"],
+        "t": interaction_type,
+        "d": duration,
+        "at": now
+    }
+
+    await db.interaction_buckets.update_one(
+        {"user_id": user_id, "day": day, "count": {"$lt": BUCKET_SIZE}},
+        {"$push": {"events": event}, "$inc": {"count": 1}},
+        upsert=True
+    )
+
+    await db.interaction_daily.update_one(
+        {"day": day, "category": product["category"]},
+        {"$inc": {f"counts.{interaction_type}": 1, "duration": duration}},
+        upsert=True
+    )
+
+def expand_bucket(bucket: dict, since: datetime = None) -> List[dict]:
+    """Turn a bucket document back into interaction dicts"""
+    return [
+        {
+            "user_id": bucket["user_id"],
+            "product_id": event["p"],
+            "category": event["c"],
+            "interaction_type": event["t"],
+            "duration": event.get("d", 0),
+            "created_at": event["at"]
+        }
+        for event in bucket.get("events", [])
+        if since is None or event["at"] >= since
+    ]
+
+async def get_recent_interactions(
+    db: AsyncIOMotorDatabase,
+    user_id: str,
+    since: datetime,
+    limit: int = 1000
+) -> List[dict]:
+    """Interactions of a user since `since`, newest buckets first"""
+    cursor = db.interaction_buckets.find(
+        {"user_id": user_id, "day": {"$gte": day_of(since)}}
+    ).sort("day", -1)
+
+    interactions = []
+    async for bucket in cursor:
+        interactions.extend(expand_bucket(bucket, since))
+        if len(interactions) >= limit:
+            break
+    return interactions[:limit]
+
+def retention_cutoff() -> datetime:
+    return day_of(datetime.utcnow()) - timedelta(days=RETENTION_DAYS)
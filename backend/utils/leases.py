@@ -0,0 +1,52 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime, timedelta
+import os
+import socket
+import uuid
+
+_worker_id = None
+_worker_pid = None
+
+def worker_id() -> str:
+    """Identifies this worker process; recomputed after a fork so pre-forked workers differ"""
+    global _worker_id, _worker_pid
+    if _worker_pid != os.getpid():
+        _worker_pid = os.getpid()
+        _worker_id = f"{socket.gethostname()}:{_worker_pid}:{uuid.uuid4().hex[:8]}"
+    return _worker_id
+
+class Lease:
+    """A named, expiring lock in the `leases` collection
+
+    Every uvicorn worker starts the same background loops; only the worker
+    holding the lease runs the job. A holder that dies stops renewing and
+    another worker takes over once `ttl` has passed.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase, name: str, ttl: float):
+        self.db = db
+        self.name = name
+        self.ttl = timedelta(seconds=ttl)
+
+    async def acquire(self) -> bool:
+        """Take or renew the lease, returns whether this worker holds it"""
+        now = datetime.utcnow()
+        try:
+            await self.db.leases.find_one_and_update(
+                {
+                    "_id": self.name,
+                    "$or": [{"holder": worker_id()}, {"expires_at": {"$lt": now}}]
+                },
+                {"$set": {"holder": worker_id(), "expires_at": now + self.ttl}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Someone else holds an unexpired lease (the upsert hit the _id)
+            return False
+        return True
+
+    async def release(self):
+        await self.db.leases.delete_one({"_id": self.name, "holder": worker_id()})
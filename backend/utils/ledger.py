@@ -0,0 +1,194 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from bson.decimal128 import Decimal128
+from decimal import Decimal, ROUND_HALF_UP
+from collections import defaultdict
+from datetime import datetime
+
+# Commission rates
+PLATFORM_COMMISSION = Decimal("0.02")  # 2% total (1% buyer + 1% seller)
+REFERRAL_L1_RATE = Decimal("0.0025")  # 0.25%
+REFERRAL_L2_RATE = Decimal("0.0025")  # 0.25%
+
+CENT = Decimal("0.01")
+
+# Accounts; amounts are signed, credits positive and debits negative
+ESCROW_ACCOUNT = "escrow"
+# Buyer payments collected by the gateway; debited as they fund escrow
+GATEWAY_ACCOUNT = "gateway:receipts"
+PLATFORM_ACCOUNT = "platform:commission"
+PAYOUT_ACCOUNT = "payouts:bank"
+
+# Credits to these accounts are owed to users and stay unsettled until paid out
+PAYABLE_PREFIXES = ("seller:", "referrer:")
+
+def seller_account(user_id: str) -> str:
+    return f"seller:{user_id}"
+
+def referrer_account(user_id: str) -> str:
+    return f"referrer:{user_id}"
+
+def to_decimal(value) -> Decimal:
+    """Exact decimal for a stored amount (float, Decimal128 or Decimal), rounded to centimes"""
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+    elif not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+def commission_split(amount, has_l1: bool, has_l2: bool) -> dict:
+    """Platform commission and referral fees for a sale, in centimes-rounded decimals"""
+    amount = to_decimal(amount)
+    return {
+        "commission": (amount * PLATFORM_COMMISSION).quantize(CENT, rounding=ROUND_HALF_UP),
+        "referral_l1": (amount * REFERRAL_L1_RATE).quantize(CENT, rounding=ROUND_HALF_UP) if has_l1 else Decimal("0.00"),
+        "referral_l2": (amount * REFERRAL_L2_RATE).quantize(CENT, rounding=ROUND_HALF_UP) if has_l2 else Decimal("0.00"),
+    }
+
+def escrow_funding_postings(transaction: dict) -> dict:
+    """account -> amount for a buyer's payment arriving in escrow"""
+    amount = to_decimal(transaction["amount"])
+    return {GATEWAY_ACCOUNT: -amount, ESCROW_ACCOUNT: amount}
+
+def escrow_release_postings(transaction: dict) -> dict:
+    """account -> amount for paying out a released escrow
+
+    The held amount leaves escrow; the seller gets it minus the platform
+    commission and referral fees, so the postings always sum to zero.
+    """
+    amount = to_decimal(transaction["amount"])
+    postings = defaultdict(Decimal)
+    postings[ESCROW_ACCOUNT] -= amount
+
+    commission = to_decimal(transaction.get("commission_amount", 0))
+    postings[PLATFORM_ACCOUNT] += commission
+    payout = amount - commission
+
+    for level in (1, 2):
+        referrer_id = transaction.get(f"referral_l{level}_id")
+        if referrer_id:
+            fee = to_decimal(transaction.get(f"referral_l{level}_amount", 0))
+            postings[referrer_account(referrer_id)] += fee
+            payout -= fee
+
+    postings[seller_account(transaction["seller_id"])] += payout
+    return {account: amount for account, amount in postings.items() if amount}
+
+async def post_journal(
+    db: AsyncIOMotorDatabase,
+    journal_id: str,
+    kind: str,
+    postings: dict,
+    session=None,
+    **details
+):
+    """Append a balanced set of postings and move the account balances by the same deltas
+
+    Call inside the database transaction that performs the business change
+    so entries and balances cannot drift from it. The unique
+    (journal_id, account) index makes a repeated journal fail instead of
+    posting twice.
+    """
+    if sum(postings.values(), Decimal(0)) != 0:
+        raise ValueError(f"Journal {journal_id} does not balance: {postings}")
+
+    now = datetime.utcnow()
+    await db.ledger_entries.insert_many(
+        [
+            {
+                "journal_id": journal_id,
+                "kind": kind,
+                "account": account,
+                "amount": Decimal128(amount),
+                "currency": "DZD",
+                "created_at": now,
+                **({"settled": False} if amount > 0 and account.startswith(PAYABLE_PREFIXES) else {}),
+                **details
+            }
+            for account, amount in postings.items()
+        ],
+        session=session
+    )
+    await db.account_balances.bulk_write(
+        [
+            UpdateOne(
+                {"_id": account},
+                {"$inc": {"balance": Decimal128(amount)}, "$set": {"updated_at": now}},
+                upsert=True
+            )
+            for account, amount in postings.items()
+        ],
+        ordered=False,
+        session=session
+    )
+
+async def get_balances(db: AsyncIOMotorDatabase, accounts: list) -> dict:
+    """Current balance per account, read from the balance snapshots"""
+    balances = {account: Decimal("0.00") for account in accounts}
+    async for doc in db.account_balances.find({"_id": {"$in": accounts}}):
+        balances[doc["_id"]] = to_decimal(doc["balance"])
+    return balances
+
+async def referral_earnings(db: AsyncIOMotorDatabase, referrer_id: str) -> dict:
+    """(referred user id, level) -> referral fees the referrer earned on released escrows"""
+    pipeline = [
+        {"$match": {"account": referrer_account(referrer_id), "kind": "escrow_release"}},
+        {
+            "$lookup": {
+                "from": "transactions",
+                "localField": "transaction_id",
+                "foreignField": "id",
+                "as": "transaction"
+            }
+        },
+        {"$unwind": "$transaction"},
+        {
+            "$group": {
+                "_id": {
+                    "referred_user_id": "$transaction.buyer_id",
+                    "level": {"$cond": [{"$eq": ["$transaction.referral_l1_id", referrer_id]}, 1, 2]}
+                },
+                "total": {"$sum": "$amount"}
+            }
+        }
+    ]
+    return {
+        (doc["_id"]["referred_user_id"], doc["_id"]["level"]): to_decimal(doc["total"])
+        async for doc in db.ledger_entries.aggregate(pipeline)
+    }
+
+async def reconcile(db: AsyncIOMotorDatabase) -> dict:
+    """Journals that do not balance and accounts whose snapshot disagrees with their entries
+
+    Both checks run as one aggregation over the ledger.
+    """
+    pipeline = [
+        {
+            "$facet": {
+                "unbalanced_journals": [
+                    {"$group": {"_id": "$journal_id", "total": {"$sum": "$amount"}}},
+                    {"$match": {"total": {"$ne": Decimal128("0")}}}
+                ],
+                "account_mismatches": [
+                    {"$group": {"_id": "$account", "ledger": {"$sum": "$amount"}}},
+                    {
+                        "$lookup": {
+                            "from": "account_balances",
+                            "localField": "_id",
+                            "foreignField": "_id",
+                            "as": "snapshot"
+                        }
+                    },
+                    {
+                        "$project": {
+                            "ledger": 1,
+                            "balance": {"$ifNull": [{"$first": "$snapshot.balance"}, Decimal128("0")]}
+                        }
+                    },
+                    {"$match": {"$expr": {"$ne": ["$ledger", "$balance"]}}}
+                ]
+            }
+        }
+    ]
+    result = await db.ledger_entries.aggregate(pipeline, allowDiskUse=True).to_list(length=1)
+    return result[0] if result else {"unbalanced_journals": [], "account_mismatches": []}
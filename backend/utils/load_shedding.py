@@ -0,0 +1,45 @@
+from typing import Optional
+from .loop_monitor import loop_monitor
+from .metrics import MONGO_POOL_WAITING, MONGO_POOL_MAX_SIZE
+import os
+import random
+
+# Shedding starts past these limits and reaches 100% at twice them
+LAG_LIMIT_MS = float(os.environ.get("LOAD_SHED_LAG_MS", "250"))
+# Queued Mongo checkouts, as a fraction of the pool size
+POOL_QUEUE_LIMIT = float(os.environ.get("LOAD_SHED_POOL_QUEUE_RATIO", "0.5"))
+
+ENABLED = os.environ.get("LOAD_SHEDDING", "true").lower() == "true"
+
+# Never shed probes, scrapes, operator tooling or gateway callbacks (the gateway would retry,
+# but late payment confirmations are worse than slow product pages)
+EXEMPT_PREFIXES = ("/api/health", "/metrics", "/debug", "/api/payments/callback")
+
+def overload():
+    """How far past its limits the worker is, as (level, reason)
+
+    0 means healthy and 1 means twice the limit or worse; the reason names
+    whichever signal is furthest over.
+    """
+    lag_ms = loop_monitor.lag * 1000
+    lag_level = (lag_ms - LAG_LIMIT_MS) / LAG_LIMIT_MS
+
+    pool_limit = max(1.0, MONGO_POOL_MAX_SIZE.value() * POOL_QUEUE_LIMIT)
+    pool_level = (MONGO_POOL_WAITING.value() - pool_limit) / pool_limit
+
+    if lag_level >= pool_level:
+        return min(1.0, max(0.0, lag_level)), "loop_lag"
+    return min(1.0, max(0.0, pool_level)), "db_pool"
+
+def should_shed(path: str) -> Optional[str]:
+    """Reason to reject this request now, or None to serve it
+
+    Rejection is probabilistic in the overload level so the worker keeps
+    serving part of the traffic instead of flapping between all and none.
+    """
+    if not ENABLED or path.startswith(EXEMPT_PREFIXES):
+        return None
+    level, reason = overload()
+    if level > 0 and random.random() < level:
+        return reason
+    return None
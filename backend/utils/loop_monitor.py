@@ -0,0 +1,138 @@
+"""
+Event-loop lag and blocking-call detection.
+
+A task on the loop sleeps for LOOP_LAG_SAMPLE_INTERVAL and measures how
+late it wakes up; the delay is time the loop spent running something else
+without yielding (bcrypt on the loop, large sorts, JSON encoding of big
+pages). Every sample goes into a histogram.
+
+A lateness sample only arrives after the stall is over, when the culprit
+has already returned. A watchdog thread therefore watches the sampler's
+heartbeat and, once the loop has been stuck for
+LOOP_BLOCKING_THRESHOLD_MS, captures the loop thread's stack. The
+capture is logged with the final stall duration and kept in `stalls`.
+
+LOOP_DEBUG=1 additionally turns on asyncio debug mode, which reports every
+callback or task step slower than the threshold, including short ones the
+watchdog misses between heartbeats. Debug mode slows the loop down, so use
+it while investigating rather than by default.
+"""
+
+from collections import deque
+from .metrics import EVENT_LOOP_LAG, EVENT_LOOP_LAG_SAMPLES, EVENT_LOOP_STALLS
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+# How often the loop is probed; each probe is one sleep on the loop
+LAG_SAMPLE_INTERVAL = float(os.environ.get("LOOP_LAG_SAMPLE_INTERVAL", "0.25"))
+# Stalls at least this long are captured with a stack
+BLOCKING_THRESHOLD_MS = float(os.environ.get("LOOP_BLOCKING_THRESHOLD_MS", "100"))
+DEBUG = os.environ.get("LOOP_DEBUG") == "1"
+
+# Frames kept per captured stack
+STACK_LIMIT = 30
+
+# Source tree of the app, used to name the first frame that is ours
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def blocking_location(frames) -> str:
+    """relative/path.py:function of the innermost app frame in `frames`"""
+    for frame in reversed(frames):
+        if frame.filename.startswith(_APP_ROOT) and "site-packages" not in frame.filename:
+            return f"{os.path.relpath(frame.filename, _APP_ROOT)}:{frame.name}"
+    return f"{os.path.basename(frames[-1].filename)}:{frames[-1].name}" if frames else "unknown"
+
+class LoopMonitor:
+    """Measures event-loop lag and captures what the loop was blocked on
+
+    `lag` rises immediately with a slow sample and decays over a few
+    seconds, so a single stall does not look like a healthy loop one probe
+    later (load shedding reads it).
+    """
+
+    def __init__(self, interval: float = LAG_SAMPLE_INTERVAL, threshold_ms: float = BLOCKING_THRESHOLD_MS):
+        self.interval = interval
+        self.threshold = threshold_ms / 1000
+        self.lag = 0.0
+        self.last_lag = 0.0
+        # Most recent stalls: {"at", "durationMs", "task", "location", "stack"}
+        self.stalls = deque(maxlen=20)
+        self._heartbeat = time.monotonic()
+        self._captured = None
+        self._loop = None
+        self._loop_thread = None
+
+    def record(self, lag: float):
+        self.last_lag = lag
+        self.lag = max(lag, self.lag * 0.8 + lag * 0.2)
+        EVENT_LOOP_LAG.set(self.lag)
+        EVENT_LOOP_LAG_SAMPLES.observe(lag)
+
+        captured, self._captured = self._captured, None
+        if captured is not None and lag >= self.threshold:
+            captured["durationMs"] = round(lag * 1000, 1)
+            self.stalls.append(captured)
+            EVENT_LOOP_STALLS.inc(location=captured["location"])
+            logger.warning(
+                "Event loop blocked for %.0fms in %s (task %s):\n%s",
+                lag * 1000,
+                captured["location"],
+                captured["task"],
+                "".join(captured["stack"]),
+            )
+
+    def _capture(self):
+        """Runs on the watchdog thread while the loop thread is stuck"""
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return
+        frames = traceback.extract_stack(frame, limit=STACK_LIMIT)
+        task = asyncio.current_task(self._loop)
+        self._captured = {
+            "at": time.time(),
+            "durationMs": None,
+            "task": task.get_name() if task is not None else None,
+            "location": blocking_location(frames),
+            "stack": frames.format(),
+        }
+
+    def _watch(self, stop: threading.Event):
+        check_every = max(0.01, self.threshold / 2)
+        captured_for = None
+        while not stop.wait(check_every):
+            heartbeat = self._heartbeat
+            stuck_for = time.monotonic() - heartbeat - self.interval
+            # One capture per stall, as early as possible so the stack shows the culprit
+            if stuck_for >= self.threshold and captured_for != heartbeat:
+                captured_for = heartbeat
+                try:
+                    self._capture()
+                except Exception:
+                    logger.exception("Capturing the blocked loop stack failed")
+
+    async def run(self):
+        loop = self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        if DEBUG:
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.threshold
+
+        stop = threading.Event()
+        threading.Thread(target=self._watch, args=(stop,), name="loop-watchdog", daemon=True).start()
+        try:
+            while True:
+                self._heartbeat = time.monotonic()
+                started = loop.time()
+                await asyncio.sleep(self.interval)
+                self.record(max(0.0, loop.time() - started - self.interval))
+        finally:
+            stop.set()
+
+loop_monitor = LoopMonitor()
@@ -0,0 +1,93 @@
+from functools import lru_cache
+from typing import List, Optional
+from urllib.parse import quote
+import base64
+import hashlib
+import hmac
+import os
+import time
+import uuid
+
+# Defaults to the local-disk stand-in mounted by server.py
+CDN_BASE_URL = os.environ.get("CDN_BASE_URL", "/api/media/files").rstrip("/")
+CDN_SIGNING_KEY = os.environ.get("CDN_SIGNING_KEY", "")
+
+# Signed URLs live this long; expiries are rounded to half of it so the same
+# URL (and its cached signature) is reused by every request in that window
+URL_TTL_SECONDS = int(os.environ.get("CDN_URL_TTL", "3600"))
+
+VARIANTS = ("thumbnail", "480p", "720p", "original")
+
+# Variant to fall back to, in order, when the preferred one is missing
+_FALLBACKS = {
+    "thumbnail": ("thumbnail", "480p", "720p", "original"),
+    "480p": ("480p", "720p", "original", "thumbnail"),
+    "720p": ("720p", "original", "480p", "thumbnail"),
+    "original": ("original", "720p", "480p", "thumbnail"),
+}
+
+def is_absolute(path: str) -> bool:
+    return path.startswith("http://") or path.startswith("https://")
+
+def descriptor_from_url(url: str, kind: str) -> dict:
+    """Media descriptor for a raw URL submitted by a client"""
+    return {
+        "id": str(uuid.uuid4()),
+        "kind": kind,
+        "variants": [{"name": "original", "path": url}],
+        "blurhash": None
+    }
+
+def product_media(product: dict, kind: str) -> List[dict]:
+    """Descriptors of a product's images or videos, including legacy raw URLs"""
+    media = product.get(f"{kind}_media")
+    if media:
+        return media
+    return [descriptor_from_url(url, kind) for url in product.get(f"{kind}s", [])]
+
+@lru_cache(maxsize=65536)
+def _signature(path: str, expires: int) -> str:
+    digest = hmac.new(CDN_SIGNING_KEY.encode(), f"{path}:{expires}".encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:18]).decode()
+
+def signed_url(path: str, now: Optional[float] = None) -> str:
+    """Public URL of a CDN object, signed with an expiry when a key is configured"""
+    if is_absolute(path):
+        return path
+    url = f"{CDN_BASE_URL}/{quote(path)}"
+    if not CDN_SIGNING_KEY:
+        return url
+
+    window = max(URL_TTL_SECONDS // 2, 1)
+    now = time.time() if now is None else now
+    expires = (int(now) // window + 1) * window + window
+    return f"{url}?expires={expires}&sig={_signature(path, expires)}"
+
+def pick_variant(descriptor: dict, preferred: str) -> Optional[dict]:
+    variants = {variant["name"]: variant for variant in descriptor.get("variants", [])}
+    for name in _FALLBACKS.get(preferred, _FALLBACKS["720p"]):
+        if name in variants:
+            return variants[name]
+    return None
+
+def variant_url(descriptor: dict, preferred: str) -> Optional[str]:
+    variant = pick_variant(descriptor, preferred)
+    return signed_url(variant["path"]) if variant else None
+
+def poster_url(video: Optional[dict], image: Optional[dict]) -> Optional[str]:
+    """Still frame shown before a video starts: its own thumbnail, else the product image"""
+    for descriptor in (video, image):
+        if descriptor and any(v["name"] == "thumbnail" for v in descriptor.get("variants", [])):
+            return variant_url(descriptor, "thumbnail")
+    return variant_url(image, "thumbnail") if image else None
+
+def client_video_variant(quality: Optional[str], headers) -> str:
+    """Video variant for the client: explicit ?quality=, else Save-Data / viewport hints"""
+    if quality in VARIANTS:
+        return quality
+    if headers.get("save-data", "").lower() == "on":
+        return "480p"
+    viewport = headers.get("sec-ch-viewport-width") or headers.get("viewport-width")
+    if viewport and viewport.isdigit() and int(viewport) <= 480:
+        return "480p"
+    return "720p"
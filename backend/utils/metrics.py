@@ -0,0 +1,326 @@
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Default latency buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Under gunicorn every worker has its own registry. gunicorn.conf.py gives each
+# worker a stable slot and the worker serves its metrics, labelled with the
+# slot, on METRICS_PORT_BASE + slot; scrape all of those ports.
+METRICS_PORT_BASE = int(os.environ.get("METRICS_PORT_BASE", "9100"))
+METRICS_HOST = os.environ.get("METRICS_HOST", "0.0.0.0")
+
+
+def _format_labels(names: Sequence[str], values: Tuple, *extra: str) -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    pairs.extend(label for label in extra if label)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self, const: str = "") -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples(const))
+        return lines
+
+    def _samples(self, const: str) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing value"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self, const: str) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key, const)} {_format_value(value)}"
+            for key, value in list(self._values.items())
+        ]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, or be read from a callback at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        callback: Optional[Callable[[], float]] = None,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._callback = callback
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        if self._callback is not None:
+            return self._callback()
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self, const: str) -> List[str]:
+        if self._callback is not None:
+            return [f"{self.name}{_format_labels((), (), const)} {_format_value(self._callback())}"]
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key, const)} {_format_value(value)}"
+            for key, value in list(self._values.items())
+        ]
+
+
+class Histogram(_Metric):
+    """Distribution of observations over fixed buckets"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def _samples(self, const: str) -> List[str]:
+        lines = []
+        for key, (counts, total, count) in list(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, const, le)} {cumulative}"
+                )
+            labels = _format_labels(self.labelnames, key, const)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        # Added to every sample, e.g. the gunicorn worker slot
+        self.const_labels: Dict[str, str] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (), callback=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        const = ",".join(f'{name}="{value}"' for name, value in self.const_labels.items())
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render(const))
+        return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_worker_metrics_server() -> Optional[ThreadingHTTPServer]:
+    """Serve this worker's registry on its own port when running under gunicorn
+
+    Returns None outside gunicorn (no METRICS_WORKER slot), where the app's
+    /metrics route already covers the only process.
+    """
+    slot = os.environ.get("METRICS_WORKER")
+    if slot is None:
+        return None
+    REGISTRY.const_labels["worker"] = slot
+    port = METRICS_PORT_BASE + int(slot)
+    try:
+        server = ThreadingHTTPServer((METRICS_HOST, port), _MetricsHandler)
+    except OSError:
+        logger.exception("Cannot serve worker %s metrics on port %d", slot, port)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+REGISTRY = Registry()
+
+# HTTP
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ("method", "route", "status"),
+)
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served",
+)
+
+RATE_LIMITED = REGISTRY.counter(
+    "http_rate_limited_total",
+    "Requests rejected with 429 by rate limit name",
+    ("limit",),
+)
+LOAD_SHED = REGISTRY.counter(
+    "http_load_shed_total",
+    "Requests rejected with 503 while overloaded, by signal",
+    ("reason",),
+)
+EVENT_LOOP_LAG = REGISTRY.gauge(
+    "event_loop_lag_seconds",
+    "Recent event loop scheduling delay (decaying maximum)",
+)
+EVENT_LOOP_LAG_SAMPLES = REGISTRY.histogram(
+    "event_loop_lag_sample_seconds",
+    "Event loop scheduling delay per probe",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+EVENT_LOOP_STALLS = REGISTRY.counter(
+    "event_loop_stalls_total",
+    "Event loop stalls over the blocking threshold by innermost app frame",
+    ("location",),
+)
+
+LOG_RECORDS_DROPPED = REGISTRY.counter(
+    "log_records_dropped_total",
+    "Log records dropped because the log writer fell behind",
+)
+
+APP_IMPORT_SECONDS = REGISTRY.gauge(
+    "app_import_seconds",
+    "Time taken to import server.py and build the app",
+)
+
+# MongoDB
+MONGO_COMMAND_DURATION = REGISTRY.histogram(
+    "mongo_command_duration_seconds",
+    "Mongo command latency by command name",
+    ("command",),
+)
+MONGO_POOL_MAX_SIZE = REGISTRY.gauge(
+    "mongo_pool_max_size",
+    "Configured maximum connections per Mongo server pool",
+)
+MONGO_POOL_OPEN = REGISTRY.gauge(
+    "mongo_pool_connections_open",
+    "Open connections in the Mongo connection pools",
+)
+MONGO_POOL_IN_USE = REGISTRY.gauge(
+    "mongo_pool_connections_in_use",
+    "Mongo connections currently checked out",
+)
+MONGO_POOL_WAITING = REGISTRY.gauge(
+    "mongo_pool_checkout_waiting",
+    "Operations waiting to check out a Mongo connection",
+)
+
+# bcrypt worker pool
+BCRYPT_QUEUE_DEPTH = REGISTRY.gauge(
+    "bcrypt_pool_queue_depth",
+    "Password hash operations waiting for a bcrypt worker",
+)
+BCRYPT_DURATION = REGISTRY.histogram(
+    "bcrypt_duration_seconds",
+    "Time spent hashing or verifying a password",
+    ("operation",),
+)
+
+# Business events and caches
+ESCROW_TRANSITIONS = REGISTRY.counter(
+    "escrow_transitions_total",
+    "Escrow transaction state transitions",
+    ("from_status", "to_status"),
+)
+PAYMENT_CALLBACKS = REGISTRY.counter(
+    "payment_callbacks_total",
+    "Payment gateway callbacks by inbox outcome",
+    ("result",),
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "cache_requests_total",
+    "In-process cache lookups by result",
+    ("cache", "result"),
+)
@@ -0,0 +1,74 @@
+from fastapi import FastAPI
+from fastapi.openapi.utils import get_openapi
+from pathlib import Path
+import fastapi
+import hashlib
+import inspect
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+def _fingerprint(app: FastAPI, source_dirs) -> str:
+    """Changes whenever a route, a model or FastAPI itself changes"""
+    digest = hashlib.sha256()
+    digest.update(f"{fastapi.__version__}|{app.title}|{app.version}".encode())
+    for route in app.routes:
+        methods = ",".join(sorted(getattr(route, "methods", None) or []))
+        endpoint = getattr(route, "endpoint", None)
+        qualname = f"{endpoint.__module__}.{endpoint.__qualname__}" if endpoint else ""
+        digest.update(f"{route.path}|{methods}|{qualname}".encode())
+
+    files = set()
+    for route in app.routes:
+        endpoint = getattr(route, "endpoint", None)
+        if endpoint is not None:
+            try:
+                files.add(Path(inspect.getsourcefile(endpoint)))
+            except TypeError:
+                pass
+    for directory in source_dirs:
+        files.update(Path(directory).glob("*.py"))
+    for path in sorted(files):
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+def install_cached_openapi(app: FastAPI, cache_path: Path, source_dirs=()):
+    """Serve the OpenAPI schema from `cache_path` while the code behind it is unchanged
+
+    Generating the schema walks every route and model; a worker that
+    loads it from disk skips that work on its first /openapi.json or /docs
+    request. The file is rewritten whenever the fingerprint no longer
+    matches (jobs/export_openapi.py writes it at build time).
+    """
+
+    def openapi():
+        if app.openapi_schema:
+            return app.openapi_schema
+
+        fingerprint = _fingerprint(app, source_dirs)
+        try:
+            cached = json.loads(cache_path.read_text())
+            if cached.get("fingerprint") == fingerprint:
+                app.openapi_schema = cached["schema"]
+                return app.openapi_schema
+        except (OSError, ValueError):
+            pass
+
+        app.openapi_schema = get_openapi(
+            title=app.title,
+            version=app.version,
+            description=app.description,
+            routes=app.routes,
+        )
+        try:
+            partial = cache_path.with_suffix(".partial")
+            partial.write_text(json.dumps({"fingerprint": fingerprint, "schema": app.openapi_schema}))
+            os.replace(partial, cache_path)
+        except OSError:
+            # Read-only image: generating once per worker is still fine
+            logger.debug("Could not write the OpenAPI cache to %s", cache_path)
+        return app.openapi_schema
+
+    app.openapi = openapi
@@ -0,0 +1,37 @@
+from urllib.parse import urlencode
+import hashlib
+import hmac
+import os
+import time
+
+# Gateway settings, see PAYMENT_INTEGRATION_GUIDE.md
+PAYMENT_API_URL = os.environ.get("PAYMENT_API_URL", "https://payment-gateway.dz")
+PAYMENT_SECRET_KEY = os.environ.get("PAYMENT_SECRET_KEY", "")
+
+# Callbacks signed longer ago than this are rejected as replays
+SIGNATURE_TOLERANCE_SECONDS = 300
+
+def payment_url(transaction_id: str, amount: float, payment_method: str) -> str:
+    """Checkout page the buyer is sent to"""
+    query = urlencode({"transaction_id": transaction_id, "amount": amount, "method": payment_method})
+    return f"{PAYMENT_API_URL}/pay?{query}"
+
+def to_minor_units(amount: float) -> int:
+    """The gateway reports amounts in centimes"""
+    return int(round(amount * 100))
+
+def sign(timestamp: str, body: bytes, secret: str = None) -> str:
+    """HMAC-SHA256 over "<timestamp>.<raw body>", hex encoded"""
+    key = (secret if secret is not None else PAYMENT_SECRET_KEY).encode()
+    return hmac.new(key, timestamp.encode() + b"." + body, hashlib.sha256).hexdigest()
+
+def verify_signature(timestamp: str, body: bytes, signature: str) -> bool:
+    if not PAYMENT_SECRET_KEY or not timestamp or not signature:
+        return False
+    try:
+        age = abs(time.time() - int(timestamp))
+    except ValueError:
+        return False
+    if age > SIGNATURE_TOLERANCE_SECONDS:
+        return False
+    return hmac.compare_digest(sign(timestamp, body), signature)
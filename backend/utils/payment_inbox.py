@@ -0,0 +1,176 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+from collections import defaultdict
+from datetime import datetime, timedelta
+from .metrics import PAYMENT_CALLBACKS
+from .coordination import run_as_leader
+from .escrow import cancel_escrow, run_transaction
+from .ledger import escrow_funding_postings, post_journal
+from .payment_gateway import to_minor_units
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = float(os.environ.get("PAYMENT_CALLBACK_POLL_INTERVAL", "1.0"))
+BATCH_SIZE = 500
+CONCURRENCY = 8
+MAX_ATTEMPTS = 5
+
+# Sequences count up from 1 per payment. A callback after a gap waits for the
+# missing ones, but no longer than this in case the gateway never sends them
+SEQUENCE_GAP_TIMEOUT = timedelta(seconds=float(os.environ.get("PAYMENT_SEQUENCE_GAP_TIMEOUT", "300")))
+
+# Processed callbacks are kept this long for audits and duplicate detection
+RETENTION_DAYS = 30
+
+async def store_callback(db: AsyncIOMotorDatabase, event: dict) -> bool:
+    """Put a verified callback in the inbox, returns False for a duplicate delivery
+
+    The gateway's event id is the _id, so retries of the same event collapse.
+    """
+    try:
+        await db.payment_callbacks.insert_one({
+            "_id": event["event_id"],
+            "transaction_id": event["payment_id"],
+            "status": event["status"],
+            "amount": event["amount"],
+            "sequence": event["sequence"],
+            "state": "pending",
+            "attempts": 0,
+            "received_at": datetime.utcnow()
+        })
+    except DuplicateKeyError:
+        PAYMENT_CALLBACKS.inc(result="duplicate")
+        return False
+    PAYMENT_CALLBACKS.inc(result="received")
+    return True
+
+async def apply_callback(db: AsyncIOMotorDatabase, callback: dict) -> str:
+    """Apply one gateway status change to its transaction, returns the callback's new state
+
+    "pending" means the callback is held back until the sequences before it arrive.
+    """
+    transaction = await db.transactions.find_one({"id": callback["transaction_id"]})
+    if not transaction:
+        return "rejected"
+
+    # Deliveries can arrive out of order; anything older than what was applied is stale
+    if callback["sequence"] <= transaction.get("payment_sequence", -1):
+        return "ignored"
+
+    if (
+        callback["sequence"] > transaction.get("payment_sequence", 0) + 1
+        and datetime.utcnow() - callback["received_at"] < SEQUENCE_GAP_TIMEOUT
+    ):
+        return "pending"
+
+    if callback["status"] == "PENDING":
+        await db.transactions.update_one(
+            {"id": transaction["id"], "payment_sequence": transaction.get("payment_sequence")},
+            {"$set": {"payment_sequence": callback["sequence"]}}
+        )
+        return "applied"
+
+    if callback["status"] == "SUCCESS" and callback["amount"] != to_minor_units(transaction["amount"]):
+        logger.warning(
+            "Payment callback %s for %s reports %s, expected %s",
+            callback["_id"], transaction["id"], callback["amount"], to_minor_units(transaction["amount"])
+        )
+        return "rejected"
+
+    payment_status = "paid" if callback["status"] == "SUCCESS" else "failed"
+
+    async def work(session):
+        now = datetime.utcnow()
+        result = await db.transactions.update_one(
+            {"id": transaction["id"], "status": "in_escrow", "payment_status": "awaiting_payment"},
+            {
+                "$set": {
+                    "payment_status": payment_status,
+                    "payment_sequence": callback["sequence"],
+                    f"{payment_status}_at": now,
+                    "updated_at": now
+                }
+            },
+            session=session
+        )
+        if result.modified_count and payment_status == "paid":
+            # The buyer's money is now held in escrow until release or refund
+            await post_journal(
+                db,
+                f"escrow_funding:{transaction['id']}",
+                "escrow_funding",
+                escrow_funding_postings(transaction),
+                session=session,
+                transaction_id=transaction["id"]
+            )
+        return result.modified_count
+
+    if not await run_transaction(db, work):
+        # Already paid, failed, cancelled or released
+        if payment_status == "paid" and transaction.get("payment_status") != "paid":
+            logger.warning("Payment %s succeeded after the escrow was closed, it needs a refund", transaction["id"])
+        return "ignored"
+
+    if payment_status == "failed":
+        await cancel_escrow(db, transaction, "payment_failed")
+    return "applied"
+
+async def _apply_in_order(db: AsyncIOMotorDatabase, callbacks: list) -> list:
+    """Apply one transaction's callbacks one after another
+
+    Stops at the first error or held callback, returns the ids left pending.
+    """
+    for position, callback in enumerate(callbacks):
+        waiting = [later["_id"] for later in callbacks[position:]]
+        try:
+            state = await apply_callback(db, callback)
+        except Exception as exc:
+            logger.exception("Applying payment callback %s failed", callback["_id"])
+            attempts = callback["attempts"] + 1
+            update = {"$set": {"attempts": attempts, "error": repr(exc)}}
+            if attempts >= MAX_ATTEMPTS:
+                update["$set"].update(state="failed", processed_at=datetime.utcnow())
+                PAYMENT_CALLBACKS.inc(result="failed")
+            await db.payment_callbacks.update_one({"_id": callback["_id"]}, update)
+            # Later callbacks for this transaction wait so they are not applied out of order
+            return waiting
+        if state == "pending":
+            return waiting
+        await db.payment_callbacks.update_one(
+            {"_id": callback["_id"]},
+            {"$set": {"state": state, "processed_at": datetime.utcnow()}}
+        )
+        PAYMENT_CALLBACKS.inc(result=state)
+    return []
+
+async def process_pending(db: AsyncIOMotorDatabase):
+    """Drain the inbox: transactions in parallel, each transaction's callbacks in order"""
+    # Held and failing callbacks stay pending; skip them until the next poll
+    skipped = []
+    while True:
+        cursor = db.payment_callbacks.find({"state": "pending", "_id": {"$nin": skipped}}).sort("received_at", 1)
+        batch = await cursor.limit(BATCH_SIZE).to_list(length=BATCH_SIZE)
+        if not batch:
+            return
+
+        by_transaction = defaultdict(list)
+        for callback in batch:
+            by_transaction[callback["transaction_id"]].append(callback)
+
+        semaphore = asyncio.Semaphore(CONCURRENCY)
+
+        async def drain(callbacks):
+            async with semaphore:
+                return await _apply_in_order(db, sorted(callbacks, key=lambda callback: callback["sequence"]))
+
+        for waiting in await asyncio.gather(*(drain(callbacks) for callbacks in by_transaction.values())):
+            skipped += waiting
+        if len(batch) < BATCH_SIZE:
+            return
+
+async def run_worker(db: AsyncIOMotorDatabase, interval: float = POLL_INTERVAL):
+    """Poll the inbox every `interval` seconds, on one worker at a time"""
+    await run_as_leader(db, "payment_callbacks", interval, process_pending, ttl=30, mongo_lease=True)
@@ -0,0 +1,197 @@
+"""
+Sampling profiler for a running worker.
+
+A dedicated thread looks at the event-loop thread every `interval` seconds
+and records its Python stack; nothing is installed in the loop itself, so
+the only cost is the sampling thread holding the GIL for the few
+microseconds each sample takes (about 1% at the default 5ms interval).
+
+Each sample is attributed to the route template whose handler is on the
+stack, falling back to the FastAPI request handler frame for work done
+after the endpoint returned (response validation and JSON encoding).
+Samples with no request on the stack are "[background]" and samples
+where the loop is waiting for I/O are "[idle]".
+
+"cpu" mode records only what the loop thread is executing. "wall" mode
+also records, for every request task that is suspended, the await chain it
+is parked on. This shows Mongo round trips and other waits next to CPU
+time.
+"""
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+import asyncio
+import os
+import sys
+import threading
+import time
+
+MAX_SECONDS = 60.0
+MIN_INTERVAL = 0.001
+
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# One profile at a time per worker, on its own thread
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profiler")
+_running = threading.Lock()
+
+class ProfilerBusy(Exception):
+    """Another profile is already running in this worker"""
+
+def _frame_name(code) -> str:
+    filename = code.co_filename
+    if filename.startswith(_APP_ROOT) and "site-packages" not in filename:
+        filename = os.path.relpath(filename, _APP_ROOT)
+    else:
+        # Keep library frames short: package/module.py
+        filename = os.sep.join(filename.split(os.sep)[-2:])
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+def _is_idle(frame) -> bool:
+    # The loop is parked in the selector waiting for sockets or timers
+    return frame.f_code.co_name in ("select", "poll", "control") and "selectors" in frame.f_code.co_filename
+
+class Profiler:
+    def __init__(self, loop: asyncio.AbstractEventLoop, loop_thread: int, routes, mode: str = "cpu"):
+        self.loop = loop
+        self.loop_thread = loop_thread
+        self.mode = mode
+        # Handler code object -> route template
+        self.endpoints = {
+            route.endpoint.__code__: route.path
+            for route in routes
+            if hasattr(getattr(route, "endpoint", None), "__code__")
+        }
+        self.samples = Counter()  # (route, frame names root first) -> count
+        self.sample_count = 0
+        self.duration = 0.0
+
+    def _route_of(self, frames) -> Optional[str]:
+        for frame in frames:
+            route = self.endpoints.get(frame.f_code)
+            if route is not None:
+                return route
+        for frame in frames:
+            # fastapi.routing.get_request_handler's `app`, still on the stack while the response is encoded
+            if frame.f_code.co_name == "app" and frame.f_code.co_filename.endswith(os.path.join("fastapi", "routing.py")):
+                request = frame.f_locals.get("request")
+                route = request.scope.get("route") if request is not None else None
+                if route is not None and route.endpoint.__code__ in self.endpoints:
+                    return route.path
+        return None
+
+    def _record_stack(self, frames, default_route: str):
+        route = self._route_of(frames) or default_route
+        self.samples[(route, tuple(_frame_name(frame.f_code) for frame in reversed(frames)))] += 1
+
+    def _sample_loop_thread(self):
+        frame = sys._current_frames().get(self.loop_thread)
+        if frame is None:
+            return
+        frames = []
+        while frame is not None:
+            frames.append(frame)
+            frame = frame.f_back
+        if _is_idle(frames[0]):
+            self.samples[("[idle]", ())] += 1
+        else:
+            self._record_stack(frames, "[background]")
+
+    def _sample_waiting_tasks(self):
+        running = asyncio.current_task(self.loop)
+        for task in list(asyncio.all_tasks(self.loop)):
+            if task is running:
+                continue
+            # Follow the await chain down to the innermost suspended coroutine
+            frames = []
+            coro = task.get_coro()
+            while coro is not None and getattr(coro, "cr_frame", None) is not None:
+                frames.append(coro.cr_frame)
+                coro = getattr(coro, "cr_await", None)
+            frames.reverse()
+            if frames and self._route_of(frames) is not None:
+                self._record_stack(frames, "[background]")
+
+    def run(self, seconds: float, interval: float):
+        """Sample until `seconds` have passed (runs on the profiler thread)"""
+        started = time.perf_counter()
+        deadline = started + seconds
+        while time.perf_counter() < deadline:
+            self._sample_loop_thread()
+            if self.mode == "wall":
+                try:
+                    self._sample_waiting_tasks()
+                except RuntimeError:
+                    # The task set changed while we iterated it, skip this sample
+                    pass
+            self.sample_count += 1
+            time.sleep(interval)
+        self.duration = time.perf_counter() - started
+
+    def collapsed(self, include_idle: bool = False) -> str:
+        """Brendan Gregg's collapsed format, one `route;frame;...;frame count` per line"""
+        lines = []
+        for (route, frames), count in sorted(self.samples.items()):
+            if route == "[idle]" and not include_idle:
+                continue
+            lines.append(f"{';'.join((route,) + frames)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def by_route(self) -> Dict[str, int]:
+        totals = Counter()
+        for (route, _), count in self.samples.items():
+            totals[route] += count
+        return dict(totals.most_common())
+
+    def speedscope(self, interval: float, include_idle: bool = False) -> dict:
+        """speedscope.app file with one sampled profile per route"""
+        frames, index = [], {}
+
+        def frame_id(name):
+            if name not in index:
+                index[name] = len(frames)
+                frames.append({"name": name})
+            return index[name]
+
+        per_route = {}
+        for (route, stack), count in self.samples.items():
+            if route == "[idle]" and not include_idle:
+                continue
+            profile = per_route.setdefault(route, {"samples": [], "weights": []})
+            profile["samples"].append([frame_id(name) for name in stack])
+            profile["weights"].append(count * interval * 1000)
+
+        profiles = [
+            {
+                "type": "sampled",
+                "name": route,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": sum(profile["weights"]),
+                "samples": profile["samples"],
+                "weights": profile["weights"],
+            }
+            for route, profile in sorted(per_route.items(), key=lambda item: -sum(item[1]["weights"]))
+        ]
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": profiles,
+            "name": f"{self.mode} profile, {self.duration:.1f}s",
+            "exporter": "dzamarket",
+        }
+
+async def profile(routes, seconds: float, interval: float, mode: str = "cpu") -> Profiler:
+    """Profile the calling worker's event loop for `seconds`"""
+    if not _running.acquire(blocking=False):
+        raise ProfilerBusy()
+    try:
+        loop = asyncio.get_running_loop()
+        profiler = Profiler(loop, threading.get_ident(), routes, mode)
+        seconds = min(max(seconds, 0.1), MAX_SECONDS)
+        interval = max(interval, MIN_INTERVAL)
+        await loop.run_in_executor(_executor, profiler.run, seconds, interval)
+        return profiler
+    finally:
+        _running.release()
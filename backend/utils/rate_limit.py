@@ -0,0 +1,181 @@
+"""
+Token-bucket rate limits for the public endpoints.
+
+Each budget allows `rate` requests per `period` seconds with bursts up to
+`rate`. Callers are keyed by user id when they send a valid token and by
+client address otherwise; behind a proxy the address comes from
+X-Forwarded-For only when uvicorn/gunicorn trusts the proxy
+(FORWARDED_ALLOW_IPS).
+
+Buckets live in the worker by default, so each worker enforces the full
+budget. With COORDINATION_URL pointing at Redis the buckets are shared by
+all workers; if Redis stops answering the worker falls back to its own
+buckets for a while instead of failing requests.
+"""
+
+from fastapi import Depends, HTTPException, Request, status
+from collections import OrderedDict
+from typing import Optional
+from .auth import decode_access_token
+from .coordination import RedisCoordinator, get_coordinator
+from .metrics import RATE_LIMITED
+import logging
+import math
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("RATE_LIMITING", "true").lower() == "true"
+
+class Limit:
+    """`rate` requests per `period` seconds"""
+
+    def __init__(self, rate: int, period: float):
+        self.rate = rate
+        self.period = period
+
+    @property
+    def per_second(self) -> float:
+        return self.rate / self.period
+
+    @classmethod
+    def parse(cls, value: str) -> "Limit":
+        """Read "<requests>/<seconds>", e.g. "10/60" """
+        rate, period = value.split("/")
+        return cls(int(rate), float(period))
+
+def _limit(name: str, default: str) -> Limit:
+    return Limit.parse(os.environ.get(f"RATE_LIMIT_{name.upper()}", default))
+
+LIMITS = {
+    # Every login with a known email costs a bcrypt verification
+    "login": _limit("login", "20/60"),
+    # Failed logins per attempted email and caller
+    "login_account": _limit("login_account", "5/60"),
+    # Failed logins per attempted email from all callers together; looser so
+    # that one caller alone cannot lock the account's owner out
+    "login_account_global": _limit("login_account_global", "50/60"),
+    "register": _limit("register", "10/3600"),
+    "validate_referral": _limit("validate_referral", "30/60"),
+    "products": _limit("products", "120/60"),
+}
+
+class LocalBuckets:
+    """Buckets in this worker, least recently used dropped past `maxsize`"""
+
+    def __init__(self, maxsize: int = 100_000):
+        self.maxsize = maxsize
+        # key -> (tokens, updated)
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def take(self, key: str, limit: Limit, cost: int = 1) -> float:
+        """Spend `cost` tokens, returns 0 or the seconds until one is available"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (limit.rate, now))
+        tokens = min(limit.rate, tokens + (now - updated) * limit.per_second)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= cost
+        else:
+            wait = (1 - tokens) / limit.per_second
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return wait
+
+# Same algorithm as LocalBuckets on a Redis hash, timed with the server clock
+# (writing after TIME needs effects replication, the default since Redis 5)
+_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local per_second = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * per_second)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - cost
+else
+    wait = (1 - tokens) / per_second
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / per_second * 1000))
+return tostring(wait)
+"""
+
+class RedisBuckets:
+    """Buckets shared by every worker through Redis"""
+
+    PREFIX = "dzamarket:ratelimit:"
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    async def take(self, key: str, limit: Limit, cost: int = 1) -> float:
+        wait = await self.redis.eval(_TAKE_SCRIPT, 1, self.PREFIX + key, limit.rate, repr(limit.per_second), cost)
+        return float(wait)
+
+# Seconds to stay on local buckets after the shared store fails
+SHARED_RETRY_AFTER = 30.0
+
+_local = LocalBuckets()
+_shared = None
+_shared_down_until = 0.0
+
+def _shared_buckets() -> Optional[RedisBuckets]:
+    global _shared
+    if _shared is None:
+        coordinator = get_coordinator()
+        if isinstance(coordinator, RedisCoordinator):
+            _shared = RedisBuckets(coordinator.redis)
+    return _shared
+
+async def take(key: str, limit: Limit, cost: int = 1) -> float:
+    global _shared_down_until
+    shared = _shared_buckets()
+    if shared is not None and time.monotonic() >= _shared_down_until:
+        try:
+            return await shared.take(key, limit, cost)
+        except Exception as exc:
+            logger.warning("Shared rate limit store unavailable, using worker buckets: %r", exc)
+            _shared_down_until = time.monotonic() + SHARED_RETRY_AFTER
+    return await _local.take(key, limit, cost)
+
+def client_key(request: Request) -> str:
+    """user:<id> for a valid bearer token, otherwise ip:<client address>"""
+    authorization = request.headers.get("authorization", "")
+    if authorization[:7].lower() == "bearer ":
+        payload = decode_access_token(authorization[7:])
+        if payload and payload.get("sub"):
+            return f"user:{payload['sub']}"
+    host = request.client.host if request.client else "unknown"
+    return f"ip:{host}"
+
+async def enforce(name: str, key: str, cost: int = 1):
+    """Spend `cost` requests of budget `name` for `key`, raise 429 when exhausted
+
+    With cost=0 nothing is spent; the call only checks the budget is not
+    exhausted, for budgets spent later on the request's outcome.
+    """
+    if not ENABLED:
+        return
+    wait = await take(f"{name}:{key}", LIMITS[name], cost)
+    if wait > 0:
+        RATE_LIMITED.inc(limit=name)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests, please retry later",
+            headers={"Retry-After": str(math.ceil(wait))},
+        )
+
+def rate_limit(name: str):
+    """Route dependency applying budget `name` per caller"""
+
+    async def dependency(request: Request):
+        await enforce(name, client_key(request))
+
+    return Depends(dependency)
@@ -0,0 +1,35 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from typing import Iterable, List
+
+async def get_neighbor_scores(db: AsyncIOMotorDatabase, product_ids: Iterable[str]) -> dict:
+    """Sum neighbour scores over several seed products, in one indexed query"""
+    seeds = list(set(product_ids))
+    if not seeds:
+        return {}
+
+    scores = {}
+    async for doc in db.product_neighbors.find({"_id": {"$in": seeds}}):
+        for neighbor in doc.get("neighbors", []):
+            scores[neighbor["id"]] = scores.get(neighbor["id"], 0) + neighbor["score"]
+    for seed in seeds:
+        scores.pop(seed, None)
+    return scores
+
+async def get_similar_products(
+    db: AsyncIOMotorDatabase,
+    product_ids: Iterable[str],
+    limit: int,
+    query: dict = None
+) -> List[dict]:
+    """Products most similar to the seeds that also match `query`, best first"""
+    scores = await get_neighbor_scores(db, product_ids)
+    if not scores:
+        return []
+
+    ranked = sorted(scores, key=scores.get, reverse=True)[:limit * 2]
+    product_query = dict(query or {"status": "available"})
+    product_query["id"] = {"$in": ranked}
+    products = await db.products.find(product_query).to_list(length=len(ranked))
+
+    products.sort(key=lambda product: scores[product["id"]], reverse=True)
+    return products[:limit]
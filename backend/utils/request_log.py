@@ -0,0 +1,215 @@
+"""
+Request IDs, structured logs and the access log.
+
+Every request gets an id (the caller's X-Request-ID when it looks sane,
+otherwise a new one). The id is returned in the response headers and
+attached to every log record written while the request is served.
+
+Log records are handed to a queue on the event loop and written by a
+listener thread, so a slow stdout or disk never stalls request handling.
+The queue is bounded: when the writer falls behind, records are dropped
+and counted rather than buffered without limit. The listener is a thread,
+so it is started per worker at startup (threads do not survive gunicorn's
+fork); until then records are written directly.
+
+Successful, fast requests are sampled at ACCESS_LOG_SAMPLE_RATE. Errors
+and requests slower than ACCESS_LOG_SLOW_MS are always logged, and every
+entry carries the rate it was sampled at.
+"""
+
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+from .metrics import LOG_RECORDS_DROPPED
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import uuid
+
+LOG_FORMAT = os.environ.get(
+    "LOG_FORMAT", "json" if os.environ.get("ENVIRONMENT") == "production" else "text"
+)
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+
+ACCESS_LOG_SAMPLE_RATE = float(os.environ.get("ACCESS_LOG_SAMPLE_RATE", "0.1"))
+ACCESS_LOG_SLOW_MS = float(os.environ.get("ACCESS_LOG_SLOW_MS", "500"))
+# Probes and scrapes are only logged when they fail
+QUIET_PREFIXES = ("/api/health", "/metrics")
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
+
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+access_logger = logging.getLogger("access")
+
+class RequestContext:
+    """What the access log needs to know about the request being served
+
+    Handlers run in a copy of the middleware's context, so they fill in
+    this shared object rather than setting context variables of their own.
+    """
+
+    __slots__ = ("request_id", "user_id")
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.user_id = None
+
+_request_context: ContextVar[Optional[RequestContext]] = ContextVar("request_context", default=None)
+
+def begin_request(incoming_id: Optional[str]):
+    """Start a request with the caller's id if it is usable, returns (context, token)"""
+    request_id = incoming_id if incoming_id and _VALID_REQUEST_ID.match(incoming_id) else uuid.uuid4().hex
+    context = RequestContext(request_id)
+    return context, _request_context.set(context)
+
+def end_request(token):
+    _request_context.reset(token)
+
+def set_user(user_id: str):
+    """Record the authenticated user of the current request"""
+    context = _request_context.get()
+    if context is not None:
+        context.user_id = user_id
+
+class RequestIdFilter(logging.Filter):
+    """Stamps records with the id of the request being served ("-" outside requests)"""
+
+    def filter(self, record):
+        # Queued records were stamped on the loop; the writer thread has no request context
+        if not hasattr(record, "request_id"):
+            context = _request_context.get()
+            record.request_id = context.request_id if context is not None else "-"
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; access log fields are merged in from `fields`"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", "-")
+        if request_id != "-":
+            entry["requestId"] = request_id
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+_traceback_formatter = logging.Formatter()
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops and counts records instead of blocking on a full queue"""
+
+    def prepare(self, record):
+        """Copy of `record` that can cross to the writer thread
+
+        QueueHandler.prepare formats the traceback into the message; keep it
+        in exc_text instead so the JSON formatter can put it in `exc`.
+        """
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            # Tracebacks hold frames; render them here and send only the text
+            if not record.exc_text:
+                record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+_output = None
+_listener = None
+
+def configure_logging():
+    """Direct logging for the master process and anything before startup"""
+    global _output
+    _output = logging.StreamHandler(sys.stdout)
+    _output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+    _output.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_output)
+    root.setLevel(LOG_LEVEL)
+
+def start_listener():
+    """Route this worker's logging through the queue and its writer thread"""
+    global _listener
+    if _listener is not None or _output is None:
+        return
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    handler = DroppingQueueHandler(log_queue)
+    # Stamp the request id here, on the loop, where the request context is visible
+    handler.addFilter(RequestIdFilter())
+    _listener = QueueListener(log_queue, _output, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.removeHandler(_output)
+    root.addHandler(handler)
+
+def stop_listener():
+    """Flush queued records and go back to direct writes"""
+    global _listener
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, QueueHandler):
+            root.removeHandler(handler)
+    root.addHandler(_output)
+    _listener.stop()
+    _listener = None
+
+def log_access(request, context: RequestContext, route: str, status_code: int, duration: float, db_stats):
+    """Write the access log entry for a finished request, subject to sampling"""
+    duration_ms = duration * 1000
+    always = status_code >= 400 or duration_ms >= ACCESS_LOG_SLOW_MS
+    if not always:
+        if request.url.path.startswith(QUIET_PREFIXES):
+            return
+        if random.random() >= ACCESS_LOG_SAMPLE_RATE:
+            return
+
+    access_logger.info(
+        "%s %s %d %.1fms",
+        request.method,
+        request.url.path,
+        status_code,
+        duration_ms,
+        extra={
+            "fields": {
+                "method": request.method,
+                "path": request.url.path,
+                "route": route,
+                "status": status_code,
+                "durationMs": round(duration_ms, 1),
+                "dbCommands": db_stats.command_count,
+                "dbTimeMs": round(db_stats.total_time_ms, 1),
+                "userId": context.user_id,
+                "client": request.client.host if request.client else None,
+                "sampleRate": 1.0 if always else ACCESS_LOG_SAMPLE_RATE,
+            }
+        },
+    )
@@ -0,0 +1,85 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from datetime import datetime, timedelta
+from typing import Optional
+from .counters import counters
+from .coordination import run_as_leader
+
+# Hourly view buckets are kept a little longer than the trending window
+TRENDING_WINDOW = timedelta(hours=24)
+TRENDING_BUCKET_TTL_SECONDS = 2 * 24 * 3600
+
+def counts_as_video(product: Optional[dict]) -> bool:
+    """Whether a product is listed under /shorts/categories"""
+    return bool(product) and product.get("status") == "available" and bool(product.get("videos"))
+
+async def apply_product_change(db: AsyncIOMotorDatabase, before: Optional[dict], after: Optional[dict]):
+    """Move a product's contribution between category rollups after a create or update"""
+    deltas = {}
+    if counts_as_video(before):
+        count, views = deltas.get(before["category"], (0, 0))
+        deltas[before["category"]] = (count - 1, views - before.get("video_views", 0))
+    if counts_as_video(after):
+        count, views = deltas.get(after["category"], (0, 0))
+        deltas[after["category"]] = (count + 1, views + after.get("video_views", 0))
+
+    for category, (count, views) in deltas.items():
+        if count == 0 and views == 0:
+            continue
+        await db.category_rollups.update_one(
+            {"_id": category},
+            {
+                "$inc": {"video_count": count, "total_views": views},
+                "$set": {"updated_at": datetime.utcnow()}
+            },
+            upsert=True
+        )
+
+def record_video_view(product: dict, views: int = 1):
+    """Add video views to the category total and the current trending bucket on the next counter flush"""
+    if counts_as_video(product):
+        counters.add("category_rollups", {"_id": product["category"]}, {"total_views": views}, upsert=True)
+
+    hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    counters.add(
+        "category_trending",
+        {"category": product["category"], "hour": hour},
+        {"views": views},
+        upsert=True
+    )
+
+async def get_trending_categories(db: AsyncIOMotorDatabase, limit: int = 20):
+    """Categories ranked by video views over the last 24 hours"""
+    since = datetime.utcnow() - TRENDING_WINDOW
+    pipeline = [
+        {"$match": {"hour": {"$gte": since}}},
+        {"$group": {"_id": "$category", "views": {"$sum": "$views"}}},
+        {"$sort": {"views": -1}},
+        {"$limit": limit}
+    ]
+    return await db.category_trending.aggregate(pipeline).to_list(length=limit)
+
+async def rebuild_category_rollups(db: AsyncIOMotorDatabase):
+    """Recompute every category rollup from the products collection"""
+    pipeline = [
+        {
+            "$match": {
+                "videos": {"$exists": True, "$ne": []},
+                "status": "available"
+            }
+        },
+        {
+            "$group": {
+                "_id": "$category",
+                "video_count": {"$sum": 1},
+                "total_views": {"$sum": "$video_views"}
+            }
+        },
+        {"$set": {"updated_at": "$$NOW"}},
+        # $out swaps the collection atomically and keeps its indexes
+        {"$out": "category_rollups"}
+    ]
+    await db.products.aggregate(pipeline).to_list(length=None)
+
+async def run_periodic_rebuild(db: AsyncIOMotorDatabase, interval: float):
+    """Correct drift in the incremental rollups every `interval` seconds, on one worker at a time"""
+    await run_as_leader(db, "category_rollups", interval, rebuild_category_rollups)
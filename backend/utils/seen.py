@@ -0,0 +1,91 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from bson.int64 import Int64
+import hashlib
+
+# Each generation is a 8192-bit bloom filter stored as 128 int64 words (1 KB).
+# With 4 hashes and 800 items the false positive rate stays around 1%.
+FILTER_BITS = 8192
+WORD_BITS = 64
+WORDS = FILTER_BITS // WORD_BITS
+HASHES = 4
+
+# Items per generation before the filter rotates; the previous generation is
+# kept, so a user remembers between 800 and 1600 recently watched items.
+CAPACITY = 800
+
+def _positions(product_id: str):
+    digest = hashlib.blake2b(product_id.encode(), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + i * h2) % FILTER_BITS for i in range(HASHES)]
+
+def _to_signed(word: int) -> int:
+    return word - (1 << 64) if word >= (1 << 63) else word
+
+class SeenFilter:
+    """Read-only view of a user's seen filters"""
+
+    __slots__ = ("_generations",)
+
+    def __init__(self, generations=()):
+        # Stored words are signed int64, mask them back to unsigned
+        self._generations = [
+            [word & 0xFFFFFFFFFFFFFFFF for word in words]
+            for words in generations
+            if words
+        ]
+
+    def __contains__(self, product_id: str) -> bool:
+        positions = _positions(product_id)
+        return any(
+            all(words[bit // WORD_BITS] >> (bit % WORD_BITS) & 1 for bit in positions)
+            for words in self._generations
+        )
+
+async def load_seen(db: AsyncIOMotorDatabase, user_id: str) -> SeenFilter:
+    """Load the user's seen filters in one query"""
+    doc = await db.user_seen.find_one({"_id": user_id}, {"cur": 1, "prev": 1})
+    if not doc:
+        return SeenFilter()
+    return SeenFilter([doc.get("cur"), doc.get("prev")])
+
+async def mark_seen(db: AsyncIOMotorDatabase, user_id: str, product_id: str):
+    """Set the product's bits in the current generation, rotating it when full"""
+    masks = {}
+    for bit in _positions(product_id):
+        index = bit // WORD_BITS
+        masks[index] = masks.get(index, 0) | (1 << (bit % WORD_BITS))
+
+    doc = await db.user_seen.find_one_and_update(
+        {"_id": user_id},
+        {
+            "$bit": {f"cur.{index}": {"or": Int64(_to_signed(mask))} for index, mask in masks.items()},
+            "$inc": {"count": 1}
+        },
+        projection={"count": 1},
+        return_document=ReturnDocument.AFTER
+    )
+
+    if doc is None:
+        words = [0] * WORDS
+        for index, mask in masks.items():
+            words[index] = mask
+        try:
+            await db.user_seen.insert_one({
+                "_id": user_id,
+                "cur": [Int64(_to_signed(word)) for word in words],
+                "prev": [],
+                "count": 1
+            })
+        except DuplicateKeyError:
+            # Another request created the document first
+            await mark_seen(db, user_id, product_id)
+        return
+
+    if doc["count"] >= CAPACITY:
+        await db.user_seen.update_one(
+            {"_id": user_id, "count": {"$gte": CAPACITY}},
+            [{"$set": {"prev": "$cur", "cur": [Int64(0)] * WORDS, "count": 0}}]
+        )
@@ -0,0 +1,54 @@
+from pathlib import Path
+import asyncio
+import os
+
+class LocalStorage:
+    """Stores media objects on local disk; served by the API as a CDN stand-in"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _write(self, key: str, data: bytes):
+        path = self.root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    async def put(self, key: str, data: bytes, content_type: str):
+        await asyncio.get_running_loop().run_in_executor(None, self._write, key, data)
+
+class S3Storage:
+    """Stores media objects in an S3-compatible bucket (AWS, MinIO, ...)"""
+
+    def __init__(self, bucket: str, endpoint_url: str = None):
+        import boto3
+
+        self.bucket = bucket
+        self.client = boto3.client("s3", endpoint_url=endpoint_url or None)
+
+    def _write(self, key: str, data: bytes, content_type: str):
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=data,
+            ContentType=content_type,
+            CacheControl="public, max-age=31536000, immutable",
+        )
+
+    async def put(self, key: str, data: bytes, content_type: str):
+        await asyncio.get_running_loop().run_in_executor(None, self._write, key, data, content_type)
+
+MEDIA_ROOT = os.environ.get("MEDIA_ROOT", str(Path(__file__).parent.parent / "media"))
+
+_storage = None
+
+def get_storage():
+    """Storage backend selected by MEDIA_STORAGE (local or s3)"""
+    global _storage
+    if _storage is None:
+        if os.environ.get("MEDIA_STORAGE", "local") == "s3":
+            _storage = S3Storage(os.environ["MEDIA_BUCKET"], os.environ.get("MEDIA_S3_ENDPOINT"))
+        else:
+            _storage = LocalStorage(MEDIA_ROOT)
+    return _storage
@@ -0,0 +1,34 @@
+"""
+Shared fixtures. Tests import the backend modules directly and run them
+against an in-memory MongoDB (mongomock-motor).
+"""
+
+import sys
+from pathlib import Path
+
+import mongomock.collection
+import pytest
+from bson.decimal128 import Decimal128
+from mongomock_motor import AsyncMongoMockClient
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+_inc_updater = mongomock.collection._updaters["$inc"]
+
+def _inc_decimal(doc, field_name, value):
+    """$inc that also adds Decimal128 values, as MongoDB does"""
+    if isinstance(doc, dict) and isinstance(value, Decimal128):
+        current = doc.get(field_name, Decimal128("0"))
+        doc[field_name] = Decimal128(current.to_decimal() + value.to_decimal())
+    else:
+        _inc_updater(doc, field_name, value)
+
+@pytest.fixture
+def db(monkeypatch):
+    from utils import escrow
+
+    # mongomock has no sessions; run multi-document updates as on a standalone server
+    monkeypatch.setattr(escrow, "_transactions_supported", False)
+    monkeypatch.setitem(mongomock.collection._updaters, "$inc", _inc_decimal)
+    return AsyncMongoMockClient()["test"]
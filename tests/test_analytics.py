@@ -0,0 +1,36 @@
+"""
+Analytics buckets: counter flushes upsert on the buckets' unique key.
+"""
+
+import asyncio
+
+from pymongo import ASCENDING
+
+from utils import analytics
+from utils.counters import CounterBuffer
+
+def test_product_bucket_upsert_matches_unique_key(db, monkeypatch):
+    buffer = CounterBuffer()
+    monkeypatch.setattr(analytics, "counters", buffer)
+    asyncio.run(db.product_stats.create_index(
+        [("product_id", ASCENDING), ("granularity", ASCENDING), ("bucket", ASCENDING)], unique=True
+    ))
+
+    # A bucket created before seller_id was stored on it
+    bucket = analytics.bucket_start(analytics.datetime.utcnow(), "day")
+    asyncio.run(db.product_stats.insert_one(
+        {"product_id": "product-1", "granularity": "day", "bucket": bucket, "views": 2}
+    ))
+
+    analytics.record("product-1", "seller-1", views=1)
+    asyncio.run(buffer.flush(db))
+    analytics.record("product-1", "seller-1", views=1)
+    asyncio.run(buffer.flush(db))
+
+    daily = asyncio.run(db.product_stats.find({"granularity": "day"}).to_list(length=None))
+    assert len(daily) == 1
+    assert daily[0]["views"] == 4
+
+    hourly = asyncio.run(db.product_stats.find_one({"granularity": "hour"}))
+    assert hourly["seller_id"] == "seller-1"
+    assert hourly["views"] == 2
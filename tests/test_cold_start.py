@@ -0,0 +1,74 @@
+"""
+Cold-start budget for an API worker.
+
+Each measurement runs in a fresh interpreter: import server.py, then serve
+the first request (liveness, no database needed). Budgets can be tightened
+or relaxed per machine with COLD_START_IMPORT_BUDGET and
+COLD_START_FIRST_REQUEST_BUDGET (seconds).
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+IMPORT_BUDGET = float(os.environ.get("COLD_START_IMPORT_BUDGET", "1.5"))
+FIRST_REQUEST_BUDGET = float(os.environ.get("COLD_START_FIRST_REQUEST_BUDGET", "2.0"))
+RUNS = 3
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import server
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+client = TestClient(server.app)
+status = client.get(sys.argv[1]).status_code
+done = time.perf_counter()
+print(json.dumps({"import": imported - started, "first_request": done - started, "status": status}))
+"""
+
+def probe(cache_dir: Path, path: str = "/api/health/live", **env) -> dict:
+    # The schema cache goes to the test's directory, not the source tree
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, path],
+        cwd=BACKEND_DIR,
+        env={**os.environ, "OPENAPI_CACHE_PATH": str(cache_dir / "openapi.json"), **env},
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def test_cold_start_within_budget(tmp_path):
+    runs = [probe(tmp_path) for _ in range(RUNS)]
+    assert all(run["status"] == 200 for run in runs)
+
+    import_time = statistics.median(run["import"] for run in runs)
+    first_request = statistics.median(run["first_request"] for run in runs)
+
+    assert import_time < IMPORT_BUDGET, f"import took {import_time:.3f}s (budget {IMPORT_BUDGET}s)"
+    assert first_request < FIRST_REQUEST_BUDGET, f"first request after {first_request:.3f}s (budget {FIRST_REQUEST_BUDGET}s)"
+
+def test_import_does_not_connect_to_mongo():
+    # The client is created per worker at startup, so importing needs no database settings
+    env = {key: value for key, value in os.environ.items() if key not in ("MONGO_URL", "DB_NAME")}
+    result = subprocess.run(
+        [sys.executable, "-c", "import server"],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+
+def test_docs_disabled_in_production(tmp_path):
+    assert probe(tmp_path, "/openapi.json", ENVIRONMENT="production")["status"] == 404
+    assert probe(tmp_path, "/docs", ENVIRONMENT="production")["status"] == 404
+    assert probe(tmp_path, "/openapi.json", ENVIRONMENT="production", ENABLE_DOCS="true")["status"] == 200
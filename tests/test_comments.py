@@ -0,0 +1,40 @@
+"""
+Comment threads are paged newest first on a (created_at, id) keyset.
+"""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from routes.comments import decode_cursor, encode_cursor, load_comment_page
+
+def test_cursor_round_trip():
+    comment = {"id": "c-1", "created_at": datetime(2026, 3, 1, 12, 30, 15, 250000)}
+
+    assert decode_cursor(encode_cursor(comment)) == (comment["created_at"], "c-1")
+
+@pytest.mark.parametrize("cursor", ["not base64!", "bm8tc2VwYXJhdG9y", ""])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+def test_pages_split_comments_with_the_same_timestamp(db):
+    created_at = datetime(2026, 3, 1, 12, 0)
+    asyncio.run(db.comments.insert_many([
+        {"id": f"c-{number}", "product_id": "product-1", "user_id": "user-1", "comment": "hi", "created_at": created_at}
+        for number in range(5)
+    ]))
+
+    seen = []
+    before = None
+    while True:
+        page = asyncio.run(load_comment_page(db, "product-1", limit=2, before=before))
+        seen += [item["id"] for item in page["items"]]
+        before = page["nextCursor"]
+        if before is None:
+            break
+
+    assert seen == ["c-4", "c-3", "c-2", "c-1", "c-0"]
@@ -0,0 +1,31 @@
+"""
+Following feed cursors: (created_at, product_id) keysets in naive UTC.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from routes.follows import decode_cursor, encode_cursor
+
+def test_cursor_round_trip():
+    created_at = datetime(2026, 3, 1, 12, 30, 15, 250000)
+
+    assert decode_cursor(encode_cursor(created_at, "product-1")) == (created_at, "product-1")
+
+def test_bare_timestamp_from_older_clients():
+    assert decode_cursor("2026-03-01T12:30:15") == (datetime(2026, 3, 1, 12, 30, 15), "")
+
+def test_aware_timestamps_become_naive_utc():
+    algiers = timezone(timedelta(hours=1))
+    expected = datetime(2026, 3, 1, 11, 30)
+
+    assert decode_cursor("2026-03-01T12:30:00+01:00") == (expected, "")
+    assert decode_cursor(encode_cursor(datetime(2026, 3, 1, 12, 30, tzinfo=algiers), "p")) == (expected, "p")
+
+@pytest.mark.parametrize("cursor", ["yesterday", "bm8tc2VwYXJhdG9y", ""])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
@@ -0,0 +1,120 @@
+"""
+Binary UUID keys: what utils/ids.py encodes, and the migration that
+converts stored string keys.
+"""
+
+import asyncio
+import uuid
+
+from bson.binary import Binary
+from pymongo import DeleteOne, InsertOne, UpdateOne
+
+from jobs import migrate_binary_ids
+from utils import ids
+
+USER = "3f2b8c1e-5a7d-4e9f-8b6a-1c2d3e4f5a6b"
+PRODUCT = "9a8b7c6d-5e4f-4a3b-9c2d-1e0f9a8b7c6d"
+
+def key(value: str) -> Binary:
+    return Binary.from_uuid(uuid.UUID(value))
+
+def test_operators_apply_to_the_field_they_sit_under():
+    query = {
+        "id": {"$in": [USER, PRODUCT]},
+        "seller_id": {"$ne": USER},
+        "$or": [{"buyer_id": USER}, {"title": USER}],
+    }
+
+    assert ids.encode(query) == {
+        "id": {"$in": [key(USER), key(PRODUCT)]},
+        "seller_id": {"$ne": key(USER)},
+        "$or": [{"buyer_id": key(USER)}, {"title": USER}],
+    }
+
+def test_elem_match_and_dotted_paths():
+    query = {"items": {"$elemMatch": {"product_id": PRODUCT, "note": PRODUCT}}}
+    update = {"$set": {"items.$.product_id": PRODUCT, "items.0.seller_id": USER, "items.$.note": USER}}
+
+    assert ids.encode(query) == {"items": {"$elemMatch": {"product_id": key(PRODUCT), "note": PRODUCT}}}
+    assert ids.encode(update) == {
+        "$set": {"items.$.product_id": key(PRODUCT), "items.0.seller_id": key(USER), "items.$.note": USER}
+    }
+
+def test_non_canonical_ids_stay_strings():
+    for value in ("test-prod-1", USER.upper(), USER.replace("-", ""), "{" + USER + "}", "seller:" + USER):
+        assert ids.encode({"id": value}) == {"id": value}
+    assert ids.encode(None) is None
+
+def test_pipeline_encodes_match_stages_only():
+    pipeline = [
+        {"$match": {"seller_id": USER}},
+        {"$facet": {"mine": [{"$match": {"buyer_id": USER}}]}},
+        {"$lookup": {"from": "users", "pipeline": [{"$match": {"id": USER}}], "as": "user"}},
+        {"$match": {"$expr": {"$eq": ["$seller_id", USER]}}},
+        {"$project": {"id": USER}},
+    ]
+
+    assert ids.encode_pipeline(pipeline) == [
+        {"$match": {"seller_id": key(USER)}},
+        {"$facet": {"mine": [{"$match": {"buyer_id": key(USER)}}]}},
+        {"$lookup": {"from": "users", "pipeline": [{"$match": {"id": key(USER)}}], "as": "user"}},
+        {"$match": {"$expr": {"$eq": ["$seller_id", USER]}}},
+        {"$project": {"id": USER}},
+    ]
+
+def test_bulk_write_requests_are_encoded_as_copies():
+    requests = [
+        InsertOne({"id": PRODUCT, "seller_id": USER}),
+        UpdateOne({"id": PRODUCT}, {"$set": {"buyer_id": USER}}),
+        DeleteOne({"user_id": USER}),
+    ]
+
+    encoded = [ids._encode_request(request) for request in requests]
+
+    assert encoded[0]._doc == {"id": key(PRODUCT), "seller_id": key(USER)}
+    assert encoded[1]._filter == {"id": key(PRODUCT)}
+    assert encoded[1]._doc == {"$set": {"buyer_id": key(USER)}}
+    assert encoded[2]._filter == {"user_id": key(USER)}
+    # The caller's operations are left as they were
+    assert requests[1]._filter == {"id": PRODUCT}
+
+def test_keyed_collection_stores_binary_keys(db):
+    products = ids.KeyedDatabase(db).products
+
+    asyncio.run(products.bulk_write([InsertOne({"id": PRODUCT, "seller_id": USER, "title": "Phone"})]))
+
+    stored = asyncio.run(db.products.find_one({}))
+    assert stored["id"] == key(PRODUCT) and stored["seller_id"] == key(USER)
+    assert asyncio.run(products.find_one({"seller_id": USER}))["title"] == "Phone"
+
+def test_decoder_returns_canonical_strings():
+    decoder = ids._UuidKeyDecoder()
+
+    assert decoder.transform_bson(key(USER)) == USER
+    assert decoder.transform_bson(Binary(b"raw")) == b"raw"
+
+def test_migration_is_repeatable_and_checked(db, monkeypatch, capsys):
+    monkeypatch.setattr(migrate_binary_ids, "raw_database", lambda: db)
+    asyncio.run(db.products.insert_many([
+        {"id": PRODUCT, "seller_id": USER, "title": "Phone"},
+        {"id": "test-prod-1", "seller_id": USER, "title": "Seeded"},
+    ]))
+    asyncio.run(db.feed_inboxes.insert_one({"_id": USER, "items": [{"product_id": PRODUCT}]}))
+    asyncio.run(db.ledger_entries.insert_one({"account": "seller:" + USER, "journal_id": "j1"}))
+
+    asyncio.run(migrate_binary_ids.migrate(batch_size=1, pause=0, check=True, restart=False))
+    assert "3 documents left to convert" in capsys.readouterr().out
+
+    for _ in range(2):
+        asyncio.run(migrate_binary_ids.migrate(batch_size=1, pause=0, check=False, restart=False))
+    asyncio.run(migrate_binary_ids.migrate(batch_size=1, pause=0, check=True, restart=False))
+    assert "Nothing left to convert" in capsys.readouterr().out
+
+    products = asyncio.run(db.products.find({}, {"_id": 0}).sort("title", 1).to_list(length=None))
+    assert products == [
+        {"id": key(PRODUCT), "seller_id": key(USER), "title": "Phone"},
+        {"id": "test-prod-1", "seller_id": key(USER), "title": "Seeded"},
+    ]
+    inboxes = asyncio.run(db.feed_inboxes.find({}).to_list(length=None))
+    assert inboxes == [{"_id": key(USER), "items": [{"product_id": key(PRODUCT)}]}]
+    assert asyncio.run(db.ledger_entries.find_one({}))["account"] == "seller:" + USER
@@ -0,0 +1,87 @@
+"""
+Escrow accounting: a paid transaction funds escrow from the gateway and
+its release empties it again.
+"""
+
+import asyncio
+from datetime import datetime
+from decimal import Decimal
+
+from utils import escrow, payment_inbox
+from utils.ledger import (
+    ESCROW_ACCOUNT, GATEWAY_ACCOUNT, get_balances, referral_earnings, referrer_account, seller_account, to_decimal
+)
+
+TRANSACTION = {
+    "id": "5d0c2b7e-8f41-4b0a-9d7c-3e6f1a2b4c5d",
+    "product_id": "product-1",
+    "buyer_id": "buyer-1",
+    "seller_id": "seller-1",
+    "amount": 12345.67,
+    "status": "in_escrow",
+    "escrow_released": False,
+    "payment_status": "awaiting_payment",
+    "commission_amount": 246.91,
+    "referral_l1_id": "referrer-1",
+    "referral_l2_id": None,
+    "referral_l1_amount": 30.86,
+    "referral_l2_amount": 0.0,
+}
+
+def pay(db):
+    for sequence, status in ((1, "PENDING"), (2, "SUCCESS")):
+        asyncio.run(payment_inbox.store_callback(db, {
+            "event_id": f"event-{sequence}",
+            "payment_id": TRANSACTION["id"],
+            "status": status,
+            "amount": 1234567,
+            "sequence": sequence,
+        }))
+    asyncio.run(payment_inbox.process_pending(db))
+
+def entries(db, account: str) -> Decimal:
+    found = asyncio.run(db.ledger_entries.find({"account": account}).to_list(length=None))
+    return sum((to_decimal(entry["amount"]) for entry in found), Decimal("0.00"))
+
+def test_escrow_nets_to_zero_after_release(db):
+    asyncio.run(db.transactions.insert_one(dict(TRANSACTION, created_at=datetime.utcnow())))
+
+    pay(db)
+    balances = asyncio.run(get_balances(db, [ESCROW_ACCOUNT, GATEWAY_ACCOUNT]))
+    assert balances == {ESCROW_ACCOUNT: Decimal("12345.67"), GATEWAY_ACCOUNT: Decimal("-12345.67")}
+
+    transaction = asyncio.run(db.transactions.find_one({"id": TRANSACTION["id"]}))
+    assert asyncio.run(escrow.release_escrow(db, transaction))
+
+    balances = asyncio.run(get_balances(db, [
+        ESCROW_ACCOUNT, seller_account("seller-1"), referrer_account("referrer-1")
+    ]))
+    assert balances[ESCROW_ACCOUNT] == Decimal("0.00")
+    assert entries(db, ESCROW_ACCOUNT) == Decimal("0.00")
+    assert balances[seller_account("seller-1")] == Decimal("12067.90")
+    assert balances[referrer_account("referrer-1")] == Decimal("30.86")
+
+def test_unpaid_escrow_is_not_released(db):
+    asyncio.run(db.transactions.insert_one(dict(TRANSACTION, created_at=datetime.utcnow())))
+
+    assert not asyncio.run(escrow.release_escrow(db, TRANSACTION))
+    assert asyncio.run(db.ledger_entries.count_documents({})) == 0
+
+def test_legacy_escrow_is_funded_before_release(db):
+    legacy = {key: value for key, value in TRANSACTION.items() if key != "payment_status"}
+    asyncio.run(db.transactions.insert_one(dict(legacy, created_at=datetime.utcnow())))
+
+    assert asyncio.run(escrow.release_escrow(db, legacy))
+
+    balances = asyncio.run(get_balances(db, [ESCROW_ACCOUNT, GATEWAY_ACCOUNT]))
+    assert balances == {ESCROW_ACCOUNT: Decimal("0.00"), GATEWAY_ACCOUNT: Decimal("-12345.67")}
+    assert entries(db, ESCROW_ACCOUNT) == Decimal("0.00")
+
+def test_referral_earnings_come_from_the_ledger(db):
+    asyncio.run(db.transactions.insert_one(dict(TRANSACTION, created_at=datetime.utcnow())))
+    pay(db)
+    transaction = asyncio.run(db.transactions.find_one({"id": TRANSACTION["id"]}))
+    assert asyncio.run(escrow.release_escrow(db, transaction))
+
+    earnings = asyncio.run(referral_earnings(db, "referrer-1"))
+    assert earnings == {("buyer-1", 1): Decimal("30.86")}
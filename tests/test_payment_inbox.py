@@ -0,0 +1,161 @@
+"""
+Payment callbacks end to end: the mock gateway signs and posts them, the
+callback route stores them in the inbox and process_pending applies them.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import mock_gateway
+from routes import payments
+from utils import payment_gateway, payment_inbox
+from utils.dependencies import get_database
+
+SECRET = "test-secret"
+TRANSACTION_ID = "0b8f4f56-3c1e-4a57-9a6e-2f0c8d1e7a10"
+AMOUNT = 15000.0
+
+@pytest.fixture
+def api(db, monkeypatch):
+    """Callback route on an app backed by the in-memory database"""
+    monkeypatch.setattr(payment_gateway, "PAYMENT_SECRET_KEY", SECRET)
+    app = FastAPI()
+    app.include_router(payments.router, prefix="/api")
+    app.dependency_overrides[get_database] = lambda: db
+    return TestClient(app)
+
+@pytest.fixture
+def gateway(api, monkeypatch):
+    """Mock gateway whose callbacks are delivered to `api`"""
+    monkeypatch.setattr(mock_gateway, "SECRET", SECRET)
+    monkeypatch.setattr(
+        mock_gateway.requests, "post", lambda url, data, headers, timeout: api.post("/api/payments/callback", content=data, headers=headers)
+    )
+    return TestClient(mock_gateway.app)
+
+@pytest.fixture
+def transaction(db):
+    asyncio.run(db.products.insert_one({"id": "product-1", "seller_id": "seller-1", "status": "pending"}))
+    doc = {
+        "id": TRANSACTION_ID,
+        "product_id": "product-1",
+        "buyer_id": "buyer-1",
+        "seller_id": "seller-1",
+        "amount": AMOUNT,
+        "status": "in_escrow",
+        "escrow_released": False,
+        "payment_status": "awaiting_payment",
+        "commission_amount": 300.0,
+        "referral_l1_id": None,
+        "referral_l2_id": None,
+        "created_at": datetime.utcnow(),
+    }
+    asyncio.run(db.transactions.insert_one(dict(doc)))
+    return doc
+
+def pay(gateway, **params):
+    response = gateway.get("/pay", params={"transaction_id": TRANSACTION_ID, "amount": AMOUNT, **params})
+    assert response.status_code == 200
+    return response.json()["deliveries"]
+
+def store(db, sequence: int, status: str, received_at: datetime = None):
+    event = {
+        "event_id": f"event-{sequence}",
+        "payment_id": TRANSACTION_ID,
+        "status": status,
+        "amount": payment_gateway.to_minor_units(AMOUNT),
+        "sequence": sequence,
+    }
+    assert asyncio.run(payment_inbox.store_callback(db, event))
+    if received_at is not None:
+        asyncio.run(db.payment_callbacks.update_one({"_id": event["event_id"]}, {"$set": {"received_at": received_at}}))
+
+def load(db, collection: str, query: dict):
+    return asyncio.run(db[collection].find_one(query))
+
+def test_bad_signature_is_rejected(db, api):
+    body = b'{"event_id": "e1", "payment_id": "p1", "status": "SUCCESS", "amount": 100, "sequence": 2}'
+    timestamp = str(int(datetime.utcnow().timestamp()))
+
+    response = api.post(
+        "/api/payments/callback",
+        content=body,
+        headers={"X-Timestamp": timestamp, "X-Signature": payment_gateway.sign(timestamp, body, "wrong-secret")},
+    )
+
+    assert response.status_code == 401
+    assert asyncio.run(db.payment_callbacks.count_documents({})) == 0
+
+def test_callback_without_sequence_is_rejected(db, api):
+    body = b'{"event_id": "e1", "payment_id": "p1", "status": "SUCCESS", "amount": 100}'
+    timestamp = str(int(datetime.utcnow().timestamp()))
+
+    response = api.post(
+        "/api/payments/callback",
+        content=body,
+        headers={"X-Timestamp": timestamp, "X-Signature": payment_gateway.sign(timestamp, body, SECRET)},
+    )
+
+    assert response.status_code == 400
+    assert asyncio.run(db.payment_callbacks.count_documents({})) == 0
+
+def test_duplicate_deliveries_are_applied_once(db, gateway, transaction):
+    deliveries = pay(gateway, duplicates=3, shuffle="true")
+
+    assert len(deliveries) == 8
+    assert all(delivery["response"] == 200 for delivery in deliveries)
+    assert asyncio.run(db.payment_callbacks.count_documents({})) == 2
+
+    asyncio.run(payment_inbox.process_pending(db))
+
+    assert load(db, "transactions", {"id": TRANSACTION_ID})["payment_status"] == "paid"
+    callbacks = asyncio.run(db.payment_callbacks.find({}).to_list(length=None))
+    assert sorted(callback["state"] for callback in callbacks) == ["applied", "applied"]
+
+def test_out_of_order_callback_waits_for_the_gap(db, transaction):
+    store(db, 2, "SUCCESS")
+    asyncio.run(payment_inbox.process_pending(db))
+
+    assert load(db, "payment_callbacks", {"_id": "event-2"})["state"] == "pending"
+    assert load(db, "transactions", {"id": TRANSACTION_ID})["payment_status"] == "awaiting_payment"
+
+    store(db, 1, "PENDING")
+    asyncio.run(payment_inbox.process_pending(db))
+
+    assert load(db, "payment_callbacks", {"_id": "event-1"})["state"] == "applied"
+    assert load(db, "payment_callbacks", {"_id": "event-2"})["state"] == "applied"
+    assert load(db, "transactions", {"id": TRANSACTION_ID})["payment_status"] == "paid"
+
+def test_gap_is_skipped_after_the_timeout(db, transaction):
+    store(db, 2, "SUCCESS", received_at=datetime.utcnow() - payment_inbox.SEQUENCE_GAP_TIMEOUT - timedelta(seconds=1))
+    asyncio.run(payment_inbox.process_pending(db))
+
+    assert load(db, "transactions", {"id": TRANSACTION_ID})["payment_status"] == "paid"
+
+def test_failed_payment_cancels_the_escrow(db, gateway, transaction):
+    pay(gateway, outcome="failed")
+    asyncio.run(payment_inbox.process_pending(db))
+
+    stored = load(db, "transactions", {"id": TRANSACTION_ID})
+    assert stored["payment_status"] == "failed"
+    assert stored["status"] == "cancelled"
+    assert load(db, "products", {"id": "product-1"})["status"] == "available"
+
+def test_poisoned_callback_gives_up_after_max_attempts(db, transaction, monkeypatch):
+    async def broken(db, callback):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(payment_inbox, "apply_callback", broken)
+    store(db, 1, "PENDING")
+
+    for _ in range(payment_inbox.MAX_ATTEMPTS + 2):
+        asyncio.run(payment_inbox.process_pending(db))
+
+    callback = load(db, "payment_callbacks", {"_id": "event-1"})
+    assert callback["state"] == "failed"
+    assert callback["attempts"] == payment_inbox.MAX_ATTEMPTS
+    assert "boom" in callback["error"]
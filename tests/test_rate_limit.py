@@ -0,0 +1,71 @@
+"""
+Rate limit budgets on the worker-local token buckets.
+"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from utils import rate_limit
+from utils.rate_limit import Limit, LocalBuckets
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    return clock
+
+@pytest.fixture
+def buckets(monkeypatch, clock):
+    """Fresh worker buckets, no shared store"""
+    buckets = LocalBuckets()
+    monkeypatch.setattr(rate_limit, "_local", buckets)
+    monkeypatch.setattr(rate_limit, "_shared_buckets", lambda: None)
+    monkeypatch.setattr(rate_limit, "ENABLED", True)
+    return buckets
+
+def take(buckets, key, limit, cost=1):
+    return asyncio.run(buckets.take(key, limit, cost))
+
+def test_parse():
+    limit = Limit.parse("5/60")
+
+    assert (limit.rate, limit.period) == (5, 60.0)
+    assert limit.per_second == pytest.approx(5 / 60)
+
+def test_burst_then_refill(buckets, clock):
+    limit = Limit(5, 60)
+
+    assert [take(buckets, "k", limit) for _ in range(5)] == [0.0] * 5
+    assert take(buckets, "k", limit) == pytest.approx(12.0)
+
+    clock.now += 12
+    assert take(buckets, "k", limit) == 0.0
+
+def test_zero_cost_only_checks(buckets):
+    limit = Limit(1, 60)
+
+    assert all(take(buckets, "k", limit, cost=0) == 0.0 for _ in range(10))
+    assert take(buckets, "k", limit) == 0.0
+    assert take(buckets, "k", limit, cost=0) > 0
+
+def test_exhausted_budget_raises_429_with_retry_after(buckets):
+    for _ in range(5):
+        asyncio.run(rate_limit.enforce("login_account", "owner@example.com:ip:1.2.3.4"))
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(rate_limit.enforce("login_account", "owner@example.com:ip:1.2.3.4", cost=0))
+    assert error.value.status_code == 429
+    assert error.value.headers["Retry-After"] == "12"
+
+    # The account's owner logging in from elsewhere keeps their own budget
+    asyncio.run(rate_limit.enforce("login_account", "owner@example.com:ip:5.6.7.8", cost=0))
+    asyncio.run(rate_limit.enforce("login_account_global", "owner@example.com", cost=0))
@@ -0,0 +1,35 @@
+"""
+Seen filter: a bloom filter never forgets a seen item and rarely claims an
+unseen one.
+"""
+
+from utils.seen import CAPACITY, WORDS, SeenFilter, _positions, _to_signed
+
+def build(product_ids) -> list:
+    """Filter words as mark_seen stores them (signed int64)"""
+    words = [0] * WORDS
+    for product_id in product_ids:
+        for bit in _positions(product_id):
+            words[bit // 64] |= 1 << (bit % 64)
+    return [_to_signed(word) for word in words]
+
+def test_seen_items_are_always_found():
+    seen = [f"seen-{number}" for number in range(CAPACITY)]
+    seen_filter = SeenFilter([build(seen)])
+
+    assert all(product_id in seen_filter for product_id in seen)
+
+def test_false_positive_rate_at_capacity():
+    seen_filter = SeenFilter([build(f"seen-{number}" for number in range(CAPACITY))])
+
+    probes = 20_000
+    false_positives = sum(f"unseen-{number}" in seen_filter for number in range(probes))
+
+    # About 1.1% expected for 8192 bits, 4 hashes and 800 items
+    assert false_positives / probes < 0.02
+
+def test_previous_generation_is_still_checked():
+    seen_filter = SeenFilter([build(["new"]), build(["old"])])
+
+    assert "new" in seen_filter and "old" in seen_filter
+    assert "never" not in SeenFilter([build([]), []])
@@ -0,0 +1,81 @@
+"""
+Referral settlement: resuming after a crash between posting a batch's
+payout journal and checkpointing it, and referrers without a RIB.
+"""
+
+import asyncio
+import csv
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from jobs import settle_referrals
+from utils.ledger import PAYOUT_ACCOUNT, get_balances, post_journal, referrer_account
+
+EARNINGS = {"a": Decimal("10.00"), "b": Decimal("7.50"), "c": Decimal("2.50")}
+
+def credit_referrers(db):
+    for user_id in EARNINGS:
+        asyncio.run(db.users.insert_one({"id": user_id, "name": f"User {user_id}", "rib": f"00799999{user_id}"}))
+    for number, (user_id, amount) in enumerate(EARNINGS.items()):
+        asyncio.run(post_journal(
+            db, f"escrow_release:t{number}", "escrow_release",
+            {"escrow": -amount, referrer_account(user_id): amount}
+        ))
+    # Settlement only takes entries older than the run's cutoff
+    asyncio.run(db.ledger_entries.update_many({}, {"$set": {"created_at": datetime.utcnow() - timedelta(minutes=1)}}))
+
+def paid_per_user(output_dir) -> dict:
+    paid = {}
+    for path in sorted(output_dir.glob("*.csv")):
+        with open(path, newline="") as handle:
+            for row in csv.DictReader(handle):
+                paid[row["user_id"]] = paid.get(row["user_id"], Decimal("0.00")) + Decimal(row["amount"])
+    return paid
+
+def test_resume_after_crash_before_checkpoint(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(settle_referrals, "get_database", lambda: db)
+    credit_referrers(db)
+
+    posted = []
+
+    async def crash_after_first_journal(*args, **kwargs):
+        await post_journal(*args, **kwargs)
+        posted.append(args[1])
+        if len(posted) == 1:
+            raise RuntimeError("killed before the checkpoint")
+
+    monkeypatch.setattr(settle_referrals, "post_journal", crash_after_first_journal)
+    with pytest.raises(RuntimeError):
+        asyncio.run(settle_referrals.settle(tmp_path, batch_size=2))
+
+    checkpoint = asyncio.run(db.job_checkpoints.find_one({"_id": settle_referrals.JOB_ID}))
+    assert checkpoint["batches"] == 0 and checkpoint["finished_at"] is None
+
+    asyncio.run(settle_referrals.settle(tmp_path, batch_size=2))
+
+    # Every referrer is paid exactly once, and the payout account only once per file
+    assert paid_per_user(tmp_path) == EARNINGS
+    assert len(posted) == 2
+    accounts = [referrer_account(user_id) for user_id in EARNINGS] + [PAYOUT_ACCOUNT]
+    balances = asyncio.run(get_balances(db, accounts))
+    assert balances.pop(PAYOUT_ACCOUNT) == sum(EARNINGS.values())
+    assert set(balances.values()) == {Decimal("0.00")}
+
+    checkpoint = asyncio.run(db.job_checkpoints.find_one({"_id": settle_referrals.JOB_ID}))
+    assert checkpoint["phase"] == "done"
+    assert Decimal(checkpoint["total"]) == sum(EARNINGS.values())
+
+def test_referrer_without_rib_stays_unsettled(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(settle_referrals, "get_database", lambda: db)
+    credit_referrers(db)
+    asyncio.run(db.users.update_one({"id": "b"}, {"$unset": {"rib": ""}}))
+
+    asyncio.run(settle_referrals.settle(tmp_path, batch_size=2))
+
+    assert paid_per_user(tmp_path) == {"a": EARNINGS["a"], "c": EARNINGS["c"]}
+    balances = asyncio.run(get_balances(db, [referrer_account("b")]))
+    assert balances[referrer_account("b")] == EARNINGS["b"]
+    unsettled = asyncio.run(db.ledger_entries.find_one({"account": referrer_account("b")}))
+    assert unsettled["settled"] is False and "settlement_id" not in unsettled